@@ -8,12 +8,132 @@ This File contains File manipulation classes for use in an external sort for lar
 Contains:
 ---------
 Classes:
+    -TextRecords()
+        +read_chunks(self, path, chunkSize, skip = 0)
+        +sort_chunk(self, chunk, engine, order = None)
+        +write_chunk(self, chunk, path, append = False)
+        +open_run(self, path, bufferSize)
+        +write_merged(self, records, path, bufferSize, index = None)
+        +record_key(self, record)
+        +chunk_keys(self, chunk)
+        +chunk_order(self, chunk)
+        +in_order(self, path, readSize, strict = False)
+        +parse_bound(self, text)
+        +sample_run(self, path, count)
+        +find_bounds(self, path, bounds)
+        +open_slice(self, path, start, end, bufferSize)
+        +pack(self, block)
+        +unpack(self, data)
+        -_iter_slice(self, path, start, end, bufferSize)
+        -_line_from(self, runFile, position)
+
+    -KeyedTextRecords(TextRecords)
+        +__init__(self, keyType = 'int', width = 8)
+        +parse_keys(self, lines)
+        +record_key(self, record)
+        +chunk_keys(self, chunk)
+        +parse_bound(self, text)
+        +sort_chunk(self, chunk, engine, order = None)
+        +decorate(self, records, tiebreak = None)
+        +undecorate(self, records)
+
+    -UniqueRecords()
+        +__init__(self, records)
+        +read_chunks(self, path, chunkSize, skip = 0)
+        +sort_chunk(self, chunk, engine, order = None)
+        +aggregate(self, records)
+        +collapse(self, merged)
+        +decorate(self, records, tiebreak = None)
+        +undecorate(self, records)
+        +write_chunk(self, chunk, path, append = False)
+        +open_run(self, path, bufferSize)
+        +write_merged(self, records, path, bufferSize, index = None)
+        +pack(self, block)
+        +unpack(self, data)
+        +record_key(self, record)
+        +chunk_keys(self, chunk)
+        +chunk_order(self, chunk)
+        +in_order(self, path, readSize, strict = False)
+        +parse_bound(self, text)
+        +sample_run(self, path, count)
+        +find_bounds(self, path, bounds)
+        +open_slice(self, path, start, end, bufferSize)
+        -_as_chunk(self, records)
+
+    -CountedRecords(UniqueRecords)
+        +sort_chunk(self, chunk, engine, order = None)
+        +aggregate(self, records)
+        +collapse(self, merged)
+        +decorate(self, records, tiebreak = None)
+        +undecorate(self, records)
+        +write_chunk(self, chunk, path, append = False)
+        +open_run(self, path, bufferSize)
+        +write_merged(self, records, path, bufferSize, index = None)
+        +pack(self, block)
+        +unpack(self, data)
+        -_as_records(self, pairs)
+        -_split_counts(self, pairs)
+        -_pairs(self, records)
+        -_iter_pairs(self, run)
+
+    -BinaryRecords()
+        +read_chunks(self, path, chunkSize, skip = 0)
+        +sort_chunk(self, chunk, engine, order = None)
+        +write_chunk(self, chunk, path, append = False)
+        +open_run(self, path, bufferSize)
+        +write_merged(self, records, path, bufferSize, index = None)
+        +record_key(self, record)
+        +chunk_keys(self, chunk)
+        +chunk_order(self, chunk)
+        +in_order(self, path, readSize, strict = False)
+        +parse_bound(self, text)
+        +sample_run(self, path, count)
+        +find_bounds(self, path, bounds)
+        +open_slice(self, path, start, end, bufferSize)
+        +pack(self, block)
+        +unpack(self, data)
+        -_stream_chunks(self, stream, chunkSize, skip)
+        -_iter_run(self, path, bufferSize, start = 0, end = None)
+
+    -EncodedRuns()
+        +__init__(self, records, blockRecords = 8192)
+        +write_chunk(self, chunk, path, append = False)
+        +write_merged(self, records, path, bufferSize, index = None)
+        +open_run(self, path, bufferSize)
+        +add_chunks(self, chunkStats)
+        +report(self)
+        -_write_blocks(self, blocks, path, bufferSize, append = False)
+        -_iter_run(self, path, bufferSize)
+        -_encode_block(self, block, raw)
+        -_decode_block(self, kind, count, payload)
+
+    -ZlibRuns(EncodedRuns)
+        +__init__(self, records, blockRecords = 8192, level = 1)
+        -_encode_block(self, block, raw)
+
+    -DeltaRuns(ZlibRuns)
+        -_encode_block(self, block, raw)
+        -_keys(self, block)
+
     -FileMutilator()
-        +__init__(self, victim, chunkSize)
+        +__init__(self, victim, chunkSize, workers = 1, inFlight = None, records = None,
+                  engine = None, runMode = 'chunk', guard = None, encoding = None,
+                  journal = None, tempDir = None, adaptive = True)
         +list_chunks(self)
+        +average_run_length(self)
         +commit_mutilation(self)
         +hide_remains(self)
-        -_hide_corpse(self, chunkNum, chunk)
+        -_commit_mutilation_serial(self, chunks)
+        -_commit_mutilation_parallel(self, chunks)
+        -_commit_replacement_selection(self, chunks)
+        -_pick_up_runs(self)
+        -_hide_corpse(self, chunk, chunkNum, readSeconds = 0.0)
+        -_lay_out_presorted(self, chunk, order, chunkNum, readSeconds)
+        -_chunk_order(self, chunk)
+        -_next_chunk_size(self)
+        -_check_memory(self)
+        -_record_chunk(self, chunkNum, chunkName, readSeconds, stats, extends = False)
+        -_chunk_name(self, chunkNum)
         -_chunk_file_naming_format
 
     -AmmoRack()
@@ -23,18 +143,176 @@ Classes:
         +unload(self, index)
 
     -FileSurgeon()
-        +__init__(self, sPlan)
-        +start_stitching(self, patients, targetFileName, chunkSize)
+        +__init__(self, sPlan, records = None, readAhead = 0, writeBehind = 0,
+                  blockRecords = 8192, encoding = None, mergeWorkers = 1, guard = None)
+        +start_stitching(self, patients, targetFileName, chunkSize, intermediate = False,
+                         indexEvery = 0)
+        +parallel_stitching(self, patients, targetFileName, chunkSize, index = None)
+        +stream_stitching(self, patients, chunkSize)
         +prep_for_surgery(self, patients, chunkSize)
+        +follow_plan(self, mergePlan, journal = None, final = True, indexEvery = 0)
+        +io_report(self)
+        -_can_split(self)
+        -_pick_splitters(self, patients, parts)
+        -_merge(self, threads)
+        -_fit_buffers(self, bufferSize, runs)
+        -_open_threads(self, patients, chunkSize)
+        -_close_threads(self, threads, readers)
+        -_write_behind(self, merged, targetFileName, chunkSize, writer, index = None)
+
+    -ReadAhead()
+        +__init__(self, thread, blockRecords, depth)
+        +records(self)
+        +close(self)
+        -_fill(self)
+
+    -WriteBehind()
+        +__init__(self, records, targetFileName, bufferSize, depth, index = None)
+        +put(self, block)
+        +close(self)
+        -_drain(self)
+        -_blocks(self)
+
+    -MergePlanner()
+        +__init__(self, memory, maxFanIn = None, minBuffer = 65536, runOverhead = 0,
+                  tempDir = None, stable = False)
+        +max_fan_in(self)
+        +plan(self, runs, targetFileName)
+        -_plan_for_fan_in(self, runs, targetFileName, fanIn)
+        -_stable_plan(self, line, targetFileName, fanIn)
+
+    -MergePlan()
+        +__init__(self, runs, fanIn, steps)
+        +report(self)
+
+    -MemoryPlanner()
+        +__init__(self, memory, headroom = 0.1, minBuffer = 65536)
+        +least_memory(self)
+        +plan(self, path, records, engine, workers = 1, inFlight = None, runMode = 'chunk',
+              suture = 'heap', readAhead = 0, writeBehind = 0, encoding = 'none',
+              sample = None, selection = False)
+        -_read_sample(self, path, records)
+        -_record_bytes(self, records, sample)
+        -_sort_bytes(self, records, engine, sample, memPerRecord)
+
+    -MemoryPlan()
+        +report(self)
+        +to_dict(self)
+
+    -MemoryGuard()
+        +__init__(self, limit, plan = None)
+        +over(self)
+        +fit_chunk(self, chunkSize, least)
+        +fit_merge_memory(self, mergeMemory, least)
+        +fit_merge(self, bufferSize, runs, least)
+        -_resident(self)
+
+    -SortJournal()
+        +__init__(self, path, job)
+        +load(self)
+        +add_run(self, path, records, offset)
+        +extend_run(self, records, offset)
+        +restart(self)
+        +finish_split(self)
+        +resume_offset(self)
+        +set_plan(self, mergePlan)
+        +retarget(self, output)
+        +finish_merge(self, step, output)
+        +merges_done(self)
+        +save(self)
+        +remove(self)
+
+    -TopSelection()
+        +__init__(self, records, count, largest = False)
+        +add(self, chunk)
+        +keep(self, chunk)
+        +spill(self)
+        +finish(self, engine)
+        +cut(self, ordered, tempDir = None)
+        -_add_distinct(self, keys, chunk)
+        -_tail(self, ordered, tempDir)
+
+    -RangeSelection()
+        +__init__(self, records, low = None, high = None)
+        +add(self, chunk)
+        +keep(self, chunk)
+        +spill(self)
+        +finish(self, engine)
+        +cut(self, ordered, tempDir = None)
+
+    -SparseIndex()
+        +__init__(self, records, every = 1024)
+        +add(self, key, blockBytes)
+        +extend(self, other)
+        +save(self, path)
+
+    -IndexedFile()
+        +__init__(self, path, indexPath = None)
+        +lookup(self, key)
+        +scan(self, low = None, high = None)
+        +close(self)
+        -_block(self, block)
+        -_load(self, indexPath)
 
     -FileSuture()
         +pick_target(self, thread)
+        +merge(self, threads)
+
+    -HeapSuture()
+        +merge(self, threads)
+
+    -LoserTreeSuture()
+        +merge(self, threads)
+
+    -BlockSuture()
+        +__init__(self, blockRecords = 8192)
+        +merge(self, threads)
+        +merge_blocks(self, threads)
 
 Helper Function(s):
     -_murder_file(file)
+    -_stitch_corpse(chunk, chunkName, records, engine, runs = None)
+    -_stitch_part(surgeon, slices, partName, bufferSize, indexEvery = 0)
+    -_append_file(source, target)
+    -_time_reads(chunks)
+    -_first_of_first(pair)
+    -_open_source(path, mode, bufferSize = -1)
+    -_line_chunks(lines, chunkSize)
+    -_chunk_bytes(chunkSize)
+    -_resident_bytes()
+    -_private_bytes()
+    -_map_file(path)
+    -_drop_pages(mapped, start, end)
+    -_open_file_limit()
+    -_put_until_stopped(blockQueue, item, stop)
+    -_gallop(block, bound, lo, inclusive)
+    -_varint_deltas(values)
+    -_varint_sums(data, count)
+    -_file_checksum(path)
+    -_file_matches(path, size, checksum)
+    -_chunk_order(records, chunk)
+    -_growing_size(first, most)
+    -_run_order(keys, strict = False)
+    -_keys_in_order(keys, compare)
+    -_put_in_order(chunk, order)
+    -_like_chunk(chunk, records)
+    -_text_bytes(text, fileHandle)
+    -_index_key_codec(keys)
+    -_pack_array(typecode, values)
+    -_unpack_array(typecode, data)
+    +pick_splitters(samples, parts)
+    +uint32_array(data)
+    +uint32_bytes(values)
 
 Global(s):
-    -_workingDir: The current working directory
+    -_workingDir: The current working directory, where temp files go by default
+    -SUTURE_PLANS: name to merge strategy class lookup
+    -RECORD_FORMATS: name to record format class lookup
+    -KEY_TYPES: typed keys text can be sorted by
+    -DUPLICATE_MODES: name to duplicate dropping record format lookup
+    -RUN_ENCODINGS: name to run encoding class lookup
+    -UINT32: array typecode for 4 byte unsigned ints
+    -INDEX_SUFFIX: what is added to an output file's name for its sparse index
 
 ----------
 CHANGE LOG
@@ -42,11 +320,121 @@ CHANGE LOG
     -08/04/17 - Started. Moved all file manipulation code to this file. added in code to merge
                     chunk files back together and a filepicker for nway merging.
     -08/05/17 - Formatting fixes and documentation added.
+    -10/17/26 - Made the merge strategy pluggable. FileSurgeon now asks its plan for a merge
+                    generator. Added HeapSuture and LoserTreeSuture for O(log k) merging and
+                    fixed FileSuture.pick_target never tracking the smallest line.
+    -10/17/26 - FileMutilator can hand chunks to a process pool to sort and write them,
+                    with a cap on how many chunks are in flight at once.
+    -10/17/26 - Added record formats. BinaryRecords splits, sorts and merges little-endian
+                    uint32 records through mmap without a str per record.
+    -10/17/26 - Chunks are sorted by a sort engine from Sorts.SORT_ENGINES.
+    -10/17/26 - Added MergePlanner. When there are more runs than the buffer or open file
+                    budget allows, runs are merged in several passes through intermediate
+                    merge files, smallest runs first.
+    -10/17/26 - Added replacement selection run generation to FileMutilator. Runs come out
+                    about twice the memory size on random input and as one run on sorted input.
+    -10/17/26 - Added ReadAhead and WriteBehind so FileSurgeon can refill runs and flush
+                    output on background threads while it merges, and report the overlap.
+    -10/17/26 - Added BlockSuture, which reads runs in blocks and hands out whole slices of a
+                    block that are known to come before every other run's head.
+    -10/17/26 - FileMutilator keeps per chunk stats: records, bytes, read, sort and write
+                    seconds and the sort engine's operation counts.
+    -10/17/26 - Added MemoryPlanner, which turns a memory budget into the chunk size, merge
+                    fan-in and block sizes from the measured in-memory cost of a record, and
+                    MemoryGuard, which FileMutilator uses to cut the chunk size if the
+                    process goes over the budget anyway.
+    -10/17/26 - Added run encodings. ZlibRuns and DeltaRuns write chunk and intermediate
+                    merge files as compressed blocks that FileSurgeon decodes a block at a
+                    time, and count the bytes saved and the seconds it cost.
+    -10/17/26 - Added SortJournal. FileMutilator and FileSurgeon record each finished run
+                    and merge in it and pick up from it, so a sort that dies can resume.
+                    hide_remains() deletes the chunk files on python 3 now too.
+    -10/17/26 - The record formats read from and write to open files and other iterables as
+                    well as file names, so FileMutilator can split stdin, and FileSurgeon can
+                    stream_stitching() the final merge to the caller instead of a file.
+    -10/17/26 - Added KeyedTextRecords, which sorts and merges lines by an int, float or
+                    prefix key parsed once per line instead of by the raw string.
+    -10/17/26 - Added UniqueRecords and CountedRecords, which drop or count duplicates when
+                    a chunk is sorted and again in every merge, so they never reach the
+                    temp files twice.
+    -10/17/26 - Added FileSurgeon.parallel_stitching(). With mergeWorkers it cuts the runs
+                    into key ranges at sampled splitters and merges each range in its own
+                    process, then appends the part files with os.sendfile.
+    -10/17/26 - FileMutilator and MergePlanner take a tempDir, so several sorts can share a
+                    host. Added pick_splitters() for Shards.py.
+    -10/17/26 - FileMutilator checks each chunk's order before sorting it. Ascending chunks
+                    are written as they are, descending ones reversed, and a chunk that carries
+                    on the run before it is added to that run's file. Record formats can tell
+                    if a whole file is in order with in_order().
+    -10/17/26 - Added TopSelection and RangeSelection, which pick the smallest or largest
+                    records or a key range out of the chunks as they are read, so a partial
+                    sort needs no chunk files unless what it picks is bigger than a chunk.
+    -10/17/26 - FileSurgeon can write a SparseIndex of every Nth record's key and offset next
+                    to the output while it merges. IndexedFile uses it for lookups and range
+                    scans on the sorted file.
+    -10/17/26 - SortJournal.retarget() moves the last merge of a resumed plan to the
+                    current output.
+    -10/17/26 - The memory budget holds: MemoryPlanner measures reading, sorting and
+                    writing a chunk, and MemoryGuard sizes every chunk before it is read,
+                    the merge plan after the split and every merge's buffers before it
+                    starts. Binary runs drop the mapped pages they have read. Chunk
+                    readers let go of a chunk before reading the next, and text chunks
+                    are written a block of lines at a time.
+    -10/17/26 - MemoryPlanner.least_memory() gives the smallest budget it can plan with.
+    -10/17/26 - in_order() checks a few records first and reads blocks that grow from
+                    there up to readSize, so a file out of order is turned down early.
+    -10/17/26 - Keyed sorts are stable end to end: decorate() gives every line a tiebreak,
+                    its run's index in a merge and its input position in replacement
+                    selection, so equal keys are never ordered by the line. A stable
+                    MergePlanner only merges neighbouring runs.
+    -10/17/26 - TopSelection keeping the largest keeps the last of equal keys, in input
+                    order, like the end of a stable sort, and spills in input order.
+    -10/17/26 - MemoryPlanner.plan() takes selection, to plan for holding picked records
+                    beside the chunk being read.
+    -10/17/26 - MemoryPlanner counts every split worker as a copy of the parent's own
+                    memory on top of its chunks, and plans fewer workers when they do not
+                    fit. MemoryGuard.fit_chunk() takes the workers off the limit too.
+    -10/17/26 - MemoryPlanner.plan() takes mergeWorkers and counts every merge worker
+                    the same way, planning fewer when they do not fit.
+                    MemoryGuard.fit_merge() takes them off the limit too.
 """
+import array
+import bisect
+import collections
+import contextlib
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import multiprocessing
+import operator
+import shutil
+import struct
+import threading
+import time
 import sys
+import zlib
 import os
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 import Sorts
+
+#resource is unix only, without it the open file limit is not checked
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#tracemalloc is python 3.4+, without it sort memory is estimated instead of measured
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
 """
 Globals
 -----
@@ -54,306 +442,5728 @@ Globals
 #current working directory
 _workingDir = os.path.dirname(os.path.realpath(__file__))
 
+#array typecode that holds a uint32 on this platform
+UINT32 = 'I' if array.array('I').itemsize == 4 else 'L'
+
+#one uint32 record read straight out of a mapped run
+_UINT32_LE = struct.Struct('<I')
+
+#what is added to an output file's name for its sparse index
+INDEX_SUFFIX = '.idx'
+
+#groups pairs by their first item
+_first = operator.itemgetter(0)
+
+#the input position of a (key, position, record) triple
+_second = operator.itemgetter(1)
+
+#map and zip are lazy on python 3 only, and order checks stop at the first record out of place
+_imap = getattr(itertools, 'imap', map)
+_izip = getattr(itertools, 'izip', zip)
+
+#records looked at before checking a whole chunk's order, so unsorted chunks cost little
+_ORDER_PROBE = 64
+
 
 """
-FileMutilator class
+TextRecords class
 -----
 """
-class FileMutilator():
+class TextRecords(object):
     """
-    The purpose of this class is to handle all aspects of splitting a data file into blocks
-    and handling all clean up needed regarding these files after the sorting is complete.
+    This class reads and writes the newline separated text records that dgen.py makes.
+    Records are the lines themselves, newline included.
 
     Attributes:
-        -victim (string): the name of the data file
-        -chunkSize (int): the size in bytes to be read and written
+        -N/A
     """
-    #format for chunk file naming
-    _chunk_file_naming_format = 'chunk_file{0}.dat'
+    name = 'text'
 
-    #holds the names of the chunk files
-    _chunkFiles = []
+    #bytes per record on disk, None when records are not fixed width
+    recordSize = None
 
-    #tells us if the chunks are sorted
-    sortedChunks = False
+    #records are compared as they are, see KeyedTextRecords
+    keyed = False
 
-    def __init__(self, victim, chunkSize):
-        assert isinstance(victim, str)
-        assert isinstance(chunkSize, int)
+    #duplicates are kept, see UniqueRecords
+    distinct = False
 
-        self.victim = os.path.join(_workingDir, victim)
-        self.chunkSize = chunkSize
+    #lines joined per write when writing a chunk
+    _write_lines = 8192
 
-    def get_chunks_list(self):
+    def read_chunks(self, path, chunkSize, skip = 0):
         """
-        This method simply returns a list of the names of chunk files
+        This generator reads a file 'chunkSize' bytes of lines at a time.
 
         args:
-            -N/A
+            -path (string or iterable): the file to read, or an open file like stdin or
+                                        any other iterable of lines, which is left open
+            -chunkSize (int or callable): about how many bytes to put in each chunk, a
+                                            callable is asked again before every chunk
+            -skip (int): lines to skip before the first chunk
 
         return:
-            -list: list of chunk file names
+            -generator: lists of lines
         """
-        return self._chunkFiles
+        with _open_source(path, 'r') as fileHandle:
+            #text files can not seek to a line, so read past them without keeping them
+            collections.deque(itertools.islice(fileHandle, skip), 0)
 
-    def hide_remains(self):
+            if not hasattr(fileHandle, 'readlines'):
+                for chunk in _line_chunks(fileHandle, chunkSize):
+                    yield chunk
+                return
+
+            while True:
+                #use readlines so we get a list of lines that can be sorted.
+                chunk = fileHandle.readlines(_chunk_bytes(chunkSize))
+
+                #if the chunk is empty we are @ EOF
+                if not chunk:
+                    return
+
+                yield chunk
+
+                #let go of it before the next one is read, so two are never held at once
+                del chunk
+
+    def sort_chunk(self, chunk, engine, order = None):
         """
-        This method handles cleanup. This means deleting all of the chunk files.
+        This method sorts a chunk of lines.
 
         args:
-            -N/A
+            -chunk (list): the lines
+            -engine (obj): the sort engine
+            -order (string): what chunk_order() found, the chunk is only put in order
+                            without the engine when it is 'ascending' or 'descending'
+
+        return:
+            -list: the lines, sorted
+        """
+        if order is not None:
+            return _put_in_order(chunk, order)
+        return engine.sort_lines(chunk)
+
+    def write_chunk(self, chunk, path, append = False):
+        """
+        This method writes a chunk of lines to a file.
+
+        args:
+            -chunk (list): the lines
+            -path (string): the file to write
+            -append (bool): add to the end of the file instead of replacing it
 
         return:
             -N/A
         """
-        map(_murder_file, self._chunkFiles)
+        #turn the chunk lines into strings we can write a block at a time, the whole
+        #chunk joined at once would cost its size in memory again
+        with open(path, 'a' if append else 'w') as fileHandle:
+            for start in range(0, len(chunk), TextRecords._write_lines):
+                fileHandle.write(''.join(chunk[start:start + TextRecords._write_lines]))
 
-    def commit_mutilation(self):
+    def open_run(self, path, bufferSize):
         """
-        This method splits the victim file into 'self.chunkSize' long chunk files
-        where each chunk was quick sorted in-place before being written to a file and the name
-        of that file recorded.
+        This method opens a sorted run for merging.
 
         args:
+            -path (string): the run file
+            -bufferSize (int): read buffer size in bytes
+
+        return:
+            -file: the open file, which iterates lines
+        """
+        return open(path, 'r', bufferSize)
+
+    def write_merged(self, records, path, bufferSize, index = None):
+        """
+        This method writes merged lines to the output file.
+
+        args:
+            -records (iterable): the lines in order
+            -path (string or file): the output file, or an open file like stdout, which
+                                    is left open
+            -bufferSize (int): write buffer size in bytes
+            -index (SparseIndex): gets the key and offset of every 'every'th line as it is
+                                    written, None for no index
+
+        return:
             -N/A
+        """
+        with _open_source(path, 'w', bufferSize) as targetFile:
+            if index is None:
+                #writelines pulls the whole merge through in one call
+                targetFile.writelines(records)
+                return
+
+            #a block per index entry, so its size is all that has to be measured
+            records = iter(records)
+            for block in iter(lambda: list(itertools.islice(records, index.every)), []):
+                text = ''.join(block)
+                targetFile.write(text)
+                index.add(self.record_key(block[0]), _text_bytes(text, targetFile))
+
+    def record_key(self, record):
+        """
+        This method gets what a record is ordered by. Lines are ordered as they are.
+
+        args:
+            -record (string): the line
 
         return:
-            -None:
+            -string: the line
         """
-        #keep track of the current chunk being created
-        chunkNum = 0
-        with open(self.victim) as fileHandle:
-            while True:
-                #use readlines so we get a list of lines that can be sorted.
-                chunk = fileHandle.readlines(self.chunkSize)
+        return record
 
-                #if the chunk is empty we are @ EOF; so break
-                if not chunk:
-                    break
+    def chunk_keys(self, chunk):
+        """
+        This method gets what every record of a chunk is ordered by.
 
-                #sort and write chunk to chunkFiles
-                self._hide_corpse(chunk, chunkNum)
+        args:
+            -chunk (list): the lines
 
-                #increment for next chunk file so they are uniquely named
-                chunkNum += 1
+        return:
+            -list: the lines
+        """
+        return chunk
 
-    def _hide_corpse(self, chunk, chunkNum):
+    def chunk_order(self, chunk):
         """
-        This method writes a chunk to a chunk file and records the name.
+        This method checks if a chunk is already sorted either way round.
 
         args:
-            -chunk (list): a list list of lines to put into a chunk file
-            -chunkNum (int): the number to use as part of the chunk file name
+            -chunk (list): the lines
 
         return:
-            -N/A
+            -string: 'ascending', 'descending', or None if it needs sorting
         """
-        #type checking
-        assert isinstance(chunk, list)
-        assert isinstance(chunkNum, int)
+        return _chunk_order(self, chunk)
 
-        #build the name
-        chunkName = os.path.join(_workingDir, FileMutilator._chunk_file_naming_format.format(chunkNum))
+    def in_order(self, path, readSize, strict = False):
+        """
+        This method checks if a whole file is already sorted, and would be written back
+        byte for byte the same, so sorting it can be skipped. It stops at the first line
+        out of place. The first few lines are checked on their own and the blocks read
+        after them grow from there, so a file that needs sorting is usually turned down
+        having read very little of it. Line endings other than \\n and a last line with
+        no newline are changed by a sort, so those files are never in order.
 
-        #store the file name
-        self._chunkFiles.append(chunkName)
+        args:
+            -path (string): the file
+            -readSize (int): the most bytes to check at a time
+            -strict (bool): equal neighbours are out of place too
 
-        #save some time and do the quicksort now while values already in memory
-        Sorts.qsort_inplace(chunk, 0, len(chunk) - 1)
+        return:
+            -bool: True if the file is in order
+        """
+        compare = operator.lt if strict else operator.le
+        last = None
+        lastLine = None
+        with open(path, 'r') as fileHandle:
+            #a few lines on their own first, like _chunk_order() probes a chunk
+            chunk = [line for line in (fileHandle.readline() for _ in range(_ORDER_PROBE)) if line]
+            nextSize = _growing_size(sum(len(line) for line in chunk), readSize)
+            while chunk:
+                keys = self.chunk_keys(chunk)
+                if last is not None and not compare(last, keys[0]):
+                    return False
+                if not _keys_in_order(keys, compare):
+                    return False
+                last = keys[-1]
+                lastLine = chunk[-1]
+                del chunk, keys
+                chunk = fileHandle.readlines(nextSize())
 
-        #turn the chunk lines into a string we can write
-        toWrite = ''.join(chunk)
+            #newlines is only set when python 3 translated line endings
+            newlines = getattr(fileHandle, 'newlines', None)
 
-        #write the chunk to file
-        with open(chunkName, 'w') as fileHandle:
-            try:
-                fileHandle.write(toWrite)
-            except Exception as e:
-                raise RuntimeError('Failed to write chunk data to file {0}.'.format(chunkName)\
-                                    + 'Error was: {0}'.format(e))
+        return newlines in (None, '\n') and (lastLine is None or lastLine.endswith('\n'))
 
+    def parse_bound(self, text):
+        """
+        This method turns a bound given on the command line into something records
+        can be compared with. Lines are compared as they are, so 'abc' comes before
+        every line that starts with it.
 
+        args:
+            -text (string): the bound
 
-"""
-AmmoRack class
------
-"""
-class AmmoRack(object):
-    """
-    This class is for keeping track of chunk files.
+        return:
+            -string: the bound
+        """
+        return text
 
-    Attributes:
-        -files (list of strings): list of file paths
-    """
-    def __init__(self, files):
-        self.rounds = files
+    def sample_run(self, path, count):
+        """
+        This method reads about 'count' lines spread evenly through a sorted run.
 
-        self.spent = set()
-        self.roundCount = len(files)
-        self.blanks = {i: None for i in range(self.roundCount)}
+        args:
+            -path (string): the run file
+            -count (int): how many lines to take
 
-    def make_war_plans(self):
+        return:
+            -list: the lines, in run order
         """
-        The purpose of this method is is return a dictionary of the blanks.
+        size = os.path.getsize(path)
+        samples = []
+        lastStart = None
+        with open(path, 'rb') as runFile:
+            for i in range(count):
+                start, line = self._line_from(runFile, size * i // count)
+
+                #long lines can be landed in more than once
+                if line is not None and start != lastStart:
+                    samples.append(line)
+                    lastStart = start
+        return samples
+
+    def find_bounds(self, path, bounds):
+        """
+        This method binary searches a sorted run for where each bound falls. Seeks land
+        part way through lines, so every probe reads on to the start of the next line.
 
         args:
-            -N/A
+            -path (string): the run file
+            -bounds (list): keys from record_key(), in order
 
         return:
-            dict: the dict of the blanks
+            -list of ints: for each bound, the byte offset of the first line whose key is
+                            bigger than it
         """
-        try:
-            #try to build the dictionary
-            warPlan = {i: self.blanks[i] for i in range(self.roundCount) if i not in self.spent}
-        except Exception as e:
-            raise RuntimeError('Failed to make war plans with error: {0}'.format(e))
+        size = os.path.getsize(path)
+        offsets = []
+        with open(path, 'rb') as runFile:
+            for bound in bounds:
+                #smallest position whose next line is past the bound
+                lo, hi = 0, size
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    _, line = self._line_from(runFile, mid)
+                    if line is None or self.record_key(line) > bound:
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                offsets.append(self._line_from(runFile, lo)[0])
+        return offsets
 
-        return warPlan
+    def open_slice(self, path, start, end, bufferSize):
+        """
+        This method opens the lines between two byte offsets from find_bounds() of a
+        sorted run for merging.
 
-    def reload(self):
+        args:
+            -path (string): the run file
+            -start (int): offset of the first line
+            -end (int): offset just past the last line
+            -bufferSize (int): bytes to read at a time
+
+        return:
+            -generator: the lines
         """
-        The purpose of this method is to refresh the values in AmmoRack as changes are
-        being made.
+        return self._iter_slice(path, start, end, bufferSize)
 
-        This is intended to be used in a while loop like `while obj.reload():`
+    def _iter_slice(self, path, start, end, bufferSize):
+        """
+        This generator reads the lines of a slice a buffer at a time.
 
         args:
-            -N/A
+            -path (string): the run file
+            -start (int): offset of the first line
+            -end (int): offset just past the last line
+            -bufferSize (int): bytes to read at a time
 
         return:
-            -bool: True if done; else False
+            -generator: the lines
         """
-        #loop through files
-        for i in range(self.roundCount):
-            #check for EOF and already seen
-            if self.blanks[i] is None and i not in self.spent:
-                #reload a blank
-                self.blanks[i] = self.rounds[i].readline()
+        with open(path, 'rb') as runFile:
+            runFile.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = runFile.read(min(bufferSize, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
 
-                #if the black reload failed, record that that one is out of ammo
-                if self.blanks[i] == '':
-                    self.spent.add(i)
+                #finish the line the buffer ends in
+                if remaining > 0 and not data.endswith(b'\n'):
+                    rest = runFile.readline()
+                    remaining -= len(rest)
+                    data += rest
 
-        #done with all files
-        if len(self.spent) == self.roundCount:
-            return False
+                for line in self.unpack(data):
+                    yield line
 
-        #still working on files
-        return True
+    def _line_from(self, runFile, position):
+        """
+        This method finds the first line that starts at or after a byte offset.
 
-    def unload(self, index):
+        args:
+            -runFile (file): the run, opened in binary mode
+            -position (int): the byte offset
+
+        return:
+            -tuple: (offset of the line, the line or None at the end of the file)
         """
-        The purpose of this method is to provide a quick way to remove a value from
-        the blanks list and replace it with null.
+        runFile.seek(max(0, position - 1))
+        if position:
+            #the rest of the line the offset is in, nothing if it is a line start
+            runFile.readline()
+
+        start = runFile.tell()
+        line = runFile.readline()
+        return start, (line.decode('utf-8') if line else None)
+
+    def pack(self, block):
+        """
+        This method turns a block of lines into bytes for a run encoding.
 
         args:
-            index (int): the index you want to unload
+            -block (list): the lines
 
         return:
-            -int: the value at the index
+            -bytes: the lines as utf-8
         """
-        #get value
-        value = self.blanks[index]
+        data = ''.join(block)
+        return data if isinstance(data, bytes) else data.encode('utf-8')
 
-        #set to None
-        self.blanks[index] = None
+    def unpack(self, data):
+        """
+        This method turns bytes from pack() back into lines.
 
-        return value
+        args:
+            -data (bytes): the packed lines
+
+        return:
+            -list: the lines, newlines included
+        """
+        text = data if isinstance(data, str) else data.decode('utf-8')
+        lines = text.split('\n')
 
+        #split leaves an empty string after the last newline
+        last = lines.pop()
+        lines = [line + '\n' for line in lines]
+        if last:
+            lines.append(last)
+        return lines
 
 
 """
-FileSurgeon class
+KeyedTextRecords class
 -----
 """
-class FileSurgeon(object):
+class KeyedTextRecords(TextRecords):
     """
-    This class provides the utility to merge a bunch of chunk files back together.
+    This class reads and writes text lines like TextRecords but orders them by a typed
+    key instead of by the raw string, so numbers that are not zero padded still sort
+    right. The keys of a block of lines are parsed once into a compact array: int and
+    float keys into array('q') and array('d'), prefix keys into a list of the first
+    'width' characters. Chunks are sorted by their keys, and while merging every line
+    travels as a (key, tiebreak, line) triple so the merge compares keys too and never
+    the lines. The lines are written back out untouched. The sort is stable like
+    sort -s -k: lines with equal keys keep their input order.
 
     Attributes:
-        -sPlan (obj): the way we are going to merge the files back together
+        -keyType (string): 'int', 'float' or 'prefix'
+        -width (int): characters in a prefix key
     """
-    def __init__(self, sPlan):
-        self.sugery_plan = sPlan
+    #every line is merged with its key
+    keyed = True
 
-    def prep_for_surgery(self, patients, chunkSize):
+    #key types and the array each one is parsed into, None for a list
+    _key_arrays = {'int': 'q', 'float': 'd', 'prefix': None}
+
+    #lines parsed at a time while decorating a run
+    _key_block = 4096
+
+    def __init__(self, keyType = 'int', width = 8):
+        assert keyType in KeyedTextRecords._key_arrays, 'unknown key type {0}'.format(keyType)
+        assert isinstance(width, int) and width > 0
+
+        self.keyType = keyType
+        self.width = width
+
+    def parse_keys(self, lines):
         """
-        This method prepares chunk files for reading by opening the files.
+        This method parses the key of every line.
 
         args:
-            -patients (list of strings): list of file names
-            -chunkSize (int): max size of files in bytes
+            -lines (list): the lines
 
         return:
-            -dict: the open files
+            -array or list: the keys, in line order
         """
-        waitingRoom = {}
+        if self.keyType == 'prefix':
+            width = self.width
+            return [line[:width] for line in lines]
 
-        #open files and store pointers to them
-        for i in range(len(patients)):
-            waitingRoom[i] = open(patients[i], 'r', chunkSize)
+        parse = int if self.keyType == 'int' else float
+        try:
+            return array.array(KeyedTextRecords._key_arrays[self.keyType], map(parse, lines))
+        except OverflowError:
+            #ints too big for 64 bits still sort, as a list
+            return list(map(parse, lines))
+        except ValueError as e:
+            raise ValueError('a line does not have an {0} key: {1}'.format(self.keyType, e))
 
-        return waitingRoom
+    def record_key(self, record):
+        """
+        This method parses the key of one line.
 
-    def start_stitching(self, patients, targetFileName, chunkSize):
+        args:
+            -record (string): the line
+
+        return:
+            -int, float or string: the key
         """
-        This method actually does the file merge.
+        return self.parse_keys([record])[0]
+
+    def chunk_keys(self, chunk):
+        """
+        This method parses the key of every line of a chunk.
 
         args:
-            -patients (list of strings): the files
-            -targetFileName (string): the name for the outfile
-            -chunkSize (int): max size of files in bytes
+            -chunk (list): the lines
 
         return:
-            -N/A
+            -list or array: the keys
+        """
+        return self.parse_keys(chunk)
+
+    def parse_bound(self, text):
         """
-        #prepare for battle
-        ammo = AmmoRack(self.prep_for_surgery(patients, chunkSize))
+        This method parses a bound given on the command line like a line's key.
 
-        #open the target file
-        with open(targetFileName, 'w', chunkSize) as targetFile:
-            #WAR
-            while ammo.reload():
-                #get target
-                selectedTarget = self.sugery_plan.pick_target(ammo.make_war_plans())
+        args:
+            -text (string): the bound
 
-                #bombs away
-                targetFile.write(ammo.unload(selectedTarget))
+        return:
+            -int, float or string: the key
+        """
+        return self.parse_keys([text])[0]
 
+    def sort_chunk(self, chunk, engine, order = None):
+        """
+        This method sorts a chunk of lines by their keys.
 
-"""
-FileSuture class
------
-"""
-class FileSuture(object):
-    """
-    This class provides provides an nway merger select
+        args:
+            -chunk (list): the lines
+            -engine (obj): the sort engine
+            -order (string): what chunk_order() found, see TextRecords.sort_chunk()
 
-    Attributes:
-        -N/A
-    """
-    def pick_target(self, thread):
+        return:
+            -list: the lines, sorted
         """
-        This method picks a file from a list of files.
+        if order is not None:
+            return _put_in_order(chunk, order)
+        return engine.sort_keyed(self.parse_keys(chunk), chunk)
+
+    def decorate(self, records, tiebreak = None):
+        """
+        This method gives every line of a sorted run its key for the merge, a block of
+        keys at a time. Lines with equal keys are told apart by the tiebreak instead of
+        by the lines, so they keep their input order: a merge gives every line of a run
+        the run's index, and anything else numbers the lines as they come.
 
         args:
-            -thread (list of strings): list of file names
+            -records (iterable): the lines
+            -tiebreak (int): the same for every line, None to number them
+
+        return:
+            -iterator: (key, tiebreak, line) triples
         """
-        incisionPoint = -1
-        pathToCut = None
+        records = iter(records)
+        size = KeyedTextRecords._key_block
+        blocks = iter(lambda: list(itertools.islice(records, size)), [])
+        ties = itertools.count() if tiebreak is None else itertools.repeat(tiebreak)
 
-        #find the right file
-        for i in range(len(thread)):
-            if pathToCut is None or thread[i] < pathToCut:
-                incisionPoint = i
+        #zip stops at the end of a block's keys before taking another tiebreak
+        return itertools.chain.from_iterable(zip(self.parse_keys(block), ties, block)
+                                             for block in blocks)
 
-        return incisionPoint
+    def undecorate(self, records):
+        """
+        This method takes the keys back off merged (key, tiebreak, line) triples.
 
+        args:
+            -records (iterable): the triples
 
-"""
-Helper Function(s)
+        return:
+            -generator: the lines
+        """
+        return (line for _, _, line in records)
+
+
+"""
+BinaryRecords class
+-----
+"""
+class BinaryRecords(object):
+    """
+    This class reads and writes fixed width little-endian uint32 records. Files are
+    mmap-ed and sliced into arrays, so records are plain ints and never become strs.
+
+    Attributes:
+        -N/A
+    """
+    name = 'binary'
+
+    #bytes per record on disk
+    recordSize = 4
+
+    #records are compared as they are
+    keyed = False
+
+    #duplicates are kept
+    distinct = False
+
+    def read_chunks(self, path, chunkSize, skip = 0):
+        """
+        This generator maps a file and slices it into 'chunkSize' byte arrays of uint32s.
+
+        args:
+            -path (string or iterable): the file to read, or an open binary file like
+                                        stdin's buffer or any iterable of ints, which is
+                                        left open
+            -chunkSize (int or callable): about how many bytes to put in each chunk, a
+                                            callable is asked again before every chunk
+            -skip (int): records to skip before the first chunk
+
+        return:
+            -generator: arrays of ints
+        """
+        if not isinstance(path, str):
+            for chunk in self._stream_chunks(path, chunkSize, skip):
+                yield chunk
+            return
+
+        mapped = _map_file(path)
+        if mapped is None:
+            return
+
+        try:
+            offset = dropped = skip * self.recordSize
+            while offset < len(mapped):
+                #keep chunks on a record boundary
+                step = _chunk_bytes(chunkSize)
+                step = max(self.recordSize, step - step % self.recordSize)
+
+                chunk = uint32_array(mapped[offset:offset + step])
+                offset += step
+                dropped = _drop_pages(mapped, dropped, offset)
+
+                yield chunk
+                del chunk
+        finally:
+            mapped.close()
+
+    def _stream_chunks(self, stream, chunkSize, skip):
+        """
+        This generator cuts an open binary file or an iterable of ints into arrays of
+        uint32s.
+
+        args:
+            -stream (file or iterable): where the records come from
+            -chunkSize (int or callable): about how many bytes to put in each chunk
+            -skip (int): records to skip before the first chunk
+
+        return:
+            -generator: arrays of ints
+        """
+        if not hasattr(stream, 'read'):
+            values = iter(stream)
+            collections.deque(itertools.islice(values, skip), 0)
+            while True:
+                count = max(1, _chunk_bytes(chunkSize) // self.recordSize)
+                chunk = array.array(UINT32, itertools.islice(values, count))
+                if not chunk:
+                    return
+                yield chunk
+                del chunk
+
+        stream.read(skip * self.recordSize)
+        while True:
+            step = _chunk_bytes(chunkSize)
+            data = stream.read(max(self.recordSize, step - step % self.recordSize))
+
+            #pipes can hand back less than asked for, so finish the last record
+            while len(data) % self.recordSize:
+                more = stream.read(self.recordSize - len(data) % self.recordSize)
+                if not more:
+                    raise ValueError('input is not a whole number of uint32 records')
+                data += more
+
+            if not data:
+                return
+            yield uint32_array(data)
+            del data
+
+    def sort_chunk(self, chunk, engine, order = None):
+        """
+        This method sorts a chunk of uint32s.
+
+        args:
+            -chunk (array): the records
+            -engine (obj): the sort engine
+            -order (string): what chunk_order() found, see TextRecords.sort_chunk()
+
+        return:
+            -array: the records, sorted
+        """
+        if order is not None:
+            return _put_in_order(chunk, order)
+        return engine.sort_uint32(chunk)
+
+    def write_chunk(self, chunk, path, append = False):
+        """
+        This method writes a chunk of uint32s to a file.
+
+        args:
+            -chunk (array): the records
+            -path (string): the file to write
+            -append (bool): add to the end of the file instead of replacing it
+
+        return:
+            -N/A
+        """
+        with open(path, 'ab' if append else 'wb') as fileHandle:
+            if sys.byteorder == 'little':
+                #tofile writes a block at a time instead of copying the chunk to bytes
+                chunk.tofile(fileHandle)
+            else:
+                fileHandle.write(uint32_bytes(chunk))
+
+    def open_run(self, path, bufferSize):
+        """
+        This method opens a sorted run for merging. The run is mmap-ed, so it does not
+        hold a file descriptor while it is merged.
+
+        args:
+            -path (string): the run file
+            -bufferSize (int): how many bytes to turn into ints at a time
+
+        return:
+            -generator: the ints in the run
+        """
+        return self._iter_run(path, bufferSize)
+
+    def record_key(self, record):
+        """
+        This method gets what a record is ordered by. Ints are ordered as they are.
+
+        args:
+            -record (int): the record
+
+        return:
+            -int: the record
+        """
+        return record
+
+    def chunk_keys(self, chunk):
+        """
+        This method gets what every record of a chunk is ordered by.
+
+        args:
+            -chunk (array): the records
+
+        return:
+            -array: the records
+        """
+        return chunk
+
+    def chunk_order(self, chunk):
+        """
+        This method checks if a chunk is already sorted either way round.
+
+        args:
+            -chunk (array): the records
+
+        return:
+            -string: 'ascending', 'descending', or None if it needs sorting
+        """
+        return _chunk_order(self, chunk)
+
+    def in_order(self, path, readSize, strict = False):
+        """
+        This method checks if a whole file is already sorted, so sorting it can be
+        skipped. It stops at the first record out of place. The first few records are
+        checked on their own and the blocks read after them grow from there, so a file
+        that needs sorting is usually turned down having read very little of it. A file
+        with a partial record at the end is never in order.
+
+        args:
+            -path (string): the file
+            -readSize (int): the most bytes to check at a time
+            -strict (bool): equal neighbours are out of place too
+
+        return:
+            -bool: True if the file is in order
+        """
+        if os.path.getsize(path) % self.recordSize:
+            return False
+
+        compare = operator.lt if strict else operator.le
+        last = None
+        for chunk in self.read_chunks(path, _growing_size(_ORDER_PROBE * self.recordSize,
+                                                          readSize)):
+            if last is not None and not compare(last, chunk[0]):
+                return False
+            if not _keys_in_order(chunk, compare):
+                return False
+            last = chunk[-1]
+        return True
+
+    def parse_bound(self, text):
+        """
+        This method parses a bound given on the command line as a uint32.
+
+        args:
+            -text (string): the bound
+
+        return:
+            -int: the bound
+        """
+        try:
+            return int(text)
+        except ValueError:
+            raise ValueError('{0} is not a uint32 bound'.format(text))
+
+    def sample_run(self, path, count):
+        """
+        This method reads about 'count' records spread evenly through a sorted run.
+
+        args:
+            -path (string): the run file
+            -count (int): how many records to take
+
+        return:
+            -list: the ints, in run order
+        """
+        mapped = _map_file(path)
+        if mapped is None:
+            return []
+
+        try:
+            total = len(mapped) // self.recordSize
+            indexes = sorted(set(total * i // count for i in range(count)))
+            return [_UINT32_LE.unpack_from(mapped, index * self.recordSize)[0]
+                    for index in indexes]
+        finally:
+            mapped.close()
+
+    def find_bounds(self, path, bounds):
+        """
+        This method binary searches a sorted run for where each bound falls.
+
+        args:
+            -path (string): the run file
+            -bounds (list): ints, in order
+
+        return:
+            -list of ints: for each bound, the byte offset of the first record bigger
+                            than it
+        """
+        mapped = _map_file(path)
+        if mapped is None:
+            return [0] * len(bounds)
+
+        try:
+            offsets = []
+            total = len(mapped) // self.recordSize
+            for bound in bounds:
+                lo, hi = 0, total
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if _UINT32_LE.unpack_from(mapped, mid * self.recordSize)[0] > bound:
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                offsets.append(lo * self.recordSize)
+            return offsets
+        finally:
+            mapped.close()
+
+    def open_slice(self, path, start, end, bufferSize):
+        """
+        This method opens the records between two byte offsets from find_bounds() of a
+        sorted run for merging.
+
+        args:
+            -path (string): the run file
+            -start (int): offset of the first record
+            -end (int): offset just past the last record
+            -bufferSize (int): how many bytes to turn into ints at a time
+
+        return:
+            -generator: the ints
+        """
+        return self._iter_run(path, bufferSize, start, end)
+
+    def _iter_run(self, path, bufferSize, start = 0, end = None):
+        """
+        This generator walks a mapped run one buffer at a time.
+
+        args:
+            -path (string): the run file
+            -bufferSize (int): how many bytes to turn into ints at a time
+            -start (int): byte offset to start at
+            -end (int): byte offset to stop at, None for the end of the run
+
+        return:
+            -generator: the ints in the run
+        """
+        mapped = _map_file(path)
+        if mapped is None:
+            return
+
+        step = max(self.recordSize, bufferSize - bufferSize % self.recordSize)
+        end = len(mapped) if end is None else min(end, len(mapped))
+
+        try:
+            offset = dropped = start
+            while offset < end:
+                block = uint32_array(mapped[offset:min(offset + step, end)])
+                offset += step
+                dropped = _drop_pages(mapped, dropped, offset)
+
+                for value in block:
+                    yield value
+        finally:
+            mapped.close()
+
+    def write_merged(self, records, path, bufferSize, index = None):
+        """
+        This method packs merged ints into the output file a buffer at a time.
+
+        args:
+            -records (iterable): the ints in order
+            -path (string or file): the output file, or an open binary file like
+                                    stdout's buffer, which is left open
+            -bufferSize (int): write buffer size in bytes
+            -index (SparseIndex): gets the key and offset of every 'every'th record as it
+                                    is written, None for no index
+
+        return:
+            -N/A
+        """
+        perBuffer = max(1, bufferSize // self.recordSize)
+        if index is not None:
+            #whole index blocks per buffer
+            perBuffer = max(index.every, perBuffer - perBuffer % index.every)
+        records = iter(records)
+
+        with _open_source(path, 'wb') as targetFile:
+            while True:
+                batch = array.array(UINT32, itertools.islice(records, perBuffer))
+                if not batch:
+                    return
+                targetFile.write(uint32_bytes(batch))
+
+                if index is not None:
+                    for first in range(0, len(batch), index.every):
+                        index.add(batch[first],
+                                  self.recordSize * min(index.every, len(batch) - first))
+
+    def pack(self, block):
+        """
+        This method turns a block of uint32s into bytes for a run encoding.
+
+        args:
+            -block (list or array): the ints
+
+        return:
+            -bytes: the raw records
+        """
+        return uint32_bytes(array.array(UINT32, block))
+
+    def unpack(self, data):
+        """
+        This method turns bytes from pack() back into uint32s.
+
+        args:
+            -data (bytes): the raw records
+
+        return:
+            -array: the ints
+        """
+        return uint32_array(data)
+
+
+"""
+UniqueRecords class
 -----
 """
+class UniqueRecords(object):
+    """
+    This class wraps a record format so only one of every run of equal records is kept.
+    Duplicates are dropped as soon as a chunk is sorted, before its chunk file is
+    written, and again while runs are merged, so they cost no temp file bytes after
+    the chunk they were read in. Keyed records are equal when their keys are, and the
+    first line with a key is the one kept.
+
+    Attributes:
+        -records (obj): the record format being wrapped
+    """
+    #runs hold one of each record
+    distinct = True
+    counts = False
+
+    def __init__(self, records):
+        self.records = records
+        self.name = records.name
+        self.recordSize = records.recordSize
+        self.keyed = records.keyed
+
+    def read_chunks(self, path, chunkSize, skip = 0):
+        """
+        This generator reads chunks with the wrapped record format.
+
+        args:
+            -path (string or iterable): the file to read
+            -chunkSize (int or callable): about how many bytes to put in each chunk
+            -skip (int): records to skip before the first chunk
+
+        return:
+            -generator: chunks of records
+        """
+        return self.records.read_chunks(path, chunkSize, skip)
+
+    def sort_chunk(self, chunk, engine, order = None):
+        """
+        This method sorts a chunk and drops its duplicates.
+
+        args:
+            -chunk (list or array): the records
+            -engine (obj): the sort engine
+            -order (string): what chunk_order() found, see TextRecords.sort_chunk()
+
+        return:
+            -list or array: the distinct records, sorted
+        """
+        return self._as_chunk(self.aggregate(self.records.sort_chunk(chunk, engine, order)))
+
+    def aggregate(self, records):
+        """
+        This generator collapses sorted records to one of each.
+
+        args:
+            -records (iterable): the records in order
+
+        return:
+            -generator: the distinct records
+        """
+        if self.keyed:
+            for _, group in itertools.groupby(self.records.decorate(records), _first):
+                yield next(group)[-1]
+            return
+
+        for record, _ in itertools.groupby(records):
+            yield record
+
+    def collapse(self, merged):
+        """
+        This generator collapses the merged records of several runs to one of each.
+        Keyed records are still paired with their keys here.
+
+        args:
+            -merged (iterable): the merged records
+
+        return:
+            -generator: the distinct records
+        """
+        if self.keyed:
+            for _, group in itertools.groupby(merged, _first):
+                yield next(group)
+            return
+
+        for record, _ in itertools.groupby(merged):
+            yield record
+
+    def decorate(self, records, tiebreak = None):
+        """
+        This method gives records their keys, see KeyedTextRecords.decorate().
+
+        args:
+            -records (iterable): the records
+            -tiebreak (int): the same for every record, None to number them
+
+        return:
+            -iterator: (key, tiebreak, record) triples
+        """
+        return self.records.decorate(records, tiebreak)
+
+    def undecorate(self, records):
+        """
+        This method takes the keys back off, see KeyedTextRecords.undecorate().
+
+        args:
+            -records (iterable): the triples
+
+        return:
+            -iterator: the records
+        """
+        return self.records.undecorate(records)
+
+    def write_chunk(self, chunk, path, append = False):
+        """
+        This method writes a chunk with the wrapped record format.
+
+        args:
+            -chunk (list or array): the records
+            -path (string): the file to write
+            -append (bool): add to the end of the file instead of replacing it
+
+        return:
+            -N/A
+        """
+        return self.records.write_chunk(chunk, path, append)
+
+    def open_run(self, path, bufferSize):
+        """
+        This method opens a run with the wrapped record format.
+
+        args:
+            -path (string): the run file
+            -bufferSize (int): read buffer size in bytes
+
+        return:
+            -iterator: the records in the run
+        """
+        return self.records.open_run(path, bufferSize)
+
+    def write_merged(self, records, path, bufferSize, index = None):
+        """
+        This method writes merged records with the wrapped record format.
+
+        args:
+            -records (iterable): the records in order
+            -path (string or file): the output file
+            -bufferSize (int): write buffer size in bytes
+            -index (SparseIndex): see TextRecords.write_merged()
+
+        return:
+            -N/A
+        """
+        self.records.write_merged(records, path, bufferSize, index)
+
+    def pack(self, block):
+        """
+        This method packs a block with the wrapped record format.
+
+        args:
+            -block (list or array): the records
+
+        return:
+            -bytes: the packed block
+        """
+        return self.records.pack(block)
+
+    def unpack(self, data):
+        """
+        This method unpacks a block with the wrapped record format.
+
+        args:
+            -data (bytes): the packed block
+
+        return:
+            -list or array: the records
+        """
+        return self.records.unpack(data)
+
+    def record_key(self, record):
+        """
+        This method gets what a record is ordered by with the wrapped record format.
+
+        args:
+            -record (obj): the record
+
+        return:
+            -obj: the key
+        """
+        return self.records.record_key(record)
+
+    def chunk_keys(self, chunk):
+        """
+        This method gets the keys of a chunk with the wrapped record format.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -list or array: the keys
+        """
+        return self.records.chunk_keys(chunk)
+
+    def chunk_order(self, chunk):
+        """
+        This method checks a chunk's order with the wrapped record format.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -string: 'ascending', 'descending', or None if it needs sorting
+        """
+        return self.records.chunk_order(chunk)
+
+    def in_order(self, path, readSize, strict = False):
+        """
+        This method checks a whole file's order with the wrapped record format. A
+        file with duplicates would lose them, so only strictly ascending is in order.
+
+        args:
+            -path (string): the file
+            -readSize (int): the most bytes to check at a time
+            -strict (bool): ignored, always strict
+
+        return:
+            -bool: True if the file is in order
+        """
+        return self.records.in_order(path, readSize, True)
+
+    def parse_bound(self, text):
+        """
+        This method parses a bound with the wrapped record format.
+
+        args:
+            -text (string): the bound
+
+        return:
+            -obj: the bound
+        """
+        return self.records.parse_bound(text)
+
+    def sample_run(self, path, count):
+        """
+        This method samples a run with the wrapped record format.
+
+        args:
+            -path (string): the run file
+            -count (int): how many records to take
+
+        return:
+            -list: the records, in run order
+        """
+        return self.records.sample_run(path, count)
+
+    def find_bounds(self, path, bounds):
+        """
+        This method searches a run with the wrapped record format. Equal records fall
+        on the same side of every bound, so the slices can be collapsed apart.
+
+        args:
+            -path (string): the run file
+            -bounds (list): keys from record_key(), in order
+
+        return:
+            -list of ints: byte offsets
+        """
+        return self.records.find_bounds(path, bounds)
+
+    def open_slice(self, path, start, end, bufferSize):
+        """
+        This method opens part of a run with the wrapped record format.
+
+        args:
+            -path (string): the run file
+            -start (int): offset of the first record
+            -end (int): offset just past the last record
+            -bufferSize (int): read buffer size in bytes
+
+        return:
+            -iterator: the records
+        """
+        return self.records.open_slice(path, start, end, bufferSize)
+
+    def _as_chunk(self, records):
+        """
+        This method turns aggregated records back into what write_chunk() takes.
+
+        args:
+            -records (iterable): the records
+
+        return:
+            -list or array: the chunk
+        """
+        if self.recordSize is not None:
+            return array.array(UINT32, records)
+        return list(records)
+
+
+"""
+CountedRecords class
+-----
+"""
+class CountedRecords(UniqueRecords):
+    """
+    This class wraps a record format like UniqueRecords but keeps how many times each
+    record was seen. Records become (record, count) pairs once a chunk is sorted, and
+    equal records add their counts while runs are merged. Text runs and output are
+    lines of the count, a tab and the line, like 'uniq -c'; binary ones are uint32
+    pairs of the value and the count, with counts too big for a uint32 split over
+    several pairs.
+
+    Attributes:
+        -records (obj): the record format being wrapped
+    """
+    counts = True
+
+    #most a binary count holds
+    _max_count = 0xFFFFFFFF
+
+    def sort_chunk(self, chunk, engine, order = None):
+        """
+        This method sorts a chunk and counts its duplicates.
+
+        args:
+            -chunk (list or array): the records
+            -engine (obj): the sort engine
+            -order (string): what chunk_order() found, see TextRecords.sort_chunk()
+
+        return:
+            -list: (record, count) pairs, sorted
+        """
+        return list(self.aggregate(self.records.sort_chunk(chunk, engine, order)))
+
+    def aggregate(self, records):
+        """
+        This generator counts sorted records.
+
+        args:
+            -records (iterable): the records in order
+
+        return:
+            -generator: (record, count) pairs
+        """
+        if self.keyed:
+            for _, group in itertools.groupby(self.records.decorate(records), _first):
+                record = next(group)[-1]
+                yield record, 1 + sum(1 for _ in group)
+            return
+
+        for record, group in itertools.groupby(records):
+            yield record, sum(1 for _ in group)
+
+    def collapse(self, merged):
+        """
+        This generator adds up the counts of equal records from several runs. Keyed
+        pairs are ((key, tiebreak, record), count) here.
+
+        args:
+            -merged (iterable): the merged pairs
+
+        return:
+            -generator: (record, count) pairs
+        """
+        groupKey = _first_of_first if self.keyed else _first
+
+        for _, group in itertools.groupby(merged, groupKey):
+            record, count = next(group)
+            for _, more in group:
+                count += more
+            yield record, count
+
+    def decorate(self, records, tiebreak = None):
+        """
+        This method gives the records of (record, count) pairs their keys, see
+        KeyedTextRecords.decorate(). The counts are held back only as far as it reads
+        ahead, a block of keys.
+
+        args:
+            -records (iterable): the pairs
+            -tiebreak (int): the same for every record, None to number them
+
+        return:
+            -iterator: ((key, tiebreak, record), count) pairs
+        """
+        pairs, counted = itertools.tee(records)
+        keyed = self.records.decorate((record for record, _ in pairs), tiebreak)
+
+        return ((triple, count) for triple, (_, count) in zip(keyed, counted))
+
+    def undecorate(self, records):
+        """
+        This method takes the keys back off ((key, tiebreak, record), count) pairs.
+
+        args:
+            -records (iterable): the pairs
+
+        return:
+            -generator: (record, count) pairs
+        """
+        return ((record, count) for (_, _, record), count in records)
+
+    def write_chunk(self, chunk, path, append = False):
+        """
+        This method writes a chunk of (record, count) pairs.
+
+        args:
+            -chunk (list): the pairs
+            -path (string): the file to write
+            -append (bool): add to the end of the file instead of replacing it
+
+        return:
+            -N/A
+        """
+        self.records.write_chunk(self._as_records(chunk), path, append)
+
+    def in_order(self, path, readSize, strict = False):
+        """
+        This method says no file is in order, the output has counts the input does not.
+
+        args:
+            -path (string): the file
+            -readSize (int): the most bytes to check at a time
+            -strict (bool): ignored
+
+        return:
+            -bool: False
+        """
+        return False
+
+    def open_run(self, path, bufferSize):
+        """
+        This method opens a run of (record, count) pairs.
+
+        args:
+            -path (string): the run file
+            -bufferSize (int): read buffer size in bytes
+
+        return:
+            -generator: the pairs
+        """
+        return self._iter_pairs(self.records.open_run(path, bufferSize))
+
+    def write_merged(self, records, path, bufferSize, index = None):
+        """
+        This method writes merged (record, count) pairs.
+
+        args:
+            -records (iterable): the pairs in order
+            -path (string or file): the output file
+            -bufferSize (int): write buffer size in bytes
+            -index (SparseIndex): must be None, counted output is not indexed
+
+        return:
+            -N/A
+        """
+        assert index is None, 'counted output can not be indexed'
+        if self.recordSize is None:
+            lines = ('{0}\t{1}'.format(count, record) for record, count in records)
+            self.records.write_merged(lines, path, bufferSize)
+        else:
+            values = itertools.chain.from_iterable(self._split_counts(records))
+            self.records.write_merged(values, path, bufferSize)
+
+    def pack(self, block):
+        """
+        This method packs a block of (record, count) pairs.
+
+        args:
+            -block (list): the pairs
+
+        return:
+            -bytes: the packed block
+        """
+        return self.records.pack(self._as_records(block))
+
+    def unpack(self, data):
+        """
+        This method unpacks a block from pack().
+
+        args:
+            -data (bytes): the packed block
+
+        return:
+            -list: the pairs
+        """
+        return list(self._pairs(self.records.unpack(data)))
+
+    def _as_records(self, pairs):
+        """
+        This method turns (record, count) pairs into records of the wrapped format.
+
+        args:
+            -pairs (iterable): the pairs
+
+        return:
+            -list or array: count and line text lines, or value and count uint32s
+        """
+        if self.recordSize is None:
+            return ['{0}\t{1}'.format(count, record) for record, count in pairs]
+        return array.array(UINT32, itertools.chain.from_iterable(self._split_counts(pairs)))
+
+    def _split_counts(self, pairs):
+        """
+        This generator splits counts too big for a uint32 over several pairs.
+
+        args:
+            -pairs (iterable): (value, count) pairs
+
+        return:
+            -generator: (value, count) pairs with every count a uint32
+        """
+        biggest = CountedRecords._max_count
+        for value, count in pairs:
+            while count > biggest:
+                yield value, biggest
+                count -= biggest
+            yield value, count
+
+    def _pairs(self, records):
+        """
+        This generator turns records of the wrapped format back into pairs.
+
+        args:
+            -records (iterable): count and line text lines, or value and count uint32s
+
+        return:
+            -generator: (record, count) pairs
+        """
+        records = iter(records)
+        if self.recordSize is not None:
+            for value in records:
+                yield value, next(records)
+            return
+
+        for line in records:
+            count, _, record = line.partition('\t')
+            yield record, int(count)
+
+    def _iter_pairs(self, run):
+        """
+        This generator reads pairs from an open run and closes the run when it is done
+        or closed.
+
+        args:
+            -run (iterator): the open run of the wrapped format
+
+        return:
+            -generator: (record, count) pairs
+        """
+        try:
+            for pair in self._pairs(run):
+                yield pair
+        finally:
+            run.close()
+
+
+"""
+EncodedRuns class
+-----
+"""
+class EncodedRuns(object):
+    """
+    This class writes and reads sorted runs as a series of encoded blocks, so temp files
+    take less disk than the record format would. It wraps a record format and stands in
+    for it wherever runs are written or opened. Each block is a header of (kind, records,
+    payload bytes) and the payload; blocks are decoded one at a time while merging.
+
+    Subclasses pick the encoding in _encode_block(). Blocks that can not be encoded that
+    way are stored raw, so any block kind can be read back by any subclass.
+
+    Attributes:
+        -records (obj): the record format being encoded
+        -blockRecords (int): records per encoded block
+        -stats (dict): raw bytes, encoded bytes and seconds spent encoding and decoding
+                        in this process; chunks written by write_chunk() are only
+                        counted once handed to add_chunks()
+    """
+    name = None
+
+    #kind, record count and payload bytes in front of every block
+    _header = struct.Struct('<BII')
+
+    #block kinds
+    _raw = 0
+    _zlib = 1
+    _delta = 2
+
+    def __init__(self, records, blockRecords = 8192):
+        self.records = records
+        self.blockRecords = blockRecords
+        self.stats = {'rawBytes': 0, 'encodedBytes': 0, 'encodeSeconds': 0.0,
+                      'decodeSeconds': 0.0}
+
+    def write_chunk(self, chunk, path, append = False):
+        """
+        This method encodes a sorted chunk into a run file. It may run in a worker
+        process, so the numbers are handed back instead of added to self.stats.
+
+        args:
+            -chunk (list or array): the records
+            -path (string): the file to write
+            -append (bool): add the blocks to the end of the run instead of replacing it
+
+        return:
+            -dict: rawBytes, encodedBytes and encodeSeconds
+        """
+        size = self.blockRecords
+        return self._write_blocks((chunk[i:i + size] for i in range(0, len(chunk), size)),
+                                  path, 65536, append)
+
+    def write_merged(self, records, path, bufferSize, index = None):
+        """
+        This method encodes merged records into a run file.
+
+        args:
+            -records (iterable): the records in order
+            -path (string): the file to write
+            -bufferSize (int): write buffer size in bytes
+            -index (SparseIndex): must be None, runs are not indexed
+
+        return:
+            -N/A
+        """
+        assert index is None, 'encoded runs can not be indexed'
+        records = iter(records)
+        size = self.blockRecords
+        blocks = iter(lambda: list(itertools.islice(records, size)), [])
+
+        for key, value in self._write_blocks(blocks, path, bufferSize).items():
+            self.stats[key] += value
+
+    def open_run(self, path, bufferSize):
+        """
+        This method opens an encoded run for merging.
+
+        args:
+            -path (string): the run file
+            -bufferSize (int): read buffer size in bytes
+
+        return:
+            -generator: the records in the run
+        """
+        return self._iter_run(path, bufferSize)
+
+    def add_chunks(self, chunkStats):
+        """
+        This method adds the encoding numbers of chunks written by write_chunk() to
+        self.stats.
+
+        args:
+            -chunkStats (list): dicts from FileMutilator.chunkStats
+
+        return:
+            -N/A
+        """
+        for chunk in chunkStats:
+            for key in ('rawBytes', 'encodedBytes', 'encodeSeconds'):
+                self.stats[key] += chunk.get(key, 0)
+
+    def report(self):
+        """
+        This method describes how well the runs compressed and what it cost.
+
+        args:
+            -N/A
+
+        return:
+            -string: the report
+        """
+        stats = self.stats
+        ratio = float(stats['rawBytes']) / stats['encodedBytes'] if stats['encodedBytes'] else 0.0
+
+        return 'run encoding {0}: {1} bytes of runs stored in {2} ({3:.2f}x), encode ' \
+               '{4:.3f}s, decode {5:.3f}s'.format(self.name, stats['rawBytes'],
+                                                   stats['encodedBytes'], ratio,
+                                                   stats['encodeSeconds'],
+                                                   stats['decodeSeconds'])
+
+    def _write_blocks(self, blocks, path, bufferSize, append = False):
+        """
+        This method encodes blocks of records into a file.
+
+        args:
+            -blocks (iterable): lists or arrays of records in order
+            -path (string): the file to write
+            -bufferSize (int): write buffer size in bytes
+            -append (bool): add to the end of the file; blocks stand alone, so a run
+                            can be written in several goes
+
+        return:
+            -dict: rawBytes, encodedBytes and encodeSeconds
+        """
+        stats = {'rawBytes': 0, 'encodedBytes': 0, 'encodeSeconds': 0.0}
+        pack = self.records.pack
+        header = EncodedRuns._header
+
+        with open(path, 'ab' if append else 'wb', bufferSize) as runFile:
+            for block in blocks:
+                start = time.time()
+                raw = pack(block)
+                kind, payload = self._encode_block(block, raw)
+                stats['encodeSeconds'] += time.time() - start
+
+                runFile.write(header.pack(kind, len(block), len(payload)))
+                runFile.write(payload)
+                stats['rawBytes'] += len(raw)
+                stats['encodedBytes'] += header.size + len(payload)
+
+        return stats
+
+    def _iter_run(self, path, bufferSize):
+        """
+        This generator decodes a run one block at a time.
+
+        args:
+            -path (string): the run file
+            -bufferSize (int): read buffer size in bytes
+
+        return:
+            -generator: the records in the run
+        """
+        header = EncodedRuns._header
+
+        with open(path, 'rb', bufferSize) as runFile:
+            while True:
+                head = runFile.read(header.size)
+                if not head:
+                    return
+
+                if len(head) != header.size:
+                    raise ValueError('{0} ends part way through a block header'.format(path))
+                kind, count, length = header.unpack(head)
+
+                payload = runFile.read(length)
+                if len(payload) != length:
+                    raise ValueError('{0} ends part way through a block'.format(path))
+
+                start = time.time()
+                block = self._decode_block(kind, count, payload)
+                self.stats['decodeSeconds'] += time.time() - start
+
+                for record in block:
+                    yield record
+
+    def _encode_block(self, block, raw):
+        """
+        This method picks how to store a block. The base class stores it raw.
+
+        args:
+            -block (list or array): the records
+            -raw (bytes): the block packed by the record format
+
+        return:
+            -tuple: (block kind, payload bytes)
+        """
+        return EncodedRuns._raw, raw
+
+    def _decode_block(self, kind, count, payload):
+        """
+        This method turns a block payload back into records.
+
+        args:
+            -kind (int): the block kind from the header
+            -count (int): records in the block
+            -payload (bytes): the encoded block
+
+        return:
+            -list or array: the records
+        """
+        if kind == EncodedRuns._zlib:
+            return self.records.unpack(zlib.decompress(payload))
+
+        if kind == EncodedRuns._delta:
+            width = bytearray(payload[:1])[0]
+            values = _varint_sums(payload[1:], count)
+            if self.records.recordSize is not None:
+                return values
+
+            lineFormat = '%0{0}d\n'.format(width)
+            return [lineFormat % value for value in values]
+
+        if kind == EncodedRuns._raw:
+            return self.records.unpack(payload)
+
+        raise ValueError('unknown block kind {0}'.format(kind))
+
+
+"""
+ZlibRuns class
+-----
+"""
+class ZlibRuns(EncodedRuns):
+    """
+    This class stores runs as zlib compressed blocks. It works on any records.
+
+    Attributes:
+        -level (int): zlib compression level, low levels are much cheaper to write
+    """
+    name = 'zlib'
+
+    def __init__(self, records, blockRecords = 8192, level = 1):
+        EncodedRuns.__init__(self, records, blockRecords)
+        self.level = level
+
+    def _encode_block(self, block, raw):
+        """
+        This method compresses a block.
+
+        args:
+            -block (list or array): the records
+            -raw (bytes): the block packed by the record format
+
+        return:
+            -tuple: (block kind, payload bytes)
+        """
+        return EncodedRuns._zlib, zlib.compress(raw, self.level)
+
+
+"""
+DeltaRuns class
+-----
+"""
+class DeltaRuns(ZlibRuns):
+    """
+    This class stores runs of numeric keys as the gaps between neighbouring keys, each
+    written as a varint. A sorted run of random 8 digit keys takes two or three bytes a
+    record this way instead of nine. Uint32 records always qualify; text blocks do when
+    every line is the same number of digits plus a newline, like dgen.py makes. Other
+    blocks are zlib compressed instead.
+
+    Attributes:
+        -N/A
+    """
+    name = 'delta'
+
+    #the width goes in one byte
+    _max_width = 255
+
+    def _encode_block(self, block, raw):
+        """
+        This method delta encodes a block, or compresses it if the keys are not
+        fixed width numbers in order.
+
+        args:
+            -block (list or array): the records
+            -raw (bytes): the block packed by the record format
+
+        return:
+            -tuple: (block kind, payload bytes)
+        """
+        width, values = self._keys(block)
+        payload = None if values is None else _varint_deltas(values)
+        if payload is None:
+            return ZlibRuns._encode_block(self, block, raw)
+
+        return EncodedRuns._delta, bytes(bytearray([width])) + payload
+
+    def _keys(self, block):
+        """
+        This method gets the numeric keys of a block.
+
+        args:
+            -block (list or array): the records
+
+        return:
+            -tuple: (width of the text key or 0, keys), keys is None if the block does
+                    not qualify
+        """
+        #counted runs are pairs, they are only compressed
+        if getattr(self.records, 'counts', False):
+            return 0, None
+
+        if self.records.recordSize is not None:
+            return 0, block
+
+        if not block:
+            return 0, None
+
+        width = len(block[0]) - 1
+        if width < 1 or width > DeltaRuns._max_width:
+            return 0, None
+
+        joined = ''.join(block)
+        if len(joined) != (width + 1) * len(block) or joined.count('\n') != len(block):
+            return 0, None
+
+        #every newline is on the end of a line, the rest has to be ascii digits
+        digits = joined.replace('\n', '')
+        if digits.strip('0123456789'):
+            return 0, None
+
+        return width, [int(line) for line in block]
+
+
+"""
+FileMutilator class
+-----
+"""
+class FileMutilator():
+    """
+    The purpose of this class is to handle all aspects of splitting a data file into blocks
+    and handling all clean up needed regarding these files after the sorting is complete.
+
+    Attributes:
+        -victim (string or iterable): the name of the data file, or an open file or other
+                            iterable of records to read once from start to end
+        -chunkSize (int): the size in bytes to be read and written
+        -workers (int): how many processes sort chunks, 1 sorts in this process
+        -inFlight (int): most chunks read but not yet written, defaults to 2 per worker
+        -records (obj): the record format, defaults to TextRecords
+        -engine (obj): the chunk sort engine, defaults to Sorts.QuickSortEngine
+        -runMode (string): 'chunk' sorts one chunk per run, 'replacement' uses replacement
+                            selection for longer runs
+        -guard (MemoryGuard): cuts each chunk down to what is left of this process's
+                            memory budget before it is read, and halves chunkSize
+                            whenever the process goes over anyway, None for no limit
+        -encoding (EncodedRuns): writes the chunk files encoded, None writes them in the
+                            record format
+        -journal (SortJournal): records every finished chunk file, and the chunk files
+                            an earlier try already made are picked up from it
+        -tempDir (string): where the chunk files go, defaults to _workingDir
+        -adaptive (bool): chunks already in order either way round are not sorted, and
+                            ones that carry on the run before them are added to it
+    """
+    #format for chunk file naming
+    _chunk_file_naming_format = 'chunk_file{0}.dat'
+
+    #ways to make runs
+    _run_modes = ('chunk', 'replacement')
+
+    #write buffer for replacement selection runs
+    _run_buffer_size = 65536
+
+    #the guard does not shrink chunks below this many bytes
+    _min_chunk_size = 65536
+
+    #tells us if the chunks are sorted
+    sortedChunks = False
+
+    def __init__(self, victim, chunkSize, workers = 1, inFlight = None, records = None,
+                 engine = None, runMode = 'chunk', guard = None, encoding = None,
+                 journal = None, tempDir = None, adaptive = True):
+        assert isinstance(chunkSize, int)
+        assert isinstance(workers, int) and workers > 0
+        assert runMode in FileMutilator._run_modes, 'unknown run mode {0}'.format(runMode)
+
+        #streams can not be reopened, so they are only ever read from where they are
+        if isinstance(victim, str):
+            victim = os.path.join(_workingDir, victim)
+        self.victim = victim
+        self.chunkSize = chunkSize
+        self.workers = workers
+        self.inFlight = inFlight or 2 * workers
+        self.records = records or TextRecords()
+        self.engine = engine or Sorts.QuickSortEngine()
+        self.runMode = runMode
+        self.guard = guard
+        self.encoding = encoding
+        self.journal = journal
+        self.tempDir = tempDir or _workingDir
+        self.adaptive = adaptive
+
+        #what writes the chunk files
+        self._runs = encoding or self.records
+
+        #number of the first chunk file this try makes
+        self._firstChunk = 0
+
+        #holds the names of the chunk files
+        self._chunkFiles = []
+
+        #records in each chunk file
+        self.runLengths = []
+
+        #timings, sizes and operation counts for each chunk file
+        self.chunkStats = []
+
+        #(file, last key) of the run a chunk in order can be added to, None if there is none
+        self._openRun = None
+
+    def get_chunks_list(self):
+        """
+        This method simply returns a list of the names of chunk files
+
+        args:
+            -N/A
+
+        return:
+            -list: list of chunk file names
+        """
+        return self._chunkFiles
+
+    def average_run_length(self):
+        """
+        This method gives the mean number of records per chunk file.
+
+        args:
+            -N/A
+
+        return:
+            -float: records per run, 0 if there are no runs
+        """
+        if not self.runLengths:
+            return 0.0
+
+        return float(sum(self.runLengths)) / len(self.runLengths)
+
+    def hide_remains(self):
+        """
+        This method handles cleanup. This means deleting all of the chunk files.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        #map() is lazy on python 3, so nothing was deleted
+        for chunkName in self._chunkFiles:
+            _murder_file(chunkName)
+
+    def commit_mutilation(self):
+        """
+        This method splits the victim file into 'self.chunkSize' long chunk files
+        where each chunk was quick sorted in-place before being written to a file and the name
+        of that file recorded.
+
+        With more than one worker the chunks are sorted and written by a process pool
+        while this process keeps reading. Chunk numbering follows read order either way,
+        so the chunk files are the same as a single process run.
+
+        In 'replacement' run mode the chunks feed replacement selection instead, which
+        is sequential, so the workers and sort engine are not used.
+
+        When adaptive, a chunk that is already in order is written without sorting, by
+        this process, and if it carries on the run before it the run's file is extended
+        instead of starting a new one. So a sorted input, or one made of sorted pieces,
+        gives one run per piece.
+
+        With a guard, the chunk size is looked up again for every chunk so it can be
+        cut when this process goes over its memory budget.
+
+        With a journal, the chunk files it has are kept and reading carries on after
+        the last of them.
+
+        args:
+            -N/A
+
+        return:
+            -None:
+        """
+        start = self._pick_up_runs()
+        if start is None:
+            return
+
+        self._firstChunk = len(self._chunkFiles)
+        chunks = self.records.read_chunks(self.victim, self._next_chunk_size, start)
+
+        if self.runMode == 'replacement':
+            self._commit_replacement_selection(chunks)
+        elif self.workers > 1:
+            self._commit_mutilation_parallel(chunks)
+        else:
+            self._commit_mutilation_serial(chunks)
+
+        if self.journal is not None:
+            self.journal.finish_split()
+
+    def _commit_mutilation_serial(self, chunks):
+        """
+        This method sorts and writes chunks one at a time in this process.
+
+        args:
+            -chunks (generator): the chunks from the record format
+
+        return:
+            -N/A
+        """
+        #keep track of the current chunk being created
+        chunkNum = self._firstChunk
+        for chunk, readSeconds in _time_reads(chunks):
+            order = self._chunk_order(chunk)
+            if order is not None:
+                chunkNum += self._lay_out_presorted(chunk, order, chunkNum, readSeconds)
+            else:
+                #sort and write chunk to chunkFiles
+                self._hide_corpse(chunk, chunkNum, readSeconds)
+
+                #increment for next chunk file so they are uniquely named
+                chunkNum += 1
+
+            del chunk
+            self._check_memory()
+
+    def _commit_mutilation_parallel(self, chunks):
+        """
+        This method reads chunks and hands them to a process pool to be sorted and written.
+        At most self.inFlight chunks are held at once, so memory use stays around
+        (inFlight + 1) * chunkSize plus the copies the workers are sorting.
+
+        args:
+            -chunks (generator): the chunks from the record format
+
+        return:
+            -N/A
+        """
+        pool = multiprocessing.Pool(self.workers)
+        pending = collections.deque()
+
+        def _collect():
+            #get() re-raises any worker error
+            chunkNum, chunkName, readSeconds, result = pending.popleft()
+            self._record_chunk(chunkNum, chunkName, readSeconds, result.get())
+        #END INNER DEF
+
+        try:
+            chunkNum = self._firstChunk
+            for chunk, readSeconds in _time_reads(chunks):
+                order = self._chunk_order(chunk)
+                if order is not None:
+                    #runs are extended and journaled in read order, so the pool goes first
+                    while pending:
+                        _collect()
+                    chunkNum += self._lay_out_presorted(chunk, order, chunkNum, readSeconds)
+                    del chunk
+                    self._check_memory()
+                    continue
+
+                #wait for the oldest chunk before reading past the cap
+                if len(pending) >= self.inFlight:
+                    _collect()
+                self._openRun = None
+
+                chunkName = self._chunk_name(chunkNum)
+                self._chunkFiles.append(chunkName)
+                self.runLengths.append(len(chunk))
+                pending.append((chunkNum, chunkName, readSeconds,
+                                pool.apply_async(_stitch_corpse, (chunk, chunkName, self.records,
+                                                                  self.engine, self._runs))))
+
+                #let go of our copy, the pool has its own
+                del chunk
+                self._check_memory()
+                chunkNum += 1
+
+            #wait for the stragglers
+            while pending:
+                _collect()
+
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    def _commit_replacement_selection(self, chunks):
+        """
+        This method makes runs by replacement selection. A heap holds one chunk worth
+        of records tagged with the run they belong to. The smallest record of the
+        current run is written and replaced by the next input record, which joins the
+        current run if it is not smaller than what was just written and the next run
+        otherwise. A run ends when the heap holds only next-run records.
+
+        args:
+            -chunks (generator): the chunks from the record format
+
+        return:
+            -N/A
+        """
+        #the first chunk sets how many records fit in memory
+        first = next(chunks, None)
+        if first is None:
+            return
+
+        #keyed records are selected by (key, input position, record) triples, so equal
+        #keys keep their order. Duplicates are only dropped as runs are written, so
+        #selection works on the records of the wrapped format
+        selector = self.records.records if self.records.distinct else self.records
+        keyed = selector.keyed
+        firstCount = len(first)
+        incoming = itertools.chain(first, itertools.chain.from_iterable(chunks))
+        del first
+        if keyed:
+            incoming = selector.decorate(incoming)
+
+        heap = [(0, record) for record in itertools.islice(incoming, firstCount)]
+        heapq.heapify(heap)
+
+        heapreplace = heapq.heapreplace
+        heappop = heapq.heappop
+        runLengths = self.runLengths
+
+        def _drain_run(runNum):
+            count = 0
+            while heap and heap[0][0] == runNum:
+                last = heap[0][1]
+                yield last
+                count += 1
+
+                record = next(incoming, None)
+                if record is None:
+                    heappop(heap)
+                elif record < last:
+                    heapreplace(heap, (runNum + 1, record))
+                else:
+                    heapreplace(heap, (runNum, record))
+            runLengths.append(count)
+        #END INNER DEF
+
+        runNum = 0
+        while heap:
+            chunkName = self._chunk_name(runNum)
+            self._chunkFiles.append(chunkName)
+
+            #reading, selecting and writing are interleaved, so only the total is known
+            start = time.time()
+            run = _drain_run(runNum)
+            if keyed:
+                run = selector.undecorate(run)
+            if self.records.distinct:
+                run = self.records.aggregate(run)
+            self._runs.write_merged(run, chunkName, FileMutilator._run_buffer_size)
+            self._record_chunk(runNum, chunkName, 0.0, {'records': runLengths[-1],
+                                                        'seconds': time.time() - start})
+            runNum += 1
+
+    def _pick_up_runs(self):
+        """
+        This method takes the chunk files an earlier try finished from the journal.
+        Replacement selection runs do not line up with the input, so unless that split
+        finished it starts over.
+
+        args:
+            -N/A
+
+        return:
+            -int: input records to skip before reading, None if the split is done
+        """
+        journal = self.journal
+        if journal is None or not journal.runs:
+            return 0
+
+        if not journal.splitDone and journal.resume_offset() is None:
+            journal.restart()
+            return 0
+
+        for run in journal.runs:
+            self._chunkFiles.append(run['path'])
+            self.runLengths.append(run['records'])
+
+        logging.info('picked up {0} chunk files from {1}'.format(len(journal.runs), journal.path))
+        return None if journal.splitDone else journal.resume_offset()
+
+    def _next_chunk_size(self):
+        """
+        This method gets how many bytes to read for the next chunk: chunkSize, or less
+        when the guard says a chunk that big would not fit in the memory budget now.
+
+        args:
+            -N/A
+
+        return:
+            -int: the chunk size
+        """
+        if self.guard is None:
+            return self.chunkSize
+        return self.guard.fit_chunk(self.chunkSize, FileMutilator._min_chunk_size)
+
+    def _check_memory(self):
+        """
+        This method asks the guard if this process is over its memory budget and halves
+        the chunk size for the chunks still to be read if it is.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        if self.guard is None or not self.guard.over():
+            return
+
+        if self.chunkSize > FileMutilator._min_chunk_size:
+            self.chunkSize = max(FileMutilator._min_chunk_size, self.chunkSize // 2)
+            logging.warning('{0} bytes resident is over the {1} byte budget, chunk size cut '
+                            'to {2} bytes'.format(self.guard.lastResident, self.guard.limit,
+                                                  self.chunkSize))
+
+    def _record_chunk(self, chunkNum, chunkName, readSeconds, stats, extends = False):
+        """
+        This method adds the stats for a finished chunk file to self.chunkStats.
+
+        args:
+            -chunkNum (int): the chunk number
+            -chunkName (string): the path of the chunk file
+            -readSeconds (float): time spent reading the chunk
+            -stats (dict): what _stitch_corpse() returned, with the bytes written when
+                            the chunk was added to the end of a run
+            -extends (bool): the chunk was added to the end of the last run
+
+        return:
+            -N/A
+        """
+        stats = dict(stats)
+        stats['chunk'] = chunkNum
+        stats.setdefault('bytes', os.path.getsize(chunkName))
+        stats['readSeconds'] = readSeconds
+        stats.setdefault('seconds', readSeconds + stats.get('sortSeconds', 0.0)
+                                    + stats.get('writeSeconds', 0.0))
+        self.chunkStats.append(stats)
+
+        if self.journal is not None:
+            #chunks finish in read order; replacement selection runs do not end where
+            #the input read so far does
+            offset = None
+            if self.runMode != 'replacement':
+                offset = self.journal.resume_offset() + stats['records']
+
+            if extends:
+                self.journal.extend_run(stats['records'], offset)
+            else:
+                self.journal.add_run(chunkName, stats['records'], offset)
+
+    def _chunk_name(self, chunkNum):
+        """
+        This method builds the path of a chunk file.
+
+        args:
+            -chunkNum (int): the number to use as part of the chunk file name
+
+        return:
+            -string: the chunk file path
+        """
+        return os.path.join(self.tempDir, FileMutilator._chunk_file_naming_format.format(chunkNum))
+
+    def _hide_corpse(self, chunk, chunkNum, readSeconds = 0.0):
+        """
+        This method writes a chunk to a chunk file and records the name.
+
+        args:
+            -chunk (list): a list list of lines (or array of records) to put into a chunk file
+            -chunkNum (int): the number to use as part of the chunk file name
+            -readSeconds (float): time it took to read the chunk, for the stats
+
+        return:
+            -N/A
+        """
+        #type checking
+        assert isinstance(chunk, (list, array.array))
+        assert isinstance(chunkNum, int)
+
+        #build the name
+        chunkName = self._chunk_name(chunkNum)
+
+        #store the file name
+        self._chunkFiles.append(chunkName)
+        self.runLengths.append(len(chunk))
+
+        #sort and write it
+        stats = _stitch_corpse(chunk, chunkName, self.records, self.engine, self._runs)
+        self._record_chunk(chunkNum, chunkName, readSeconds, stats)
+        self._openRun = None
+
+    def _lay_out_presorted(self, chunk, order, chunkNum, readSeconds):
+        """
+        This method writes a chunk that is already in order without sorting it. When it
+        carries on from the end of the run the last chunk went to, it is added to that
+        run's file, so a natural run longer than a chunk stays one run.
+
+        args:
+            -chunk (list or array): the records
+            -order (string): 'ascending' or 'descending', from chunk_order()
+            -chunkNum (int): the number a new chunk file would get
+            -readSeconds (float): time it took to read the chunk, for the stats
+
+        return:
+            -int: 1 if a new chunk file was started, 0 if a run was extended
+        """
+        records = self.records
+        count = len(chunk)
+        low, high = (chunk[0], chunk[-1]) if order == 'ascending' else (chunk[-1], chunk[0])
+        first, last = records.record_key(low), records.record_key(high)
+
+        #equal records can only meet across the seam when duplicates are kept
+        extends = False
+        if self._openRun is not None:
+            previous = self._openRun[1]
+            extends = previous < first or (previous == first and not records.distinct)
+
+        start = time.time()
+        chunk = records.sort_chunk(chunk, self.engine, order)
+        stats = {'records': count, 'presorted': order, 'sortSeconds': time.time() - start}
+        if records.distinct:
+            stats['distinctRecords'] = len(chunk)
+
+        if extends:
+            chunkName = self._openRun[0]
+            runNum = chunkNum - 1
+            before = os.path.getsize(chunkName)
+            self.runLengths[-1] += count
+        else:
+            chunkName = self._chunk_name(chunkNum)
+            runNum = chunkNum
+            before = 0
+            self._chunkFiles.append(chunkName)
+            self.runLengths.append(count)
+
+        start = time.time()
+        stats.update(self._runs.write_chunk(chunk, chunkName, extends) or {})
+        stats['writeSeconds'] = time.time() - start
+        stats['bytes'] = os.path.getsize(chunkName) - before
+
+        self._record_chunk(runNum, chunkName, readSeconds, stats, extends)
+        self._openRun = (chunkName, last)
+        return 0 if extends else 1
+
+    def _chunk_order(self, chunk):
+        """
+        This method checks a chunk's order when the mutilator is adaptive.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -string: 'ascending', 'descending', or None if it has to be sorted
+        """
+        if not self.adaptive or not len(chunk):
+            return None
+        return self.records.chunk_order(chunk)
+
+
+
+"""
+AmmoRack class
+-----
+"""
+class AmmoRack(object):
+    """
+    This class is for keeping track of chunk files.
+
+    Attributes:
+        -files (dict or list): open chunk files (or any iterators of lines) by index
+    """
+    def __init__(self, files):
+        self.rounds = files
+
+        self.spent = set()
+        self.roundCount = len(files)
+        self.blanks = {i: None for i in range(self.roundCount)}
+
+    def make_war_plans(self):
+        """
+        The purpose of this method is is return a dictionary of the blanks.
+
+        args:
+            -N/A
+
+        return:
+            dict: the dict of the blanks
+        """
+        try:
+            #try to build the dictionary
+            warPlan = {i: self.blanks[i] for i in range(self.roundCount) if i not in self.spent}
+        except Exception as e:
+            raise RuntimeError('Failed to make war plans with error: {0}'.format(e))
+
+        return warPlan
+
+    def reload(self):
+        """
+        The purpose of this method is to refresh the values in AmmoRack as changes are
+        being made.
+
+        This is intended to be used in a while loop like `while obj.reload():`
+
+        args:
+            -N/A
+
+        return:
+            -bool: True if done; else False
+        """
+        #loop through files
+        for i in range(self.roundCount):
+            #check for EOF and already seen
+            if self.blanks[i] is None and i not in self.spent:
+                #reload a blank
+                self.blanks[i] = next(self.rounds[i], '')
+
+                #if the black reload failed, record that that one is out of ammo
+                if self.blanks[i] == '':
+                    self.spent.add(i)
+
+        #done with all files
+        if len(self.spent) == self.roundCount:
+            return False
+
+        #still working on files
+        return True
+
+    def unload(self, index):
+        """
+        The purpose of this method is to provide a quick way to remove a value from
+        the blanks list and replace it with null.
+
+        args:
+            index (int): the index you want to unload
+
+        return:
+            -int: the value at the index
+        """
+        #get value
+        value = self.blanks[index]
+
+        #set to None
+        self.blanks[index] = None
+
+        return value
+
+
+
+"""
+FileSurgeon class
+-----
+"""
+class FileSurgeon(object):
+    """
+    This class provides the utility to merge a bunch of chunk files back together.
+
+    Attributes:
+        -sPlan (obj): the way we are going to merge the files back together. Any object
+                        with a merge(threads) generator will do, see FileSuture,
+                        HeapSuture and LoserTreeSuture.
+        -records (obj): the record format of the chunk files, defaults to TextRecords
+        -readAhead (int): blocks to prefetch per run on a background thread, 0 reads inline
+        -writeBehind (int): merged blocks to queue for a writer thread, 0 writes inline
+        -blockRecords (int): records per prefetched or queued block
+        -encoding (EncodedRuns): how the runs and intermediate merge files are encoded,
+                            None for the record format; the output never is
+        -ioStats (dict): seconds spent reading and writing and waiting on the background
+                            threads, summed over every merge
+        -mergeWorkers (int): processes that merge key ranges of the runs side by side,
+                            1 merges in this process
+        -guard (MemoryGuard): cuts the file buffers of each merge down to what is left
+                            of this process's memory budget, None for no limit
+    """
+    #sampled records per key range when picking splitters
+    _samples_per_part = 64
+
+    #the guard does not shrink merge buffers below this many bytes
+    _min_buffer_size = 8192
+
+    def __init__(self, sPlan, records = None, readAhead = 0, writeBehind = 0,
+                 blockRecords = 8192, encoding = None, mergeWorkers = 1, guard = None):
+        assert isinstance(mergeWorkers, int) and mergeWorkers > 0
+
+        self.sugery_plan = sPlan
+        self.records = records or TextRecords()
+        self.readAhead = readAhead
+        self.writeBehind = writeBehind
+        self.blockRecords = blockRecords
+        self.encoding = encoding
+        self.mergeWorkers = mergeWorkers
+        self.guard = guard
+
+        #what reads the runs and writes intermediate merge files
+        self._runs = encoding or self.records
+        self.ioStats = {'readSeconds': 0.0, 'readWaitSeconds': 0.0,
+                        'writeSeconds': 0.0, 'writeWaitSeconds': 0.0}
+
+    def prep_for_surgery(self, patients, chunkSize):
+        """
+        This method prepares chunk files for reading by opening the files.
+
+        args:
+            -patients (list of strings): list of file names
+            -chunkSize (int): max size of files in bytes
+
+        return:
+            -dict: the open files
+        """
+        waitingRoom = {}
+
+        #open files and store pointers to them
+        for i in range(len(patients)):
+            waitingRoom[i] = self._runs.open_run(patients[i], chunkSize)
+
+        return waitingRoom
+
+    def start_stitching(self, patients, targetFileName, chunkSize, intermediate = False,
+                        indexEvery = 0):
+        """
+        This method actually does the file merge.
+
+        args:
+            -patients (list of strings): the files
+            -targetFileName (string): the name for the outfile
+            -chunkSize (int): max size of files in bytes
+            -intermediate (bool): the outfile is a run for a later merge, so it is encoded
+                                like the chunk files
+            -indexEvery (int): write a SparseIndex of every indexEvery'th record to the
+                                outfile's name plus INDEX_SUFFIX as it is merged, 0 for none
+
+        return:
+            -N/A
+        """
+        assert not (indexEvery and intermediate), 'only the output is indexed'
+        index = SparseIndex(self.records, indexEvery) if indexEvery else None
+
+        if self.mergeWorkers > 1 and self._can_split():
+            self.parallel_stitching(patients, targetFileName, chunkSize, index)
+        else:
+            writer = self._runs if intermediate else self.records
+            threads, readers = self._open_threads(patients, chunkSize)
+
+            try:
+                #let the plan pick the order and the record format write it out
+                merged = self._merge(threads)
+                if self.writeBehind:
+                    self._write_behind(merged, targetFileName, chunkSize, writer, index)
+                else:
+                    writer.write_merged(merged, targetFileName, chunkSize, index)
+            finally:
+                self._close_threads(threads, readers)
+
+        if index is not None:
+            index.save(targetFileName)
+
+    def parallel_stitching(self, patients, targetFileName, chunkSize, index = None):
+        """
+        This method merges the files like start_stitching() but splits the work by key
+        range, sample sort style. Splitter keys are sampled from every run, each run is
+        binary searched for where every splitter falls, and each key range is merged
+        from its slice of every run into a part file by its own process. The part files
+        are then appended to the outfile in order.
+
+        args:
+            -patients (list of strings): the files
+            -targetFileName (string): the name for the outfile
+            -chunkSize (int): max size of files in bytes, each process gets its share
+            -index (SparseIndex): gets the entries every part's process indexed, moved
+                                past the parts before it, None for no index
+
+        return:
+            -N/A
+        """
+        records = self.records
+        splitters = self._pick_splitters(patients, self.mergeWorkers)
+
+        #every run cut into one byte range per key range
+        cuts = [[0] + records.find_bounds(patient, splitters) + [os.path.getsize(patient)]
+                for patient in patients]
+
+        bufferSize = max(self.blockRecords, chunkSize // self.mergeWorkers)
+        partNames = []
+        pool = multiprocessing.Pool(self.mergeWorkers)
+        try:
+            pending = []
+            for part in range(len(splitters) + 1):
+                slices = [(patient, cut[part], cut[part + 1])
+                          for patient, cut in zip(patients, cuts) if cut[part + 1] > cut[part]]
+                partName = '{0}.part{1}'.format(targetFileName, part)
+                partNames.append(partName)
+                pending.append(pool.apply_async(_stitch_part, (self, slices, partName,
+                                                               bufferSize,
+                                                               index.every if index else 0)))
+
+            #get() re-raises any worker error
+            for result in pending:
+                partIndex = result.get()
+                if index is not None:
+                    index.extend(partIndex)
+            pool.close()
+        except:
+            pool.terminate()
+            for partName in partNames:
+                if os.path.exists(partName):
+                    _murder_file(partName)
+            raise
+        finally:
+            pool.join()
+
+        partSizes = [os.path.getsize(partName) for partName in partNames]
+        logging.info('parallel merge of {0} runs into {1}: {2} parts of {3} bytes'.format(
+            len(patients), targetFileName, len(partNames), partSizes))
+
+        with open(targetFileName, 'wb') as targetFile:
+            for partName in partNames:
+                with open(partName, 'rb') as partFile:
+                    _append_file(partFile, targetFile)
+                _murder_file(partName)
+
+    def stream_stitching(self, patients, chunkSize):
+        """
+        This generator merges the files like start_stitching() but hands the records
+        back instead of writing them. The files are closed once it is used up or
+        closed.
+
+        args:
+            -patients (list of strings): the files
+            -chunkSize (int): max size of files in bytes
+
+        return:
+            -generator: the records in sorted order
+        """
+        chunkSize = self._fit_buffers(chunkSize, len(patients))
+        threads, readers = self._open_threads(patients, chunkSize)
+
+        try:
+            for record in self._merge(threads):
+                yield record
+        finally:
+            self._close_threads(threads, readers)
+
+    def _can_split(self):
+        """
+        This method tells if the runs can be cut by key range. Encoded blocks can not be
+        searched, and counted runs are pairs.
+
+        args:
+            -N/A
+
+        return:
+            -bool: True if parallel_stitching() can merge these runs
+        """
+        return (self._runs is self.records and hasattr(self.records, 'find_bounds')
+                and not getattr(self.records, 'counts', False))
+
+    def _pick_splitters(self, patients, parts):
+        """
+        This method samples the runs and picks the keys that cut them into 'parts' key
+        ranges of about the same number of bytes. Each sample stands for its share of its
+        run's bytes, so big runs count for more.
+
+        args:
+            -patients (list of strings): the runs
+            -parts (int): how many key ranges to make
+
+        return:
+            -list: the splitter keys in order, one fewer than the ranges; equal ones are
+                    dropped so there can be fewer
+        """
+        records = self.records
+        count = FileSurgeon._samples_per_part * parts
+
+        samples = []
+        for patient in patients:
+            size = os.path.getsize(patient)
+            run = records.sample_run(patient, count) if size else []
+            for record in run:
+                samples.append((records.record_key(record), float(size) / len(run)))
+
+        return pick_splitters(samples, parts)
+
+    def _merge(self, threads):
+        """
+        This method merges open runs with the plan. Keyed records are given their keys
+        and their run's index on the way in and have them taken off on the way out, so
+        equal keys come out in run order, and duplicates are collapsed for records that
+        keep only distinct ones.
+
+        args:
+            -threads (list): iterators of records from _open_threads()
+
+        return:
+            -iterator: the records in sorted order
+        """
+        records = self.records
+        if records.keyed:
+            threads = [records.decorate(thread, i) for i, thread in enumerate(threads)]
+
+        merged = self.sugery_plan.merge(threads)
+        if records.distinct:
+            merged = records.collapse(merged)
+
+        if records.keyed:
+            merged = records.undecorate(merged)
+        return merged
+
+    def _fit_buffers(self, bufferSize, runs):
+        """
+        This method gets the file buffer size a merge can have: bufferSize, or less
+        when the guard says the merge would not fit in the memory budget now.
+
+        args:
+            -bufferSize (int): the buffer size the merge plan picked
+            -runs (int): runs in the merge
+
+        return:
+            -int: the buffer size
+        """
+        if self.guard is None:
+            return bufferSize
+
+        fitted = self.guard.fit_merge(bufferSize, runs, FileSurgeon._min_buffer_size)
+        if fitted < bufferSize:
+            logging.warning('{0} bytes resident leaves too little of the {1} byte budget for '
+                            '{2} runs with {3} byte buffers, cut to {4} bytes'.format(
+                                self.guard.lastResident, self.guard.limit, runs, bufferSize,
+                                fitted))
+        return fitted
+
+    def _open_threads(self, patients, chunkSize):
+        """
+        This method opens the files to merge, each on a background reader if asked to.
+
+        args:
+            -patients (list of strings): the files
+            -chunkSize (int): max size of files in bytes
+
+        return:
+            -tuple: (iterators of records for the merge, ReadAhead readers)
+        """
+        #open the chunk files
+        waitingRoom = self.prep_for_surgery(patients, chunkSize)
+        threads = [waitingRoom[i] for i in range(len(waitingRoom))]
+
+        #hand each run to a background reader if asked to
+        readers = []
+        if self.readAhead:
+            readers = [ReadAhead(thread, self.blockRecords, self.readAhead) for thread in threads]
+            threads = [reader.records() for reader in readers]
+
+        return threads, readers
+
+    def _close_threads(self, threads, readers):
+        """
+        This method closes the files of a merge and adds up the readers' time.
+
+        args:
+            -threads (list): what _open_threads() gave for the merge
+            -readers (list): the ReadAhead readers, if any
+
+        return:
+            -N/A
+        """
+        for thread in (readers or threads):
+            thread.close()
+
+        for reader in readers:
+            self.ioStats['readSeconds'] += reader.readSeconds
+            self.ioStats['readWaitSeconds'] += reader.waitSeconds
+
+    def _write_behind(self, merged, targetFileName, chunkSize, writer, index = None):
+        """
+        This method cuts the merged records into blocks and queues them for a writer
+        thread, so the merge keeps going while the disk catches up.
+
+        args:
+            -merged (generator): the merged records
+            -targetFileName (string): the name for the outfile
+            -chunkSize (int): write buffer size in bytes
+            -writer (obj): the record format or encoding that writes the outfile
+            -index (SparseIndex): filled in by the writer thread, None for no index
+
+        return:
+            -N/A
+        """
+        writer = WriteBehind(writer, targetFileName, chunkSize, self.writeBehind, index)
+        try:
+            while True:
+                block = list(itertools.islice(merged, self.blockRecords))
+                writer.put(block)
+                if not block:
+                    break
+        finally:
+            writer.close()
+            self.ioStats['writeSeconds'] += writer.writeSeconds
+            self.ioStats['writeWaitSeconds'] += writer.waitSeconds
+
+    def follow_plan(self, mergePlan, journal = None, final = True, indexEvery = 0):
+        """
+        This method runs every merge in a MergePlan in order. Intermediate merge files
+        are deleted as soon as they have been merged into the next one.
+
+        With a journal, every finished merge is recorded and the merges an earlier try
+        finished are skipped.
+
+        args:
+            -mergePlan (MergePlan): the plan from MergePlanner.plan()
+            -journal (SortJournal): where finished merges are recorded, None for nowhere
+            -final (bool): run the last merge too; False leaves it to stream_stitching()
+            -indexEvery (int): have the last merge index every indexEvery'th record of the
+                                output, 0 for no index
+
+        return:
+            -N/A
+        """
+        intermediates = set(output for _, output, _ in mergePlan.steps[:-1])
+        done = journal.merges_done() if journal is not None else 0
+        steps = mergePlan.steps if final else mergePlan.steps[:-1]
+
+        for step, (patients, targetFileName, bufferSize) in enumerate(steps):
+            if step >= done:
+                intermediate = targetFileName in intermediates
+                self.start_stitching(patients, targetFileName,
+                                     self._fit_buffers(bufferSize, len(patients)),
+                                     intermediate, 0 if intermediate else indexEvery)
+                if journal is not None:
+                    journal.finish_merge(step, targetFileName)
+
+            #these were only needed for this merge
+            for patient in patients:
+                if patient in intermediates and os.path.exists(patient):
+                    _murder_file(patient)
+
+    def io_report(self):
+        """
+        This method describes how much background I/O overlapped the merge. Reading and
+        writing time the merge did not have to wait for is time saved; reads on
+        different runs can overlap each other too, so it is an upper bound.
+
+        args:
+            -N/A
+
+        return:
+            -string: the report
+        """
+        stats = self.ioStats
+        saved = (stats['readSeconds'] - stats['readWaitSeconds']
+                 + stats['writeSeconds'] - stats['writeWaitSeconds'])
+
+        return 'merge io: read {0:.3f}s (merge waited {1:.3f}s), write {2:.3f}s ' \
+               '(merge waited {3:.3f}s), up to {4:.3f}s overlapped with merging'.format(
+                   stats['readSeconds'], stats['readWaitSeconds'], stats['writeSeconds'],
+                   stats['writeWaitSeconds'], max(0.0, saved))
+
+
+"""
+ReadAhead class
+-----
+"""
+class ReadAhead(object):
+    """
+    This class reads a run a block at a time on a background thread, keeping up to
+    'depth' blocks ready while the merge works on the current one.
+
+    Attributes:
+        -thread (iterator): the run, from a record format's open_run()
+        -blockRecords (int): records per block
+        -depth (int): most blocks read ahead
+        -readSeconds (float): time the background thread spent reading
+        -waitSeconds (float): time the merge spent waiting for a block
+    """
+    def __init__(self, thread, blockRecords, depth):
+        self.thread = thread
+        self.blockRecords = blockRecords
+        self.readSeconds = 0.0
+        self.waitSeconds = 0.0
+
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._fill)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _fill(self):
+        """
+        This method is the background thread. It queues blocks until the run is empty,
+        which it marks with an empty block, or queues the error if reading fails.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        try:
+            while True:
+                start = time.time()
+                block = list(itertools.islice(self.thread, self.blockRecords))
+                self.readSeconds += time.time() - start
+
+                if not _put_until_stopped(self._queue, block, self._stop) or not block:
+                    return
+        except Exception as e:
+            _put_until_stopped(self._queue, e, self._stop)
+
+    def records(self):
+        """
+        This generator hands out the records of the queued blocks in order.
+
+        args:
+            -N/A
+
+        return:
+            -generator: the records in the run
+        """
+        get = self._queue.get
+        while True:
+            start = time.time()
+            block = get()
+            self.waitSeconds += time.time() - start
+
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                return
+
+            for record in block:
+                yield record
+
+    def close(self):
+        """
+        This method stops the background thread and closes the run.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        self._stop.set()
+        self._worker.join()
+        self.thread.close()
+
+
+"""
+WriteBehind class
+-----
+"""
+class WriteBehind(object):
+    """
+    This class writes queued blocks of merged records to the output on a background
+    thread using the record format's write_merged().
+
+    Attributes:
+        -records (obj): the record format, or an EncodedRuns for intermediate merge files
+        -targetFileName (string): the name for the outfile
+        -bufferSize (int): write buffer size in bytes
+        -depth (int): most blocks queued before put() waits
+        -index (SparseIndex): filled in as the blocks are written, None for no index
+        -writeSeconds (float): time the background thread spent writing
+        -waitSeconds (float): time the merge spent waiting for room in the queue
+    """
+    def __init__(self, records, targetFileName, bufferSize, depth, index = None):
+        self.records = records
+        self.targetFileName = targetFileName
+        self.bufferSize = bufferSize
+        self.index = index
+        self.writeSeconds = 0.0
+        self.waitSeconds = 0.0
+
+        self._idleSeconds = 0.0
+        self._error = None
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._drain)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def put(self, block):
+        """
+        This method queues a block for writing. An empty block means the merge is done.
+
+        args:
+            -block (list): the records
+
+        return:
+            -N/A
+        """
+        start = time.time()
+        if not _put_until_stopped(self._queue, block, self._stop):
+            raise RuntimeError('Failed to write merged data to file {0}. '.format(
+                self.targetFileName) + 'Error was: {0}'.format(self._error))
+        self.waitSeconds += time.time() - start
+
+    def _drain(self):
+        """
+        This method is the background thread. It writes blocks until it gets an empty
+        one and records any error so put() and close() can raise it.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        start = time.time()
+        try:
+            self.records.write_merged(self._blocks(), self.targetFileName, self.bufferSize,
+                                      self.index)
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+        self.writeSeconds = time.time() - start - self._idleSeconds
+
+    def _blocks(self):
+        """
+        This generator hands the writer the records of the queued blocks.
+
+        args:
+            -N/A
+
+        return:
+            -generator: the merged records
+        """
+        get = self._queue.get
+        while True:
+            start = time.time()
+            block = get()
+            self._idleSeconds += time.time() - start
+
+            if not block:
+                return
+
+            for record in block:
+                yield record
+
+    def close(self):
+        """
+        This method waits for the writer thread to finish. If the merge stopped early the
+        writer is told to stop instead. Errors from the writer are raised here.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        #make sure the writer sees an end even if the merge blew up
+        _put_until_stopped(self._queue, [], self._stop)
+        self._worker.join()
+
+        if self._error is not None:
+            raise RuntimeError('Failed to write merged data to file {0}. '.format(
+                self.targetFileName) + 'Error was: {0}'.format(self._error))
+
+
+"""
+MergePlanner class
+-----
+"""
+class MergePlanner(object):
+    """
+    This class works out how to merge runs when there are too many to merge at once.
+
+    The fan-in is capped so every open run gets at least 'minBuffer' bytes of the memory
+    budget and the open files stay under the process limit. Runs are then merged
+    smallest first, the way a k-ary Huffman tree is built, which moves the fewest
+    bytes for that fan-in. A stable plan only merges runs that are next to each
+    other, the smallest such group first, and its output takes their place, so
+    records that compare equal come out in run order.
+
+    Attributes:
+        -memory (int): bytes of buffer the merge may use
+        -maxFanIn (int): most runs to merge at once, None for no extra cap
+        -minBuffer (int): least bytes of buffer to give each run
+        -runOverhead (int): bytes each open run costs on top of its buffer, like the
+                            records a read-ahead thread holds
+        -tempDir (string): where the intermediate merge files go, defaults to _workingDir
+        -stable (bool): keep the runs in order, for records that compare equal but are
+                        not the same, like lines with equal keys
+    """
+    #format for intermediate merge file naming
+    _merge_file_naming_format = 'merge_file{0}.dat'
+
+    #open files to leave for stdio, the log and the output
+    _spareFiles = 16
+
+    def __init__(self, memory, maxFanIn = None, minBuffer = 65536, runOverhead = 0,
+                 tempDir = None, stable = False):
+        assert isinstance(memory, int)
+        assert maxFanIn is None or maxFanIn >= 2, 'fan-in must be at least 2'
+
+        self.memory = memory
+        self.maxFanIn = maxFanIn
+        self.minBuffer = minBuffer
+        self.runOverhead = runOverhead
+        self.tempDir = tempDir or _workingDir
+        self.stable = stable
+
+    def max_fan_in(self):
+        """
+        This method works out the most runs that fit in the budget at once.
+
+        args:
+            -N/A
+
+        return:
+            -int: the widest merge allowed, at least 2
+        """
+        #one buffer goes to the output file
+        fanIn = (self.memory - self.minBuffer) // (self.minBuffer + self.runOverhead)
+
+        limit = _open_file_limit()
+        if limit is not None:
+            fanIn = min(fanIn, limit - MergePlanner._spareFiles)
+
+        if self.maxFanIn is not None:
+            fanIn = min(fanIn, self.maxFanIn)
+
+        return max(2, fanIn)
+
+    def plan(self, runs, targetFileName):
+        """
+        This method builds the merge plan for a list of runs. The widest fan-in gives the
+        fewest passes; the narrowest fan-in with the same number of passes is also
+        tried, and whichever moves fewer bytes wins (the narrower one on a tie since it
+        gets bigger buffers).
+
+        args:
+            -runs (list of strings): the sorted run files
+            -targetFileName (string): the name for the outfile
+
+        return:
+            -MergePlan: the plan
+        """
+        widest = self.max_fan_in()
+        best = self._plan_for_fan_in(runs, targetFileName, widest)
+
+        #narrowest fan-in that still needs the same number of passes
+        narrowest = widest
+        while narrowest > 2 and (narrowest - 1) ** best.passes >= len(runs):
+            narrowest -= 1
+
+        if narrowest != widest:
+            other = self._plan_for_fan_in(runs, targetFileName, narrowest)
+            if other.bytesMoved <= best.bytesMoved:
+                best = other
+
+        return best
+
+    def _plan_for_fan_in(self, runs, targetFileName, fanIn):
+        """
+        This method builds the smallest-first merge plan for one fan-in.
+
+        args:
+            -runs (list of strings): the sorted run files
+            -targetFileName (string): the name for the outfile
+            -fanIn (int): the most runs to merge at once
+
+        return:
+            -MergePlan: the plan
+        """
+        #(size, order, path, passes so far); order keeps ties in run order
+        heap = [(os.path.getsize(run), i, run, 0) for i, run in enumerate(runs)]
+        if self.stable:
+            return self._stable_plan(heap, targetFileName, fanIn)
+        heapq.heapify(heap)
+        order = len(heap)
+
+        #nothing to merge still makes an (empty) target
+        if len(heap) <= 1:
+            return MergePlan(runs, fanIn, [(list(runs), targetFileName,
+                                            self._buffer_size(len(runs)))])
+
+        #the first merge takes just enough runs that every later merge is full width
+        take = (len(heap) - 2) % (fanIn - 1) + 2
+
+        steps = []
+        while len(heap) > 1:
+            group = [heapq.heappop(heap) for _ in range(min(take, len(heap)))]
+            take = fanIn
+
+            patients = [run for _, _, run, _ in group]
+            if heap:
+                output = os.path.join(self.tempDir,
+                                      MergePlanner._merge_file_naming_format.format(len(steps)))
+            else:
+                output = targetFileName
+
+            steps.append((patients, output, self._buffer_size(len(patients))))
+            heapq.heappush(heap, (sum(size for size, _, _, _ in group), order, output,
+                                  max(passes for _, _, _, passes in group) + 1))
+            order += 1
+
+        return MergePlan(runs, fanIn, steps, heap[0][3])
+
+    def _stable_plan(self, line, targetFileName, fanIn):
+        """
+        This method builds the merge plan for one fan-in that keeps runs in order: every
+        merge takes the group of neighbouring runs with the fewest bytes, and its output
+        goes where they were.
+
+        args:
+            -line (list of tuples): (size, order, path, passes so far) of each run, in order
+            -targetFileName (string): the name for the outfile
+            -fanIn (int): the most runs to merge at once
+
+        return:
+            -MergePlan: the plan
+        """
+        runs = [run for _, _, run, _ in line]
+        if len(line) <= 1:
+            return MergePlan(runs, fanIn, [(runs, targetFileName, self._buffer_size(len(runs)))])
+
+        #the first merge takes just enough runs that every later merge is full width
+        take = (len(line) - 2) % (fanIn - 1) + 2
+
+        steps = []
+        while len(line) > 1:
+            take = min(take, len(line))
+            start = min(range(len(line) - take + 1),
+                        key=lambda first: sum(size for size, _, _, _ in line[first:first + take]))
+            group = line[start:start + take]
+
+            patients = [run for _, _, run, _ in group]
+            if len(line) > take:
+                output = os.path.join(self.tempDir,
+                                      MergePlanner._merge_file_naming_format.format(len(steps)))
+            else:
+                output = targetFileName
+
+            steps.append((patients, output, self._buffer_size(len(patients))))
+            line[start:start + take] = [(sum(size for size, _, _, _ in group), len(steps), output,
+                                         max(passes for _, _, _, passes in group) + 1)]
+            take = fanIn
+
+        return MergePlan(runs, fanIn, steps, line[0][3])
+
+    def _buffer_size(self, runCount):
+        """
+        This method splits the memory budget between the runs and the output of a merge.
+
+        args:
+            -runCount (int): runs in the merge
+
+        return:
+            -int: bytes of buffer per file
+        """
+        return max(1, (self.memory - self.runOverhead * runCount) // (runCount + 1))
+
+
+"""
+MergePlan class
+-----
+"""
+class MergePlan(object):
+    """
+    This class holds the merges a MergePlanner picked.
+
+    Attributes:
+        -runs (list of strings): the sorted run files
+        -fanIn (int): the most runs merged at once
+        -steps (list of tuples): (runs, output, buffer size) for each merge in order
+        -passes (int): the most times any record is merged
+        -bytesMoved (int): bytes read by all the merges, the same again is written
+    """
+    def __init__(self, runs, fanIn, steps, passes = 1):
+        self.runs = runs
+        self.fanIn = fanIn
+        self.steps = steps
+        self.passes = passes
+
+        #sizes of the planned files, intermediates are the sum of their inputs
+        sizes = dict((run, os.path.getsize(run)) for run in runs)
+        self.bytesMoved = 0
+        for patients, output, _ in steps:
+            sizes[output] = sum(sizes[patient] for patient in patients)
+            self.bytesMoved += sizes[output]
+
+    def report(self):
+        """
+        This method describes the plan for printing and logging.
+
+        args:
+            -N/A
+
+        return:
+            -string: the plan, one merge per line
+        """
+        lines = ['merge plan: {0} runs, fan-in {1}, {2} passes, {3} merges, '
+                 '{4} bytes read and written'.format(len(self.runs), self.fanIn, self.passes,
+                                                     len(self.steps), self.bytesMoved)]
+        for i, (patients, output, bufferSize) in enumerate(self.steps):
+            lines.append('    merge {0}: {1} runs -> {2} ({3} byte buffers)'.format(
+                i + 1, len(patients), os.path.basename(output), bufferSize))
+
+        return '\n'.join(lines)
+
+
+"""
+MemoryPlanner class
+-----
+"""
+class MemoryPlanner(object):
+    """
+    This class turns a memory budget into the sizes the sort runs with. A sample of
+    the input is read with the record format, then sorted with the engine and
+    written the way a chunk is, to measure what a record costs in memory: a text
+    line held as a str in a list is several times its size on disk. Python's own
+    footprint at planning time comes off the top and a share of the rest is held
+    back as headroom.
+
+    While splitting, every chunk in memory at once costs its records plus the most
+    that reading it or sorting and writing it costs on top: the raw bytes a fixed
+    width chunk is cut from, the engine's keys and working space, and anything the
+    record format builds to write it. Working space that does not grow with the
+    chunk, like radix's bucket table, is too big for the sample to show, so engines
+    give it as workingBytes. While merging, every open run costs a file
+    buffer plus the blocks of records staged for it.
+
+    Picking out the top records or a key range holds what it has picked, up to a
+    chunk of them, beside the chunk being read, so that is planned as two chunks, in
+    this process alone.
+
+    Worker processes are forked from this one and share its pages until either side
+    writes to them. Python writes to every object it so much as looks at, to count
+    references, so each worker is counted as a copy of everything the parent has of
+    its own, on top of its chunks. When that leaves too little for a chunk of
+    FileMutilator._min_chunk_size, fewer workers are planned. Merge workers are
+    counted the same way, each with its own staged blocks for every run, and fewer are
+    planned when a three run merge no longer fits beside them.
+
+    Attributes:
+        -memory (int): bytes the process may use in total
+        -headroom (float): fraction of the usable memory held back
+        -minBuffer (int): least bytes of file buffer to give each run when merging
+    """
+    #bytes of input to measure records on
+    _sample_bytes = 65536
+
+    #fewest records per block when staging merge input
+    _min_block_records = 64
+
+    #what reading and measuring the sample can add to python's own footprint
+    _plan_bytes = 1 << 21
+
+    def __init__(self, memory, headroom = 0.1, minBuffer = 65536):
+        assert isinstance(memory, int) and memory > 0
+        assert 0 <= headroom < 1
+
+        self.memory = memory
+        self.headroom = headroom
+        self.minBuffer = minBuffer
+
+    def least_memory(self):
+        """
+        This method gets the smallest budget plan() can work with: what python has
+        resident now and what planning adds to it, plus the file buffers of a three run
+        merge and its output on top of the headroom.
+
+        args:
+            -N/A
+
+        return:
+            -int: the budget in bytes
+        """
+        return (_resident_bytes() or 0) + MemoryPlanner._plan_bytes + \
+               int(4 * self.minBuffer / (1 - self.headroom)) + 1
+
+    def plan(self, path, records, engine, workers = 1, inFlight = None, runMode = 'chunk',
+             suture = 'heap', readAhead = 0, writeBehind = 0, encoding = 'none', sample = None,
+             selection = False, mergeWorkers = 1):
+        """
+        This method measures a sample of the input and works out the sizes.
+
+        args:
+            -path (string): the file to sort, not read when 'sample' is given
+            -records (obj): the record format
+            -engine (obj): the chunk sort engine
+            -workers (int): processes sorting chunks, fewer are planned when they do not
+                            fit
+            -inFlight (int): most chunks handed to the workers at once, defaults like
+                            FileMutilator's
+            -runMode (string): 'chunk' or 'replacement'
+            -suture (string): name of the merge strategy
+            -readAhead (int): blocks prefetched per run while merging
+            -writeBehind (int): merged blocks queued for the writer thread
+            -encoding (string): run encoding, anything but 'none' decodes a block per run
+            -sample (list or array): records already read from the front of the input,
+                                    for streams that can not be read twice
+            -selection (bool): the input is read to pick out top records or a key range,
+                                not split
+            -mergeWorkers (int): processes merging key ranges side by side, fewer are
+                                planned when they do not fit
+
+        return:
+            -MemoryPlan: the sizes
+        """
+        readPerRecord = None
+        if sample is None:
+            sample, readPerRecord = self._read_sample(path, records)
+
+        #an empty file still gets a plan
+        if not sample:
+            sample = ['0\n'] if records.recordSize is None else array.array(UINT32, [0])
+
+        plan = MemoryPlan()
+        plan.memory = self.memory
+        plan.baseline = _resident_bytes() or 0
+        plan.usable = int((self.memory - plan.baseline) * (1 - self.headroom))
+        if plan.usable < 4 * self.minBuffer:
+            raise ValueError('A {0} byte memory budget leaves {1} bytes once python itself is '
+                             'counted, which is not enough to sort with. It needs to be at '
+                             'least {2}'.format(self.memory, plan.usable, self.least_memory()))
+
+        #what a forked worker can come to hold of its own before it does anything
+        plan.workerBaseline = _private_bytes() or plan.baseline
+
+        plan.diskPerRecord, plan.memPerRecord = self._record_bytes(records, sample)
+        plan.sortPerRecord, plan.measuredBy = self._sort_bytes(records, engine, sample,
+                                                               plan.memPerRecord)
+
+        #without a measurement, a fixed width chunk is still cut from its raw bytes
+        plan.readPerRecord = readPerRecord
+        if readPerRecord is None:
+            plan.readPerRecord = float(records.recordSize or 0)
+        workPerRecord = max(plan.readPerRecord, plan.sortPerRecord)
+
+        #splitting
+        if selection:
+            #the chunk being read, and up to as many picked records as (key, position,
+            #record) entries of a heap, which is built anew beside the old one
+            heapEntry = sys.getsizeof((0, 0, sample[0])) + sys.getsizeof(0) + 8
+            perRecord = plan.memPerRecord + max(plan.readPerRecord, 2 * heapEntry)
+            plan.chunksInMemory = 2
+            plan.sortOverhead = 0
+            plan.workers = 1
+            splitMemory = plan.usable
+        elif runMode == 'replacement':
+            #one heap of (run, record) tuples plus a write buffer
+            heapEntry = sys.getsizeof((0, sample[0])) + 8
+            perRecord = plan.memPerRecord + heapEntry
+            plan.chunksInMemory = 1
+            plan.sortOverhead = 0
+            plan.workers = 1
+            splitMemory = plan.usable - FileMutilator._run_buffer_size
+        else:
+            #every chunk in flight, plus the one being read, sorted at the same time, and
+            #every worker's own copy of the parent
+            perRecord = plan.memPerRecord + workPerRecord
+            plan.sortOverhead = getattr(engine, 'workingBytes', 0)
+            plan.workers = workers
+            while True:
+                forked = plan.workers if plan.workers > 1 else 0
+                plan.chunksInMemory = 1 if forked == 0 else (inFlight or 2 * forked) + 1
+                splitMemory = plan.usable - plan.workers * plan.sortOverhead - \
+                              forked * plan.workerBaseline
+                chunkRecords = splitMemory // (plan.chunksInMemory * perRecord)
+                if forked == 0 or chunkRecords * plan.diskPerRecord >= \
+                        FileMutilator._min_chunk_size:
+                    break
+                plan.workers -= 1
+
+        plan.chunkRecords = max(1, int(splitMemory // (plan.chunksInMemory * perRecord)))
+        plan.chunkSize = max(FileMutilator._min_chunk_size,
+                             int(plan.chunkRecords * plan.diskPerRecord))
+        plan.chunkCost = perRecord / plan.diskPerRecord
+
+        #merging: blocks of about one file buffer, halved until three runs fit, then
+        #fewer merge workers, every one of them a copy of the parent staging its own
+        #blocks for every run
+        stagedBlocks = readAhead + 1 if readAhead else (1 if suture == 'block' else 0)
+        if encoding != 'none':
+            stagedBlocks += 1
+        plan.mergeWorkers = mergeWorkers
+        while True:
+            forked = plan.mergeWorkers if plan.mergeWorkers > 1 else 0
+            plan.blockRecords = max(MemoryPlanner._min_block_records,
+                                    min(8192, int(self.minBuffer // plan.diskPerRecord)))
+            while True:
+                blockBytes = int(plan.blockRecords * plan.memPerRecord)
+                plan.runOverhead = max(1, forked) * stagedBlocks * blockBytes
+                plan.mergeMemory = plan.usable - (writeBehind + 1) * blockBytes - \
+                                   forked * plan.workerBaseline
+                fits = plan.mergeMemory >= 3 * (self.minBuffer + plan.runOverhead) + \
+                       self.minBuffer
+                if fits or plan.blockRecords <= MemoryPlanner._min_block_records:
+                    break
+                plan.blockRecords //= 2
+            if fits or forked == 0:
+                break
+            plan.mergeWorkers -= 1
+
+        plan.fanIn = MergePlanner(plan.mergeMemory, None, self.minBuffer,
+                                  plan.runOverhead).max_fan_in()
+
+        return plan
+
+    def _read_sample(self, path, records):
+        """
+        This method reads the sample from the front of the input. Under tracemalloc it
+        also measures what reading a chunk costs on top of the records it ends up
+        holding, like the raw bytes a fixed width chunk is cut from.
+
+        args:
+            -path (string): the file to sort
+            -records (obj): the record format
+
+        return:
+            -tuple: (the sample, None if the file is empty; extra bytes per record while
+                    reading, None when it could not be measured)
+        """
+        tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            chunks = records.read_chunks(path, MemoryPlanner._sample_bytes)
+            sample = next(chunks, None)
+            chunks.close()
+            if tracing:
+                held, peak = tracemalloc.get_traced_memory()
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+        if not tracing or not sample:
+            return sample, None
+        return sample, max(0, peak - held) / float(len(sample))
+
+    def _record_bytes(self, records, sample):
+        """
+        This method measures what a record costs on disk and held in a chunk.
+
+        args:
+            -records (obj): the record format
+            -sample (list or array): a chunk from the record format
+
+        return:
+            -tuple: (bytes on disk, bytes in memory) per record
+        """
+        count = float(len(sample))
+        inMemory = sys.getsizeof(sample)
+
+        if records.recordSize is None:
+            onDisk = sum(len(line) for line in sample)
+            inMemory += sum(sys.getsizeof(line) for line in sample)
+        else:
+            onDisk = records.recordSize * len(sample)
+
+        return onDisk / count, inMemory / count
+
+    def _sort_bytes(self, records, engine, sample, memPerRecord):
+        """
+        This method measures the extra memory it takes to sort a chunk and write it,
+        by running a copy of the sample through the engine and out to os.devnull under
+        tracemalloc, the unsorted copy held the whole time like the splitter holds its
+        chunk. Without tracemalloc, or when it is already tracing something else, the
+        engine's workingFactor is used.
+
+        args:
+            -records (obj): the record format
+            -engine (obj): the chunk sort engine
+            -sample (list or array): a chunk from the record format
+            -memPerRecord (float): bytes a record costs held in a chunk
+
+        return:
+            -tuple: (bytes per record, 'tracemalloc' or 'estimate')
+        """
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            chunk = sample[:]
+            tracemalloc.start()
+            try:
+                records.write_chunk(records.sort_chunk(chunk, engine), os.devnull)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return peak / float(len(sample)), 'tracemalloc'
+
+        factor = getattr(engine, 'workingFactor', {}).get(records.name, 1.0)
+        return factor * memPerRecord, 'estimate'
+
+
+"""
+MemoryPlan class
+-----
+"""
+class MemoryPlan(object):
+    """
+    This class holds the sizes a MemoryPlanner picked.
+
+    Attributes:
+        -memory (int): the budget in bytes
+        -baseline (int): bytes resident before the sort started
+        -usable (int): bytes the sort plans to use
+        -diskPerRecord (float): bytes per record on disk
+        -memPerRecord (float): bytes per record held in a chunk
+        -sortPerRecord (float): extra bytes per record while the engine sorts a chunk and
+                                it is written
+        -readPerRecord (float): extra bytes per record while a chunk is read
+        -sortOverhead (int): extra bytes a sort needs however big the chunk, the engine's
+                                workingBytes
+        -workerBaseline (int): bytes a forked worker process is counted before its chunks
+        -workers (int): processes sorting chunks, fewer than asked for when they did
+                        not fit
+        -measuredBy (string): 'tracemalloc' or 'estimate', where sortPerRecord came from
+        -chunkRecords (int): records per chunk
+        -chunkSize (int): bytes of input per chunk
+        -chunkCost (float): bytes of memory a byte of input costs while its chunk is read,
+                            sorted and written
+        -chunksInMemory (int): chunks held at once while splitting
+        -blockRecords (int): records per block staged while merging
+        -runOverhead (int): bytes of staged records per open run, in every merge worker
+        -mergeMemory (int): bytes of file buffers for a merge, once every forked merge
+                            worker is counted
+        -mergeWorkers (int): processes merging key ranges, fewer than asked for when
+                            they did not fit
+        -fanIn (int): most runs that fit in a merge
+    """
+    def report(self):
+        """
+        This method describes the plan for printing and logging.
+
+        args:
+            -N/A
+
+        return:
+            -string: the plan
+        """
+        return 'memory plan: {0} byte budget, {1} resident at start, {2} usable; ' \
+               '{3:.1f} bytes per record in memory ({4:.1f}x disk), {5:.1f} more to read and ' \
+               '{6:.1f} to sort and write ({7}); chunks of {8} bytes ({9} records, {10} in ' \
+               'memory at once, {14} sorting them, {15} bytes per forked worker); merge ' \
+               'buffers {11} bytes, fan-in up to {12}, {13} record blocks, {16} merging ' \
+               'them'.format(
+                   self.memory, self.baseline, self.usable, self.memPerRecord,
+                   self.memPerRecord / self.diskPerRecord, self.readPerRecord,
+                   self.sortPerRecord, self.measuredBy, self.chunkSize, self.chunkRecords,
+                   self.chunksInMemory, self.mergeMemory, self.fanIn, self.blockRecords,
+                   self.workers, self.workerBaseline, self.mergeWorkers)
+
+    def to_dict(self):
+        """
+        This method gives the plan in a form that can be dumped as JSON.
+
+        args:
+            -N/A
+
+        return:
+            -dict: the sizes
+        """
+        return dict(self.__dict__)
+
+
+"""
+MemoryGuard class
+-----
+"""
+class MemoryGuard(object):
+    """
+    This class checks this process's resident memory against a limit. With the
+    MemoryPlan the limit was split up by, it also keeps the sort inside it as it goes:
+    fit_chunk() cuts each chunk down to what is left of the limit before it is read,
+    fit_merge_memory() takes however much memory the split left resident off what
+    the merge is planned with, and fit_merge() cuts each merge's file buffers down
+    before it starts. After over() reports going over, it only reports again once
+    memory is higher than it was then, since freed memory is not always handed back
+    to the OS.
+
+    Attributes:
+        -limit (int): bytes this process may have resident
+        -plan (MemoryPlan): the sizes picked for the limit, None to only check it
+        -peak (int): most bytes seen resident
+        -lastResident (int): bytes resident at the last check
+        -trips (int): times it has reported going over
+        -cuts (int): times a chunk or merge was made smaller to fit
+    """
+    def __init__(self, limit, plan = None):
+        self.limit = limit
+        self.plan = plan
+        self.peak = 0
+        self.lastResident = 0
+        self.trips = 0
+        self.cuts = 0
+        self._tripLevel = limit
+
+    def over(self):
+        """
+        This method checks resident memory.
+
+        args:
+            -N/A
+
+        return:
+            -bool: True if resident memory went over the limit since the last trip
+        """
+        resident = self._resident()
+        if resident is None or resident <= self._tripLevel:
+            return False
+
+        self._tripLevel = resident
+        self.trips += 1
+        return True
+
+    def fit_chunk(self, chunkSize, least):
+        """
+        This method gets how big the next chunk can be so reading, sorting and writing
+        it stays inside the limit. With worker processes, their copies of this one and
+        the other chunks in flight, at the planned size, are not seen in this
+        process's resident memory, so they come off the limit too.
+
+        args:
+            -chunkSize (int): the chunk size wanted, in bytes of input
+            -least (int): the smallest chunk size to give
+
+        return:
+            -int: chunkSize, or less if that would not fit
+        """
+        resident = self._resident()
+        if resident is None or self.plan is None:
+            return chunkSize
+
+        plan = self.plan
+        room = self.limit - resident - plan.workers * plan.sortOverhead
+        if plan.workers > 1:
+            room -= plan.workers * plan.workerBaseline + \
+                    (plan.chunksInMemory - 1) * plan.chunkSize * plan.chunkCost
+        fits = int(room / plan.chunkCost)
+        if fits >= chunkSize:
+            return chunkSize
+
+        self.cuts += 1
+        return max(least, fits)
+
+    def fit_merge_memory(self, mergeMemory, least):
+        """
+        This method gets how much memory the merge can be planned with. Memory freed
+        after the split is not always handed back to the OS, so whatever is resident
+        on top of what was when the plan was made comes off the plan's share.
+
+        args:
+            -mergeMemory (int): bytes of file buffers the plan gave the merge
+            -least (int): the fewest bytes to give
+
+        return:
+            -int: mergeMemory, or less if it would not fit
+        """
+        resident = self._resident()
+        if resident is None or self.plan is None or resident <= self.plan.baseline:
+            return mergeMemory
+
+        self.cuts += 1
+        return max(least, mergeMemory - (resident - self.plan.baseline))
+
+    def fit_merge(self, bufferSize, runs, least):
+        """
+        This method gets how big the file buffers of a merge can be so the merge stays
+        inside the limit. Every run and the output hold a buffer, and every run its
+        staged records too. Forked merge workers are each a copy of this process as it
+        is now, more than the plan counted if the split left memory resident.
+
+        args:
+            -bufferSize (int): the buffer size wanted
+            -runs (int): runs in the merge
+            -least (int): the smallest buffer size to give
+
+        return:
+            -int: bufferSize, or less if that would not fit
+        """
+        resident = self._resident()
+        if resident is None:
+            return bufferSize
+
+        room = self.limit - resident
+        if self.plan is not None:
+            room -= runs * self.plan.runOverhead
+            if self.plan.mergeWorkers > 1:
+                room -= self.plan.mergeWorkers * (self.plan.workerBaseline +
+                                                  max(0, resident - self.plan.baseline))
+        fits = room // (runs + 1)
+        if fits >= bufferSize:
+            return bufferSize
+
+        self.cuts += 1
+        return max(least, fits)
+
+    def _resident(self):
+        """
+        This method reads resident memory and keeps the peak.
+
+        args:
+            -N/A
+
+        return:
+            -int: resident bytes, None if there is no way to tell
+        """
+        resident = _resident_bytes()
+        if resident is not None:
+            self.lastResident = resident
+            self.peak = max(self.peak, resident)
+        return resident
+
+
+"""
+SortJournal class
+-----
+"""
+class SortJournal(object):
+    """
+    This class keeps a JSON journal of how far a sort got, so a sort that dies can
+    pick up where it left off. Every finished run is recorded with its size and
+    checksum and how many input records had been split when it finished, then the
+    merge plan, then every finished merge. The journal is rewritten through a temp file and a rename after each step,
+    so it is always either the old or the new version.
+
+    A journal is only resumed from when it was written for the same job: the same
+    input file, size and modified time, and the same settings that shape the runs.
+
+    Attributes:
+        -path (string): the journal file
+        -job (dict): what identifies the job
+        -runs (list): dicts of path, bytes, checksum, records and offset, the input records
+                        split so far (None when runs do not line up with the input),
+                        for every finished run
+        -splitDone (bool): every run has been written
+        -plan (dict): the merge plan's fanIn, passes and steps as [runs, output, buffer
+                        size] lists, None until planned
+        -merges (dict): step number to dict of output, bytes and checksum for every
+                        finished merge
+    """
+    def __init__(self, path, job):
+        self.path = path
+        self.job = job
+        self.runs = []
+        self.splitDone = False
+        self.plan = None
+        self.merges = {}
+
+    def load(self):
+        """
+        This method reads the journal left by an earlier try at the same job. Runs are
+        only kept up to the first one that is missing or does not match its checksum.
+
+        args:
+            -N/A
+
+        return:
+            -bool: True if there is anything to resume from
+        """
+        try:
+            with open(self.path) as journalFile:
+                saved = json.load(journalFile)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if saved.get('job') != self.job:
+            logging.warning('journal {0} is for a different job, starting over'.format(self.path))
+            return False
+
+        for run in saved['runs']:
+            if not _file_matches(run['path'], run['bytes'], run['checksum']):
+                logging.warning('run {0} is missing or damaged, redoing it'.format(run['path']))
+                break
+            self.runs.append(run)
+
+        #a merge plan only holds together if every run it merges is still there
+        self.splitDone = saved['splitDone'] and len(self.runs) == len(saved['runs'])
+        if self.splitDone:
+            self.plan = saved['plan']
+            self.merges = dict((int(step), merge) for step, merge in saved['merges'].items())
+
+        return bool(self.runs)
+
+    def add_run(self, path, records, offset):
+        """
+        This method records a finished run.
+
+        args:
+            -path (string): the run file
+            -records (int): records in the run
+            -offset (int): input records split once this run is done, None if it does
+                            not line up with the input
+
+        return:
+            -N/A
+        """
+        self.runs.append({'path': path, 'bytes': os.path.getsize(path),
+                          'checksum': _file_checksum(path), 'records': records,
+                          'offset': offset})
+        self.save()
+
+    def extend_run(self, records, offset):
+        """
+        This method records that more was added to the end of the last run. The crc32
+        carries on from the old one over just the new bytes. If the sort dies while a
+        run is being added to, the run no longer matches and load() drops it.
+
+        args:
+            -records (int): records added
+            -offset (int): input records split once they are added, None if it does not
+                            line up with the input
+
+        return:
+            -N/A
+        """
+        run = self.runs[-1]
+        checksum = run['checksum']
+        with open(run['path'], 'rb') as fileHandle:
+            fileHandle.seek(run['bytes'])
+            for block in iter(lambda: fileHandle.read(1 << 20), b''):
+                checksum = zlib.crc32(block, checksum)
+
+        run['bytes'] = os.path.getsize(run['path'])
+        run['checksum'] = checksum & 0xffffffff
+        run['records'] += records
+        run['offset'] = offset
+        self.save()
+
+    def restart(self):
+        """
+        This method forgets everything, for when the runs so far can not be used.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        self.runs = []
+        self.splitDone = False
+        self.plan = None
+        self.merges = {}
+        self.save()
+
+    def finish_split(self):
+        """
+        This method records that every run has been written.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        self.splitDone = True
+        self.save()
+
+    def resume_offset(self):
+        """
+        This method gets where in the input the split can carry on from.
+
+        args:
+            -N/A
+
+        return:
+            -int: input records split by the runs so far, None if the runs so far can
+                    not be carried on from
+        """
+        if not self.runs:
+            return 0
+        return self.runs[-1]['offset']
+
+    def set_plan(self, mergePlan):
+        """
+        This method records the merge plan, so a resumed merge follows the same steps.
+
+        args:
+            -mergePlan (MergePlan): the plan
+
+        return:
+            -N/A
+        """
+        self.plan = {'fanIn': mergePlan.fanIn, 'passes': mergePlan.passes,
+                     'steps': [[list(patients), output, bufferSize]
+                               for patients, output, bufferSize in mergePlan.steps]}
+        self.merges = {}
+        self.save()
+
+    def retarget(self, output):
+        """
+        This method points the last merge of the plan at a new output, for when a sort
+        is resumed with a different target than the try that planned it. If the last
+        merge had already finished, its output is at the old target, so it is done again.
+
+        args:
+            -output (string): the new output file, '-' for a stream
+
+        return:
+            -N/A
+        """
+        last = len(self.plan['steps']) - 1
+        if self.plan['steps'][last][1] == output:
+            return
+
+        logging.info('journal {0} wrote to {1}, the last merge now writes to {2}'.format(
+            self.path, self.plan['steps'][last][1], output))
+        self.plan['steps'][last][1] = output
+        self.merges.pop(last, None)
+        self.save()
+
+    def finish_merge(self, step, output):
+        """
+        This method records a finished merge.
+
+        args:
+            -step (int): the step number in the plan
+            -output (string): the file it wrote
+
+        return:
+            -N/A
+        """
+        self.merges[step] = {'output': output, 'bytes': os.path.getsize(output),
+                             'checksum': _file_checksum(output)}
+        self.save()
+
+    def merges_done(self):
+        """
+        This method checks the finished merges and gives how many steps of the plan can
+        be skipped. Merge files a later step still needs have to match their checksums,
+        or the merge starts over.
+
+        args:
+            -N/A
+
+        return:
+            -int: steps already done, they are always the first ones
+        """
+        done = 0
+        while done in self.merges:
+            done += 1
+
+        needed = set(patient for patients, _, _ in self.plan['steps'][done:]
+                     for patient in patients)
+        for step in range(done):
+            merge = self.merges[step]
+            if merge['output'] in needed and not _file_matches(merge['output'], merge['bytes'],
+                                                               merge['checksum']):
+                logging.warning('merge file {0} is missing or damaged, merging from the '
+                                'runs again'.format(merge['output']))
+                self.merges = {}
+                return 0
+
+        return done
+
+    def save(self):
+        """
+        This method writes the journal through a temp file and renames it into place.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        saved = {'job': self.job, 'runs': self.runs, 'splitDone': self.splitDone,
+                 'plan': self.plan, 'merges': self.merges}
+
+        tempPath = self.path + '.tmp'
+        with open(tempPath, 'w') as journalFile:
+            json.dump(saved, journalFile)
+            journalFile.flush()
+            os.fsync(journalFile.fileno())
+
+        #os.replace is python 3.3+, rename replaces files on unix too
+        getattr(os, 'replace', os.rename)(tempPath, self.path)
+
+    def remove(self):
+        """
+        This method deletes the journal once the job is done.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        if os.path.exists(self.path):
+            _murder_file(self.path)
+
+
+"""
+TopSelection class
+-----
+"""
+class TopSelection(object):
+    """
+    This class keeps the 'count' smallest, or largest, records of the chunks it is
+    handed, so the front or back of the sorted output can be had in one pass over
+    the input. It is a bounded heap: once it is full, a chunk's records are checked
+    against the worst one kept, and only the few that beat it go into the heap.
+
+    With a format that drops or counts duplicates it keeps the 'count' smallest or
+    largest distinct keys instead, with how many times each one was seen.
+
+    Attributes:
+        -records (obj): the record format
+        -count (int): how many records to keep
+        -largest (bool): keep the largest records instead of the smallest
+        -held (int): how many records are kept right now
+    """
+    #where the sorted output is spooled to find its last records when the
+    #selection did not fit in memory
+    _spool_file_name = 'top_spool.dat'
+
+    def __init__(self, records, count, largest = False):
+        assert isinstance(count, int) and count > 0
+
+        self.records = records
+        self.count = count
+        self.largest = largest
+        self.held = 0
+
+        #(key, position, record), best first. The input position stops records being
+        #compared and picks between equal keys like the ends of a stable sort do: the
+        #smallest keep the first of them and the largest keep the last
+        self._heap = []
+
+        #key to [record, times seen], for formats that drop or count duplicates
+        self._kept = {}
+
+        #the worst key kept once there are 'count' of them, None before
+        self._worst = None
+        self._seen = 0
+        self._pick = heapq.nlargest if largest else heapq.nsmallest
+        self._beats = operator.gt if largest else operator.lt
+        #a later record with the worst key kept is picked over it when keeping the largest
+        self._contends = operator.ge if largest else operator.lt
+
+    def add(self, chunk):
+        """
+        This method takes in a chunk of records, keeping the ones that beat the worst
+        kept so far.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -N/A
+        """
+        keys = self.records.chunk_keys(chunk)
+        if self.records.distinct:
+            self._add_distinct(keys, chunk)
+            return
+
+        positions = itertools.count(self._seen)
+        self._seen += len(chunk)
+
+        candidates = _izip(keys, positions, chunk)
+        if self._worst is not None:
+            candidates = itertools.compress(candidates, _imap(self._contends, keys,
+                                                              itertools.repeat(self._worst)))
+
+        self._heap = self._pick(self.count, itertools.chain(self._heap, candidates))
+        self.held = len(self._heap)
+        if self.held == self.count:
+            self._worst = self._heap[-1][0]
+
+    def _add_distinct(self, keys, chunk):
+        """
+        This method takes in a chunk for a format that drops or counts duplicates. A
+        key equal to the worst one kept is counted, not turned away. A key that drops
+        out never comes back: the worst kept key only gets better.
+
+        args:
+            -keys (list or array): the chunk's keys
+            -chunk (list or array): the records
+
+        return:
+            -N/A
+        """
+        kept = self._kept
+        candidates = _izip(keys, chunk)
+        if self._worst is not None:
+            candidates = itertools.compress(candidates, _imap(operator.not_, _imap(
+                self._beats, itertools.repeat(self._worst), keys)))
+
+        for key, record in candidates:
+            seen = kept.get(key)
+            if seen is None:
+                kept[key] = [record, 1]
+            else:
+                seen[1] += 1
+
+        if len(kept) > self.count:
+            self._kept = kept = dict((key, kept[key]) for key in self._pick(self.count, kept))
+        self.held = len(kept)
+        if self.held == self.count:
+            self._worst = (min if self.largest else max)(kept)
+
+    def keep(self, chunk):
+        """
+        This method drops the records of a chunk that can not be selected any more,
+        for a chunk that is sorted with the rest instead of added.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -list or array: the records that may still be selected
+        """
+        if self._worst is None:
+            return chunk
+
+        keys = self.records.chunk_keys(chunk)
+        if self.records.distinct:
+            keep = _imap(operator.not_, _imap(self._beats, itertools.repeat(self._worst), keys))
+        else:
+            keep = _imap(self._contends, keys, itertools.repeat(self._worst))
+        return _like_chunk(chunk, itertools.compress(chunk, keep))
+
+    def spill(self):
+        """
+        This method hands back every record kept, duplicates included, and forgets
+        them, so they can be sorted with the rest of the input instead. They come back
+        in input order, so a stable sort of them and the rest breaks ties the same way.
+
+        args:
+            -N/A
+
+        return:
+            -iterable: the records
+        """
+        if self.records.distinct:
+            kept = list(self._kept.values())
+            self._kept = {}
+            spilled = itertools.chain.from_iterable(itertools.repeat(record, seen)
+                                                    for record, seen in kept)
+        else:
+            spilled = [record for _, _, record in sorted(self._heap, key=_second)]
+            self._heap = []
+
+        self.held = 0
+        return spilled
+
+    def finish(self, engine):
+        """
+        This method gives the records kept, in sorted order.
+
+        args:
+            -engine (obj): the sort engine, not needed, the heap is in order
+
+        return:
+            -list: the records, or (record, count) pairs for a format that counts
+        """
+        if self.records.distinct:
+            keys = sorted(self._kept)
+            if self.records.counts:
+                return [tuple(self._kept[key]) for key in keys]
+            return [self._kept[key][0] for key in keys]
+
+        ordered = [record for _, _, record in self._heap]
+        if self.largest:
+            ordered.reverse()
+        return ordered
+
+    def cut(self, ordered, tempDir = None):
+        """
+        This method picks the selection out of the sorted records of everything the
+        selection spilled and what came after it.
+
+        args:
+            -ordered (iterable): the records in sorted order
+            -tempDir (string): where to spool the records to find the last of them,
+                                defaults to _workingDir
+
+        return:
+            -iterable: the selected records in sorted order
+        """
+        if self.largest:
+            return self._tail(ordered, tempDir or _workingDir)
+        return itertools.islice(ordered, self.count)
+
+    def _tail(self, ordered, tempDir):
+        """
+        This generator finds the last 'count' of the sorted records. They are more than
+        fit in memory and it is not known how many records there are until the end,
+        so they are spooled to a file and read back from the right place.
+
+        args:
+            -ordered (iterable): the records in sorted order
+            -tempDir (string): where to put the spool file
+
+        return:
+            -generator: the last records in sorted order
+        """
+        spoolName = os.path.join(tempDir, TopSelection._spool_file_name)
+        try:
+            #the counter only moves when a record came out of 'ordered' first
+            tally = itertools.count()
+            self.records.write_merged((record for record, _ in _izip(ordered, tally)),
+                                      spoolName, 65536)
+            total = next(tally)
+
+            run = self.records.open_run(spoolName, 65536)
+            try:
+                for record in itertools.islice(run, max(0, total - self.count), None):
+                    yield record
+            finally:
+                run.close()
+        finally:
+            if os.path.exists(spoolName):
+                _murder_file(spoolName)
+
+
+"""
+RangeSelection class
+-----
+"""
+class RangeSelection(object):
+    """
+    This class keeps the records of the chunks it is handed whose keys are from
+    'low' up to but not including 'high', so a key range of the sorted output can
+    be had without sorting the rest. Either bound can be left open.
+
+    Attributes:
+        -records (obj): the record format
+        -low (obj): the smallest key kept, None for no bound
+        -high (obj): the first key past the range, None for no bound
+        -held (int): how many records are kept right now
+    """
+    def __init__(self, records, low = None, high = None):
+        assert low is None or high is None or low <= high, 'the range ends before it starts'
+
+        self.records = records
+        self.low = low
+        self.high = high
+        self.held = 0
+        self._held = []
+
+    def add(self, chunk):
+        """
+        This method takes in a chunk of records, keeping the ones in the range.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -N/A
+        """
+        kept = self.keep(chunk)
+        if self._held:
+            self._held.extend(kept)
+        else:
+            self._held = kept
+        self.held = len(self._held)
+
+    def keep(self, chunk):
+        """
+        This method drops the records of a chunk that are out of the range.
+
+        args:
+            -chunk (list or array): the records
+
+        return:
+            -list or array: the records in the range
+        """
+        keys = self.records.chunk_keys(chunk)
+        checks = []
+        if self.low is not None:
+            checks.append(_imap(operator.le, itertools.repeat(self.low), keys))
+        if self.high is not None:
+            checks.append(_imap(operator.lt, keys, itertools.repeat(self.high)))
+
+        if not checks:
+            return chunk
+        inRange = checks[0] if len(checks) == 1 else _imap(operator.and_, *checks)
+        return _like_chunk(chunk, itertools.compress(chunk, inRange))
+
+    def spill(self):
+        """
+        This method hands back every record kept and forgets them, so they can be
+        sorted with the rest of the input instead.
+
+        args:
+            -N/A
+
+        return:
+            -list or array: the records, in the order they were read
+        """
+        spilled = self._held
+        self._held = []
+        self.held = 0
+        return spilled
+
+    def finish(self, engine):
+        """
+        This method sorts the records kept.
+
+        args:
+            -engine (obj): the sort engine
+
+        return:
+            -list or array: the records, or (record, count) pairs for a format that counts
+        """
+        if not self._held:
+            return []
+        return self.records.sort_chunk(self._held, engine)
+
+    def cut(self, ordered, tempDir = None):
+        """
+        This method picks the selection out of the sorted records of everything the
+        selection spilled and what came after it. They were all in the range already.
+
+        args:
+            -ordered (iterable): the records in sorted order
+            -tempDir (string): not used
+
+        return:
+            -iterable: the records
+        """
+        return ordered
+
+
+"""
+SparseIndex class
+-----
+"""
+class SparseIndex(object):
+    """
+    This class collects the key and byte offset of every 'every'th record of a sorted
+    output file while it is written, and saves them next to it, so IndexedFile can
+    binary search the index and read just one block of the file to find a key.
+    Counted output and encoded runs are not indexed.
+
+    The index file is a header, '<4sI', of the magic bytes and the length of a JSON
+    description, then the description, then the offsets as little-endian uint64s, then
+    the keys: int64s or float64s, or for text the uint32 length of every key followed
+    by the keys themselves in utf-8.
+
+    Attributes:
+        -records (obj): the record format of the file
+        -every (int): records per index entry
+        -keys (list): the key of the first record of every block
+        -offsets (list): the byte offset of every block
+        -size (int): bytes of the file indexed so far
+        -encoding (string): the text encoding of the file, None for binary records
+    """
+    #what an index file starts with
+    _magic = b'SIDX'
+    _header = struct.Struct('<4sI')
+
+    def __init__(self, records, every = 1024):
+        assert isinstance(every, int) and every > 0
+        assert not getattr(records, 'counts', False), 'counted output can not be indexed'
+
+        self.records = records
+        self.every = every
+        self.keys = []
+        self.offsets = []
+        self.size = 0
+        self.encoding = None if records.recordSize else 'utf-8'
+
+    def add(self, key, blockBytes):
+        """
+        This method records the next block of the file.
+
+        args:
+            -key (obj): the key of the block's first record
+            -blockBytes (int): the size of the block
+
+        return:
+            -N/A
+        """
+        self.keys.append(key)
+        self.offsets.append(self.size)
+        self.size += blockBytes
+
+    def extend(self, other):
+        """
+        This method adds the entries of the index of a file that was appended to this one.
+
+        args:
+            -other (SparseIndex): the appended file's index
+
+        return:
+            -N/A
+        """
+        self.keys.extend(other.keys)
+        self.offsets.extend(offset + self.size for offset in other.offsets)
+        self.size += other.size
+
+    def save(self, path):
+        """
+        This method writes the index next to the file it indexes. The file's size and
+        modified time are kept, so an index left over from another output is not used.
+
+        args:
+            -path (string): the indexed file; the index goes to path plus INDEX_SUFFIX
+
+        return:
+            -N/A
+        """
+        #a UniqueRecords index is read back with the format it wraps
+        records = getattr(self.records, 'records', self.records)
+        codec = _index_key_codec(self.keys)
+        description = {
+            'format': records.name,
+            'key': records.keyType if records.keyed else None,
+            'keyWidth': records.width if records.keyed else None,
+            'every': self.every,
+            'entries': len(self.keys),
+            'codec': codec,
+            'bytes': os.path.getsize(path),
+            'modified': os.path.getmtime(path),
+        }
+        description = json.dumps(description, sort_keys=True).encode('utf-8')
+
+        with open(path + INDEX_SUFFIX, 'wb') as indexFile:
+            indexFile.write(SparseIndex._header.pack(SparseIndex._magic, len(description)))
+            indexFile.write(description)
+            indexFile.write(_pack_array('Q', self.offsets))
+
+            if codec in ('q', 'd'):
+                indexFile.write(_pack_array(codec, self.keys))
+                return
+
+            keys = [key if isinstance(key, bytes) else u'{0}'.format(key).encode('utf-8')
+                    for key in self.keys]
+            indexFile.write(_pack_array(UINT32, [len(key) for key in keys]))
+            indexFile.write(b''.join(keys))
+
+
+"""
+IndexedFile class
+-----
+"""
+class IndexedFile(object):
+    """
+    This class looks records up in a sorted output file by key, using the SparseIndex
+    written next to it. The index is binary searched for the block a key falls in and
+    only that block of the mapped file is read. Keys are what the record format sorts
+    by: the line itself, newline included, for plain text, the parsed key for --key
+    text and the value for binary records.
+
+    It can be used in a with statement.
+
+    Attributes:
+        -path (string): the sorted file
+        -records (obj): the record format, rebuilt from the index
+        -every (int): records per index entry
+        -keys (list): the key of the first record of every block
+        -offsets (list): the byte offset of every block, and the file size at the end
+    """
+    def __init__(self, path, indexPath = None):
+        self.path = path
+        self._load(indexPath or path + INDEX_SUFFIX)
+
+        self._mapped = None
+        if self.offsets[-1]:
+            with open(path, 'rb') as fileHandle:
+                self._mapped = mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load(self, indexPath):
+        """
+        This method reads the index file and checks it belongs to the sorted file.
+
+        args:
+            -indexPath (string): the index file
+
+        return:
+            -N/A
+        """
+        with open(indexPath, 'rb') as indexFile:
+            data = indexFile.read()
+
+        header = SparseIndex._header
+        magic, length = header.unpack_from(data)
+        if magic != SparseIndex._magic:
+            raise ValueError('{0} is not a sparse index'.format(indexPath))
+
+        position = header.size + length
+        description = json.loads(data[header.size:position].decode('utf-8'))
+        if (description['bytes'] != os.path.getsize(self.path)
+                or description['modified'] != os.path.getmtime(self.path)):
+            raise ValueError('{0} is not the index of {1} as it is now'.format(indexPath, self.path))
+
+        if description['key']:
+            self.records = KeyedTextRecords(description['key'], description['keyWidth'])
+        else:
+            self.records = RECORD_FORMATS[description['format']]()
+        self.every = description['every']
+
+        count = description['entries']
+        self.offsets = list(_unpack_array('Q', data[position:position + 8 * count]))
+        self.offsets.append(description['bytes'])
+        position += 8 * count
+
+        codec = description['codec']
+        if codec in ('q', 'd'):
+            self.keys = list(_unpack_array(codec, data[position:position + 8 * count]))
+            return
+
+        lengths = _unpack_array(UINT32, data[position:position + 4 * count])
+        position += 4 * count
+        parse = int if codec == 'int' else (lambda key: key if str is bytes else key.decode('utf-8'))
+
+        self.keys = []
+        for length in lengths:
+            self.keys.append(parse(data[position:position + length]))
+            position += length
+
+    def lookup(self, key):
+        """
+        This method finds every record with a key.
+
+        args:
+            -key (obj): the key; a plain text key gets a newline if it has none
+
+        return:
+            -list: the records with that key, in file order
+        """
+        records = self.records
+        if not records.keyed and not records.recordSize and not key.endswith('\n'):
+            key += '\n'
+
+        found = []
+        for record in self.scan(key):
+            if records.record_key(record) != key:
+                break
+            found.append(record)
+        return found
+
+    def scan(self, low = None, high = None):
+        """
+        This generator hands back the records with keys from 'low' up to but not
+        including 'high', in order. It starts at the block before the first one whose
+        key is at least 'low', since equal keys can run across blocks, and reads on one
+        block at a time until a key reaches 'high'.
+
+        args:
+            -low (obj): the smallest key, None to start at the front
+            -high (obj): the first key past the range, None to go to the end
+
+        return:
+            -generator: the records
+        """
+        block = 0
+        if low is not None:
+            block = max(0, bisect.bisect_left(self.keys, low) - 1)
+
+        for block in range(block, len(self.keys)):
+            records = self._block(block)
+            keys = self.records.chunk_keys(records)
+
+            start = 0 if low is None else bisect.bisect_left(keys, low)
+            end = len(keys) if high is None else bisect.bisect_left(keys, high)
+            for record in records[start:end]:
+                yield record
+
+            if end < len(keys):
+                return
+
+    def _block(self, block):
+        """
+        This method reads the records of one block of the mapped file.
+
+        args:
+            -block (int): the block number
+
+        return:
+            -list or array: the records
+        """
+        return self.records.unpack(self._mapped[self.offsets[block]:self.offsets[block + 1]])
+
+    def close(self):
+        """
+        This method unmaps the file.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+"""
+FileSuture class
+-----
+"""
+class FileSuture(object):
+    """
+    This class provides provides an nway merger select
+
+    It scans every run head for every line written, so it costs O(k) per line.
+
+    Attributes:
+        -N/A
+    """
+    def pick_target(self, thread):
+        """
+        This method picks a file from a list of files.
+
+        args:
+            -thread (dict of strings): the current line of each live file by index
+
+        return:
+            -int: the index of the file with the smallest line
+        """
+        incisionPoint = -1
+        pathToCut = None
+
+        #find the right file
+        for i in thread:
+            if pathToCut is None or thread[i] < pathToCut:
+                incisionPoint = i
+                pathToCut = thread[i]
+
+        return incisionPoint
+
+    def merge(self, threads):
+        """
+        This generator merges sorted runs by scanning the run heads with pick_target.
+
+        args:
+            -threads (list): sorted iterators of lines (usually open chunk files)
+
+        return:
+            -generator: the lines in sorted order
+        """
+        ammo = AmmoRack(threads)
+
+        #WAR
+        while ammo.reload():
+            #get target and bombs away
+            yield ammo.unload(self.pick_target(ammo.make_war_plans()))
+
+
+"""
+HeapSuture class
+-----
+"""
+class HeapSuture(object):
+    """
+    This class provides an nway merge that keeps the run heads in a binary heap,
+    so each line costs O(log k) comparisons.
+
+    Attributes:
+        -N/A
+    """
+    def merge(self, threads):
+        """
+        This generator merges sorted runs using a heap of (line, run index) pairs.
+        Ties go to the lower run index so the merge is stable.
+
+        args:
+            -threads (list): sorted iterators of lines (usually open chunk files)
+
+        return:
+            -generator: the lines in sorted order
+        """
+        #seed the heap with the first line of every run
+        heap = []
+        for i in range(len(threads)):
+            line = next(threads[i], None)
+            if line is not None:
+                heap.append((line, i))
+        heapq.heapify(heap)
+
+        #local names to save attribute lookups per line
+        heapreplace = heapq.heapreplace
+        heappop = heapq.heappop
+
+        while heap:
+            line, i = heap[0]
+            yield line
+
+            #refill from the run we just took from
+            line = next(threads[i], None)
+            if line is None:
+                heappop(heap)
+            else:
+                heapreplace(heap, (line, i))
+
+
+"""
+LoserTreeSuture class
+-----
+"""
+class LoserTreeSuture(object):
+    """
+    This class provides an nway merge using a tournament (loser) tree. Internal nodes
+    keep the loser of each match so replaying a leaf only walks up one path,
+    which is exactly ceil(log2 k) comparisons per line.
+
+    Attributes:
+        -N/A
+    """
+    def merge(self, threads):
+        """
+        This generator merges sorted runs with a loser tree. Exhausted runs are
+        treated as +infinity and ties go to the lower run index.
+
+        args:
+            -threads (list): sorted iterators of lines (usually open chunk files)
+
+        return:
+            -generator: the lines in sorted order
+        """
+        k = len(threads)
+        if k == 0:
+            return
+
+        #current line of each run, None once the run is empty
+        heads = [next(thread, None) for thread in threads]
+
+        #tree[1..k-1] hold losers, leaves sit at k..2k-1
+        tree = [0] * k
+
+        def _beats(a, b):
+            if heads[a] is None:
+                return False
+            if heads[b] is None:
+                return True
+            return heads[a] < heads[b] or (heads[a] == heads[b] and a < b)
+
+        def _play(node):
+            #leaf, return the run index
+            if node >= k:
+                return node - k
+
+            left = _play(2 * node)
+            right = _play(2 * node + 1)
+            if _beats(left, right):
+                tree[node] = right
+                return left
+            tree[node] = left
+            return right
+
+        winner = _play(1)
+
+        while True:
+            line = heads[winner]
+            if line is None:
+                return
+            yield line
+
+            #refill the winning leaf and replay its path to the root
+            line = heads[winner] = next(threads[winner], None)
+            node = (winner + k) >> 1
+            while node:
+                challenger = tree[node]
+                other = heads[challenger]
+                if other is not None and (line is None or other < line
+                                          or (other == line and challenger < winner)):
+                    tree[node] = winner
+                    winner = challenger
+                    line = other
+                node >>= 1
+
+
+"""
+BlockSuture class
+-----
+"""
+class BlockSuture(object):
+    """
+    This class provides an nway merge that works on blocks of records instead of single
+    records. The run with the smallest head gives up every record in its block that is
+    not bigger than the next smallest head of any other run, found with a galloping
+    search, as one slice. On skewed or partly ordered runs the slices are long, so most
+    records never pass through python code one at a time.
+
+    Attributes:
+        -blockRecords (int): records to read from a run at a time
+    """
+    def __init__(self, blockRecords = 8192):
+        self.blockRecords = blockRecords
+
+    def merge(self, threads):
+        """
+        This method merges sorted runs, flattening the slices from merge_blocks() in C.
+
+        args:
+            -threads (list): sorted iterators of records (usually open chunk files)
+
+        return:
+            -iterator: the records in sorted order
+        """
+        return itertools.chain.from_iterable(self.merge_blocks(threads))
+
+    def merge_blocks(self, threads):
+        """
+        This generator merges sorted runs a slice at a time. Ties go to the lower run
+        index so the merge is stable.
+
+        args:
+            -threads (list): sorted iterators of records (usually open chunk files)
+
+        return:
+            -generator: lists of records; joined together they are in sorted order
+        """
+        size = self.blockRecords
+        islice = itertools.islice
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        #the current block and how far into it each run is
+        blocks = [list(islice(thread, size)) for thread in threads]
+        positions = [0] * len(threads)
+
+        heap = [(blocks[i][0], i) for i in range(len(threads)) if blocks[i]]
+        heapq.heapify(heap)
+
+        while heap:
+            _, i = heappop(heap)
+            block = blocks[i]
+            pos = positions[i]
+
+            #take everything up to the next smallest head of the other runs
+            if heap:
+                bound, j = heap[0]
+                end = _gallop(block, bound, pos, i < j)
+            else:
+                end = len(block)
+
+            if pos == 0 and end == len(block):
+                yield block
+            else:
+                yield block[pos:end]
+
+            #move along, refilling the block once it is used up
+            if end == len(block):
+                block = blocks[i] = list(islice(threads[i], size))
+                end = 0
+                if not block:
+                    continue
+
+            positions[i] = end
+            heappush(heap, (block[end], i))
+
+
+"""
+Globals
+-----
+"""
+#merge strategies by name, for picking one from the command line
+SUTURE_PLANS = {
+    'scan': FileSuture,
+    'heap': HeapSuture,
+    'losertree': LoserTreeSuture,
+    'block': BlockSuture,
+}
+
+#record formats by name
+RECORD_FORMATS = {
+    'text': TextRecords,
+    'binary': BinaryRecords,
+}
+
+#typed keys text can be sorted by, 'line' compares the whole line instead
+KEY_TYPES = sorted(KeyedTextRecords._key_arrays)
+
+#what to do with duplicate records, 'keep' keeps them all
+DUPLICATE_MODES = {
+    'unique': UniqueRecords,
+    'count': CountedRecords,
+}
+
+#run encodings by name, 'none' leaves runs in the record format
+RUN_ENCODINGS = {
+    'zlib': ZlibRuns,
+    'delta': DeltaRuns,
+}
+
+
+"""
+Helper Function(s)
+-----
+"""
+def _stitch_corpse(chunk, chunkName, records, engine, runs = None):
+    """
+    This helper function sorts a chunk and writes it to a chunk file. It lives at module
+    level so it can be sent to a process pool.
+
+    args:
+        -chunk (list or array): the records to put into a chunk file
+        -chunkName (string): the path of the chunk file
+        -records (obj): the record format
+        -engine (obj): the sort engine
+        -runs (obj): what writes the chunk file, like an EncodedRuns, defaults to records
+
+    return:
+        -dict: records, sort and write seconds, the engine's operation counts and any
+                encoding numbers
+    """
+    stats = {'records': len(chunk)}
+
+    #save some time and do the sort now while values already in memory
+    start = time.time()
+    chunk = records.sort_chunk(chunk, engine)
+    stats['sortSeconds'] = time.time() - start
+    if records.distinct:
+        stats['distinctRecords'] = len(chunk)
+
+    if engine.lastCounts:
+        stats.update(engine.lastCounts)
+
+    #write the chunk to file
+    start = time.time()
+    try:
+        written = (runs or records).write_chunk(chunk, chunkName)
+    except Exception as e:
+        raise RuntimeError('Failed to write chunk data to file {0}.'.format(chunkName)\
+                            + 'Error was: {0}'.format(e))
+    stats['writeSeconds'] = time.time() - start
+    stats.update(written or {})
+
+    return stats
+
+
+def _chunk_order(records, chunk):
+    """
+    This helper function checks if a chunk is already sorted either way round. The
+    first few records are looked at on their own first, so a chunk that needs sorting
+    is usually turned down without getting the keys of all of it.
+
+    Keyed sorts are stable, so a keyed chunk is only descending when no two neighbours
+    have equal keys; reversing it would turn equal keys round. Equal plain records
+    are the same, so it does not matter for them.
+
+    args:
+        -records (obj): the record format
+        -chunk (list or array): the records
+
+    return:
+        -string: 'ascending', 'descending', or None if it needs sorting
+    """
+    strict = records.keyed
+    if len(chunk) > _ORDER_PROBE and \
+            _run_order(records.chunk_keys(chunk[:_ORDER_PROBE]), strict) is None:
+        return None
+    return _run_order(records.chunk_keys(chunk), strict)
+
+
+def _growing_size(first, most):
+    """
+    This helper function makes a read size that starts small and doubles every time it
+    is asked for, up to a limit, for reads that can usually stop early.
+
+    args:
+        -first (int): bytes for the first read
+        -most (int): the most bytes for any read
+
+    return:
+        -callable: gives the size of the next read
+    """
+    size = [max(1, min(first, most))]
+
+    def next_size():
+        current = size[0]
+        size[0] = min(most, current * 2)
+        return current
+
+    return next_size
+
+
+def _run_order(keys, strict = False):
+    """
+    This helper function finds which way a sequence of keys is sorted, if it is.
+    Keys that are all equal are ascending.
+
+    args:
+        -keys (list or array): the keys
+        -strict (bool): descending keys may not be equal
+
+    return:
+        -string: 'ascending', 'descending' or None
+    """
+    if _keys_in_order(keys, operator.le):
+        return 'ascending'
+    if _keys_in_order(keys, operator.gt if strict else operator.ge):
+        return 'descending'
+    return None
+
+
+def _keys_in_order(keys, compare):
+    """
+    This helper function checks 'compare' holds for every key and the one after it,
+    stopping at the first pair it does not.
+
+    args:
+        -keys (list or array): the keys
+        -compare (function): like operator.le
+
+    return:
+        -bool: True if every neighbouring pair compares
+    """
+    return all(_imap(compare, keys, itertools.islice(keys, 1, None)))
+
+
+def _put_in_order(chunk, order):
+    """
+    This helper function turns a chunk that chunk_order() found sorted into ascending
+    order, in-place.
+
+    args:
+        -chunk (list or array): the records
+        -order (string): 'ascending' or 'descending'
+
+    return:
+        -list or array: the chunk
+    """
+    if order == 'descending':
+        chunk.reverse()
+    return chunk
+
+
+def _like_chunk(chunk, records):
+    """
+    This helper function builds a chunk of the same kind as another, an array with
+    the same typecode for binary records or a list for the rest.
+
+    args:
+        -chunk (list or array): the chunk to copy the kind of
+        -records (iterable): the records to put in it
+
+    return:
+        -list or array: the new chunk
+    """
+    if isinstance(chunk, array.array):
+        return array.array(chunk.typecode, records)
+    return list(records)
+
+
+def _text_bytes(text, fileHandle):
+    """
+    This helper function gets how many bytes text takes up once written to a file.
+
+    args:
+        -text (string): the text
+        -fileHandle (file): the file it was written to, for its encoding
+
+    return:
+        -int: the size in bytes
+    """
+    if isinstance(text, bytes):
+        return len(text)
+    return len(text.encode(getattr(fileHandle, 'encoding', None) or 'utf-8'))
+
+
+def _index_key_codec(keys):
+    """
+    This helper function picks how a sparse index stores its keys: an array for ints
+    and floats, or utf-8 text for strings and ints too big for 64 bits.
+
+    args:
+        -keys (list): the keys
+
+    return:
+        -string: 'q', 'd', 'int' or 'str'
+    """
+    if not keys or isinstance(keys[0], (str, bytes, type(u''))):
+        return 'str'
+    if isinstance(keys[0], float):
+        return 'd'
+    try:
+        array.array('q', keys)
+        return 'q'
+    except OverflowError:
+        return 'int'
+
+
+def _pack_array(typecode, values):
+    """
+    This helper function turns values into little-endian bytes, like uint32_bytes().
+
+    args:
+        -typecode (string): the array typecode
+        -values (iterable): the values
+
+    return:
+        -bytes: the packed values
+    """
+    values = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+def _unpack_array(typecode, data):
+    """
+    This helper function turns little-endian bytes back into values, like uint32_array().
+
+    args:
+        -typecode (string): the array typecode
+        -data (bytes): the packed values
+
+    return:
+        -array: the values
+    """
+    values = array.array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return values
+
+
+def _stitch_part(surgeon, slices, partName, bufferSize, indexEvery = 0):
+    """
+    This helper function merges one key range of the runs into a part file. It lives at
+    module level so it can be sent to a process pool.
+
+    args:
+        -surgeon (FileSurgeon): the surgeon, for its plan and record format
+        -slices (list of tuples): (run, start offset, end offset) for every run with
+                                records in the range
+        -partName (string): the part file to write
+        -bufferSize (int): read and write buffer size in bytes
+        -indexEvery (int): index every indexEvery'th record of the part, 0 for none
+
+    return:
+        -SparseIndex: the part's index with offsets into the part, None for none
+    """
+    records = surgeon.records
+    index = SparseIndex(records, indexEvery) if indexEvery else None
+    threads = [records.open_slice(path, start, end, bufferSize) for path, start, end in slices]
+    try:
+        records.write_merged(surgeon._merge(threads), partName, bufferSize, index)
+    finally:
+        for thread in threads:
+            thread.close()
+    return index
+
+
+def _append_file(source, target):
+    """
+    This helper function copies the rest of one open file onto the end of another, in
+    the kernel with os.sendfile where there is one.
+
+    args:
+        -source (file): where to copy from, opened for binary reading
+        -target (file): where to copy to, opened for binary writing
+
+    return:
+        -N/A
+    """
+    sendfile = getattr(os, 'sendfile', None)
+    if sendfile is not None:
+        target.flush()
+        offset = source.tell()
+        size = os.fstat(source.fileno()).st_size
+        try:
+            while offset < size:
+                sent = sendfile(target.fileno(), source.fileno(), offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+            #the target file object does not know the kernel moved its position
+            target.seek(0, os.SEEK_END)
+            return
+        except OSError:
+            #some systems only send to sockets, copy the rest the slow way
+            source.seek(offset)
+
+    shutil.copyfileobj(source, target, 1 << 20)
+
+
+def _time_reads(chunks):
+    """
+    This helper function times how long each chunk takes to come out of a generator.
+
+    args:
+        -chunks (iterable): the chunks from the record format
+
+    return:
+        -generator: (chunk, seconds) tuples
+    """
+    chunks = iter(chunks)
+    while True:
+        start = time.time()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk, time.time() - start
+        del chunk
+
+
+def _gallop(block, bound, lo, inclusive):
+    """
+    This helper function finds where the records below a bound end in a sorted block,
+    doubling the step from lo before binary searching, so a short answer is cheap.
+
+    args:
+        -block (list): sorted records
+        -bound (obj): the record to stop at
+        -lo (int): where to start looking
+        -inclusive (bool): also take records equal to the bound
+
+    return:
+        -int: the index of the first record past the bound
+    """
+    search = bisect.bisect_right if inclusive else bisect.bisect_left
+    n = len(block)
+
+    step = 1
+    while lo + step < n and (block[lo + step] <= bound if inclusive else block[lo + step] < bound):
+        step *= 2
+
+    return search(block, bound, lo + step // 2, min(lo + step + 1, n))
+
+
+def _put_until_stopped(blockQueue, item, stop):
+    """
+    This helper function puts an item on a bounded queue, giving up if the stop
+    event is set while it waits for room.
+
+    args:
+        -blockQueue (Queue): the queue
+        -item (obj): the thing to queue
+        -stop (Event): set when the other side has gone away
+
+    return:
+        -bool: True if the item was queued
+    """
+    while not stop.is_set():
+        try:
+            blockQueue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def _varint_deltas(values):
+    """
+    This helper function writes the gaps between sorted ints as varints: seven bits a
+    byte, low bits first, with the top bit set on every byte but the last. The first
+    value is its gap from 0.
+
+    args:
+        -values (iterable): non-negative ints in order
+
+    return:
+        -bytes: the varints, or None if the values go down anywhere
+    """
+    out = bytearray()
+    append = out.append
+    previous = 0
+
+    for value in values:
+        gap = value - previous
+        if gap < 0:
+            return None
+        previous = value
+
+        while gap > 0x7f:
+            append((gap & 0x7f) | 0x80)
+            gap >>= 7
+        append(gap)
+
+    return bytes(out)
+
+
+def _varint_sums(data, count):
+    """
+    This helper function reads varint gaps from _varint_deltas() back into the values.
+
+    args:
+        -data (bytes): the varints
+        -count (int): how many values there should be
+
+    return:
+        -list: the values
+    """
+    values = []
+    append = values.append
+    value = gap = shift = 0
+
+    for byte in bytearray(data):
+        if byte & 0x80:
+            gap |= (byte & 0x7f) << shift
+            shift += 7
+        else:
+            value += gap | (byte << shift)
+            append(value)
+            gap = shift = 0
+
+    if len(values) != count:
+        raise ValueError('delta block holds {0} values, its header says {1}'.format(
+            len(values), count))
+
+    return values
+
+
+def _first_of_first(pair):
+    """
+    This helper function gets the key of a ((key, tiebreak, record), count) pair.
+
+    args:
+        -pair (tuple): the pair
+
+    return:
+        -obj: the key
+    """
+    return pair[0][0]
+
+
+@contextlib.contextmanager
+def _open_source(path, mode, bufferSize = -1):
+    """
+    This helper function opens a file by name, or passes an open file or other
+    iterable through as it is. Only files it opened are closed.
+
+    args:
+        -path (string or obj): the file name, or the open file
+        -mode (string): mode to open a named file with
+        -bufferSize (int): buffer size to open a named file with
+
+    return:
+        -context manager: the file
+    """
+    if not isinstance(path, str):
+        yield path
+        return
+
+    with open(path, mode, bufferSize) as fileHandle:
+        yield fileHandle
+
+
+def _line_chunks(lines, chunkSize):
+    """
+    This helper function cuts an iterable of lines into chunks of about 'chunkSize'
+    bytes. Lines are taken in bulk by count, from the average line length so far.
+
+    args:
+        -lines (iterable): the lines
+        -chunkSize (int or callable): about how many bytes to put in each chunk
+
+    return:
+        -generator: lists of lines
+    """
+    lines = iter(lines)
+
+    #a first guess, fixed up by the first chunk
+    average = 16.0
+    while True:
+        chunk = list(itertools.islice(lines, max(1, int(_chunk_bytes(chunkSize) / average))))
+        if not chunk:
+            return
+
+        average = max(1.0, float(sum(map(len, chunk))) / len(chunk))
+        yield chunk
+
+        #let go of it before the next one is read, so two are never held at once
+        del chunk
+
+
+def _chunk_bytes(chunkSize):
+    """
+    This helper function gets a chunk size that may be a callable.
+
+    args:
+        -chunkSize (int or callable): the size, or something that returns it
+
+    return:
+        -int: the size in bytes
+    """
+    return chunkSize() if callable(chunkSize) else chunkSize
+
+
+def _resident_bytes():
+    """
+    This helper function gets the bytes this process has resident. Linux has the
+    current figure in /proc; elsewhere the peak from getrusage has to do.
+
+    args:
+        -N/A
+
+    return:
+        -int: resident bytes, or None if there is no way to tell
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    if resource is None:
+        return None
+
+    #ru_maxrss is KB on linux and bytes on mac
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _private_bytes():
+    """
+    This helper function gets the bytes of memory this process has of its own, the
+    anonymous pages a forked child shares until one of them writes to them. Elsewhere
+    than linux all of resident memory has to do.
+
+    args:
+        -N/A
+
+    return:
+        -int: private bytes, or None if there is no way to tell
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as rollup:
+            for line in rollup:
+                if line.startswith('Anonymous:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    return _resident_bytes()
+
+
+def _open_file_limit():
+    """
+    This helper function gets the soft limit on open files for this process.
+
+    args:
+        -N/A
+
+    return:
+        -int: the limit, or None if it is unknown or unlimited
+    """
+    if resource is None:
+        return None
+
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return None
+
+    return soft
+
+
+def _map_file(path):
+    """
+    This helper function maps a whole file read-only. The file is closed right away,
+    the map stays valid until it is closed.
+
+    args:
+        -path (string): the file to map
+
+    return:
+        -mmap: the mapped file, or None if the file is empty
+    """
+    with open(path, 'rb') as fileHandle:
+        size = os.fstat(fileHandle.fileno()).st_size
+        if not size:
+            return None
+
+        if size % BinaryRecords.recordSize:
+            raise ValueError('{0} is not a whole number of uint32 records'.format(path))
+
+        return mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _drop_pages(mapped, start, end):
+    """
+    This helper function tells the OS the pages of a mapped file from 'start' up to
+    'end' have been read and are not needed again. Pages of a mapped file count as
+    resident memory of the process that read them, so without this walking a big run
+    would take as much memory as the run is big. Python before 3.8 has no madvise and
+    leaves them to the OS.
+
+    args:
+        -mapped (mmap): the mapped file
+        -start (int): the first byte not dropped yet
+        -end (int): the byte read up to
+
+    return:
+        -int: where the next call should start, 'end' rounded down to a whole page
+    """
+    start -= start % mmap.PAGESIZE
+    end -= end % mmap.PAGESIZE
+    if end <= start:
+        return start
+
+    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+        mapped.madvise(mmap.MADV_DONTNEED, start, end - start)
+    return end
+
+
+def pick_splitters(samples, parts):
+    """
+    This function picks the keys that cut weighted samples into 'parts' ranges of about
+    the same total weight.
+
+    args:
+        -samples (list of tuples): (key, weight) pairs, in any order
+        -parts (int): how many ranges to make
+
+    return:
+        -list: the splitter keys in order, one fewer than the ranges; equal ones are
+                dropped so there can be fewer
+    """
+    samples = sorted(samples, key=_first)
+
+    total = sum(weight for _, weight in samples)
+    splitters = []
+    seen = 0.0
+    for key, weight in samples:
+        seen += weight
+        while len(splitters) < parts - 1 and seen >= total * (len(splitters) + 1) / parts:
+            splitters.append(key)
+
+    #repeated keys would only make empty ranges
+    return [key for i, key in enumerate(splitters) if i == 0 or key != splitters[i - 1]]
+
+
+def uint32_array(data):
+    """
+    This helper function turns little-endian bytes into an array of uint32s.
+
+    args:
+        -data (bytes): the raw records
+
+    return:
+        -array: the values
+    """
+    values = array.array(UINT32)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return values
+
+
+def uint32_bytes(values):
+    """
+    This helper function turns an array of uint32s into little-endian bytes.
+
+    args:
+        -values (array): the values
+
+    return:
+        -bytes: the raw records
+    """
+    if sys.byteorder == 'big':
+        values = array.array(UINT32, values)
+        values.byteswap()
+
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+def _file_checksum(path):
+    """
+    This helper function gets the crc32 of a file, read a block at a time.
+
+    args:
+        -path (string): the file
+
+    return:
+        -int: the checksum
+    """
+    checksum = 0
+    with open(path, 'rb') as fileHandle:
+        for block in iter(lambda: fileHandle.read(1 << 20), b''):
+            checksum = zlib.crc32(block, checksum)
+
+    return checksum & 0xffffffff
+
+
+def _file_matches(path, size, checksum):
+    """
+    This helper function checks a file is still the one a journal recorded.
+
+    args:
+        -path (string): the file
+        -size (int): bytes it should be
+        -checksum (int): crc32 it should have
+
+    return:
+        -bool: True if the file is there and matches
+    """
+    try:
+        if os.path.getsize(path) != size:
+            return False
+    except OSError:
+        return False
+
+    return _file_checksum(path) == checksum
+
+
 def _murder_file(theSheep):
     """
     This helper function is meant to be used in conjunction with map() to delete chunk
@@ -368,4 +6178,4 @@ def _murder_file(theSheep):
     try:
         os.remove(theSheep)
     except Exception as e:
-        raise RuntimeError('File {0} could not be deleted becuase of Error: {1}'.format(file, e))
+        raise RuntimeError('File {0} could not be deleted becuase of Error: {1}'.format(theSheep, e))
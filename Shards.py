@@ -0,0 +1,783 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+This File contains the classes for sorting a data set that is spread over several hosts,
+one shard per host, into globally ordered output partitions.
+
+A ShardCoordinator waits for every worker, numbers them, picks the range splitters from
+the samples they send and collects their reports. Each ShardWorker:
+1. Sorts its shard locally with Sorts.ExternSort
+2. Sends a sample of its sorted shard to the coordinator and gets the splitters back
+3. Cuts its sorted shard at the splitters and sends each key range to the node that owns it
+4. Merges the ranges it got from every node into its output partition
+
+Node i ends up with the i-th key range, so the partitions in node order are the sorted
+data set.
+
+Everything goes over TCP as frames of a (kind, length) header and a payload. Control
+messages are JSON; key ranges are sent as the raw bytes of the sorted shard.
+
+---------
+Contains:
+---------
+Classes:
+    -ShardCoordinator()
+        +__init__(self, nodes, host = '127.0.0.1', port = 0, samplesPerNode = 256,
+                  timeout = _TIMEOUT)
+        +listen(self)
+        +run(self)
+        +report(self)
+
+    -ShardWorker()
+        +__init__(self, coordinator, shard, target, sortArgs = None, host = '127.0.0.1',
+                  tempDir = None, rank = None, timeout = _TIMEOUT)
+        +run(self)
+        -_sort_shard(self, workDir)
+        -_sample(self, records, sortedShard, count)
+        -_start_receiving(self, workDir, senders)
+        -_receive_range(self, conn, workDir)
+        -_send_range(self, peer, sortedShard, start, end)
+        -_merge_ranges(self, records, runs)
+
+Functions:
+    +run_local(shards, targets, sortArgs = None, host = '127.0.0.1', timeout = _TIMEOUT)
+    -_local_worker(coordinator, shard, target, sortArgs, host, rank, timeout)
+    -_encode_key(key)
+    -_decode_key(key)
+    -_send_json(sock, message)
+    -_recv_json(sock, kind)
+    -_send_frame(sock, kind, payload)
+    -_recv_frame_header(sock)
+    -_recv_exact(sock, count)
+    -_send_file_range(sock, path, start, end)
+    -_copy_file_range(path, start, end, targetPath)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started. Coordinator and worker protocol for sharded sorts, testable with
+                    run_local() on one host.
+    -10/17/26 - Every socket has a timeout, and so does waiting for the other nodes'
+                    ranges, so a node that dies fails the job instead of hanging it.
+                    The received byte count is added to under a lock.
+    -10/17/26 - Messages from peers are checked with errors instead of asserts, so a bad
+                    or out of order message fails the job under python -O too.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import FileMonsters
+import Sorts
+
+"""
+Globals
+-----
+"""
+#kind and payload bytes in front of every frame
+_FRAME_HEADER = struct.Struct('<BQ')
+
+#frame kinds
+_JSON = 0
+_DATA = 1
+
+#bytes moved per send or receive call
+_IO_BLOCK = 1 << 20
+
+#read buffer per run for the final merge
+_MERGE_BUFFER = 1 << 20
+
+#fields every control message must have, by its type
+_MESSAGE_FIELDS = {'hello': ['shard', 'dataHost', 'dataPort'],
+                   'assign': ['node', 'nodes', 'peers', 'samples'],
+                   'samples': ['keys', 'weights'],
+                   'splitters': ['keys'],
+                   'range': ['node'],
+                   'done': ['node', 'stats'],
+                   'bye': []}
+
+#seconds any socket call may wait before the job fails; a peer can be busy sorting its
+#shard for a while before it sends or answers
+_TIMEOUT = 3600.0
+
+
+"""
+ShardCoordinator class
+-----
+"""
+class ShardCoordinator(object):
+    """
+    This class runs the control side of a sharded sort. It only moves control messages;
+    the records go straight from worker to worker.
+
+    Attributes:
+        -nodes (int): how many workers take part
+        -host (string): address to listen on
+        -port (int): port to listen on, 0 picks a free one, see listen()
+        -samplesPerNode (int): sampled keys asked of each worker per node
+        -timeout (float): seconds any socket call may wait, None to wait forever
+        -splitters (list): the keys the ranges were cut at, set once picked
+        -stats (list): each worker's report by node number, set once they are done
+        -startTime (time): when the first worker was numbered
+        -endTime (time): when the last report came in
+    """
+    def __init__(self, nodes, host = '127.0.0.1', port = 0, samplesPerNode = 256,
+                 timeout = _TIMEOUT):
+        if not isinstance(nodes, int) or nodes < 1:
+            raise ValueError('a sharded sort needs at least one node, not {0!r}'.format(nodes))
+
+        self.nodes = nodes
+        self.host = host
+        self.port = port
+        self.samplesPerNode = samplesPerNode
+        self.timeout = timeout
+        self.splitters = None
+        self.stats = None
+        self.startTime = None
+        self.endTime = None
+        self._server = None
+
+    def listen(self):
+        """
+        This method opens the listening socket, so workers can be started before run().
+
+        args:
+            -N/A
+
+        return:
+            -tuple: (host, port) the workers should connect to
+        """
+        if self._server is None:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind((self.host, self.port))
+            self._server.listen(self.nodes)
+            self._server.settimeout(self.timeout)
+            self.port = self._server.getsockname()[1]
+
+        return self.host, self.port
+
+    def run(self):
+        """
+        This method runs the sort from the coordinator's side: numbers the workers,
+        picks the splitters and waits for every partition. A worker that does not
+        join or answer within the timeout fails the job with socket.timeout.
+
+        args:
+            -N/A
+
+        return:
+            -list: each worker's report by node number
+        """
+        self.listen()
+        workers = []
+        try:
+            #every worker says hello with where its peers can reach it
+            while len(workers) < self.nodes:
+                conn, _ = self._server.accept()
+                conn.settimeout(self.timeout)
+                hello = _recv_json(conn, 'hello')
+                workers.append((conn, hello))
+                logging.info('shard worker {0} of {1} joined with {2}'.format(
+                    len(workers), self.nodes, hello['shard']))
+
+            #ranked workers first in rank order, then the rest in the order they joined
+            workers.sort(key=lambda worker: (worker[1].get('rank') is None,
+                                             worker[1].get('rank') or 0))
+            self.startTime = time.time()
+            peers = [[hello['dataHost'], hello['dataPort']] for _, hello in workers]
+            for node, (conn, _) in enumerate(workers):
+                _send_json(conn, {'type': 'assign', 'node': node, 'nodes': self.nodes,
+                                  'peers': peers, 'samples': self.samplesPerNode * self.nodes})
+
+            #splitters from every worker's sample, each key standing for its share of bytes
+            samples = []
+            for conn, _ in workers:
+                message = _recv_json(conn, 'samples')
+                samples.extend(zip(message['keys'], message['weights']))
+            self.splitters = FileMonsters.pick_splitters(
+                [(_decode_key(key), weight) for key, weight in samples], self.nodes)
+
+            #repeated keys can leave fewer splitters than ranges; the last nodes get none
+            for conn, _ in workers:
+                _send_json(conn, {'type': 'splitters',
+                                  'keys': [_encode_key(key) for key in self.splitters]})
+
+            self.stats = [None] * self.nodes
+            for conn, _ in workers:
+                message = _recv_json(conn, 'done')
+                node = message['node']
+                if node not in range(self.nodes) or self.stats[node] is not None:
+                    raise ValueError('a worker reported done as node {0!r}'.format(node))
+                self.stats[node] = message['stats']
+            self.endTime = time.time()
+
+            for conn, _ in workers:
+                _send_json(conn, {'type': 'bye'})
+        finally:
+            for conn, _ in workers:
+                conn.close()
+            self._server.close()
+            self._server = None
+
+        return self.stats
+
+    def report(self):
+        """
+        This method describes each node's throughput and network traffic.
+
+        args:
+            -N/A
+
+        return:
+            -string: the report
+        """
+        lines = ['sharded sort over {0} nodes, {1} splitters, took {2:.3f}s'.format(
+            self.nodes, len(self.splitters), self.endTime - self.startTime)]
+
+        for node, stats in enumerate(self.stats):
+            seconds = stats['seconds'] or 1e-9
+            lines.append('    node {0}: {1} -> {2}, {3} bytes in, {4} bytes out, sent {5} '
+                         'bytes, received {6} bytes, sort {7:.3f}s, exchange {8:.3f}s, '
+                         'merge {9:.3f}s, {10:.2f} MB/s'.format(
+                             node, stats['shard'], stats['target'], stats['inputBytes'],
+                             stats['outputBytes'], stats['sentBytes'],
+                             stats['receivedBytes'], stats['sortSeconds'],
+                             stats['exchangeSeconds'], stats['mergeSeconds'],
+                             stats['inputBytes'] / seconds / (1 << 20)))
+
+        lines.append('    network: {0} bytes sent in total'.format(
+            sum(stats['sentBytes'] for stats in self.stats)))
+        return '\n'.join(lines)
+
+
+"""
+ShardWorker class
+-----
+"""
+class ShardWorker(object):
+    """
+    This class sorts one shard and trades key ranges with the other workers.
+
+    Attributes:
+        -coordinator (tuple): (host, port) of the coordinator
+        -shard (string): the data file on this host
+        -target (string): where this node's output partition goes
+        -sortArgs (dict): keyword arguments for Sorts.ExternSort, chunkSize among them
+        -host (string): address the other workers reach this one on
+        -tempDir (string): where the sorted shard and received ranges go, None for a
+                            fresh temp directory
+        -rank (int): the node number to ask for, None to take the next one that is free
+        -timeout (float): seconds any socket call may wait, and the ranges from the
+                            other nodes may take to come in once this one has sent its
+                            own, None to wait forever
+        -node (int): this worker's number, set once the coordinator hands it out
+        -stats (dict): bytes and seconds of the last run
+    """
+    #format for the file a range received from a node is written to
+    _range_file_naming_format = 'range_from{0}.dat'
+
+    def __init__(self, coordinator, shard, target, sortArgs = None, host = '127.0.0.1',
+                 tempDir = None, rank = None, timeout = _TIMEOUT):
+        sortArgs = dict(sortArgs or {})
+        sortArgs.setdefault('chunkSize', 209715200)
+        if sortArgs.get('duplicates', 'keep') == 'count':
+            raise ValueError('counted runs can not be cut by key range')
+
+        self.coordinator = coordinator
+        self.shard = os.path.abspath(shard)
+        self.target = os.path.abspath(target)
+        self.sortArgs = sortArgs
+        self.host = host
+        self.tempDir = tempDir
+        self.rank = rank
+        self.timeout = timeout
+        self.node = None
+        self.stats = None
+        self._received = None
+        self._receiveErrors = None
+
+        #the threads taking ranges in add to the stats at the same time
+        self._statsLock = threading.Lock()
+
+    def run(self):
+        """
+        This method runs this worker's part of the sort. A coordinator or peer that
+        does not answer within the timeout fails it with socket.timeout.
+
+        args:
+            -N/A
+
+        return:
+            -dict: this worker's stats, as sent to the coordinator
+        """
+        start = time.time()
+        workDir = self.tempDir or tempfile.mkdtemp(prefix='shard')
+        self.stats = {'shard': self.shard, 'target': self.target, 'sentBytes': 0,
+                      'receivedBytes': 0}
+
+        #peers send to this before we know who they are
+        self._dataServer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._dataServer.bind((self.host, 0))
+        self._dataServer.listen(16)
+        self._dataServer.settimeout(self.timeout)
+
+        control = socket.create_connection(self.coordinator, self.timeout)
+        try:
+            _send_json(control, {'type': 'hello', 'shard': self.shard, 'dataHost': self.host,
+                                 'dataPort': self._dataServer.getsockname()[1],
+                                 'rank': self.rank})
+            assign = _recv_json(control, 'assign')
+            self.node = assign['node']
+            peers = assign['peers']
+            receiver = self._start_receiving(workDir, len(peers) - 1)
+
+            sorter, sortedShard = self._sort_shard(workDir)
+            records = sorter.record_format()
+
+            _send_json(control, self._sample(records, sortedShard, assign['samples']))
+            splitters = _recv_json(control, 'splitters')['keys']
+            splitters = [_decode_key(key) for key in splitters]
+
+            #cut the sorted shard into one byte range per node
+            exchangeStart = time.time()
+            size = os.path.getsize(sortedShard)
+            cuts = [0] + records.find_bounds(sortedShard, splitters) + [size]
+            cuts += [size] * (len(peers) + 1 - len(cuts))
+
+            ownRange = os.path.join(workDir, ShardWorker._range_file_naming_format.format(self.node))
+            _copy_file_range(sortedShard, cuts[self.node], cuts[self.node + 1], ownRange)
+
+            #start with the next node so every node is not sent to at once by everyone
+            for step in range(1, len(peers)):
+                node = (self.node + step) % len(peers)
+                self._send_range(peers[node], sortedShard, cuts[node], cuts[node + 1])
+
+            receiver.join(self.timeout)
+            if receiver.is_alive():
+                raise socket.timeout('the ranges from the other nodes did not all come in '
+                                     'within {0} seconds'.format(self.timeout))
+            if self._receiveErrors:
+                raise self._receiveErrors[0]
+            self.stats['exchangeSeconds'] = time.time() - exchangeStart
+            os.remove(sortedShard)
+
+            mergeStart = time.time()
+            runs = [ownRange] + self._received
+            self._merge_ranges(records, runs)
+            for run in runs:
+                os.remove(run)
+            self.stats['mergeSeconds'] = time.time() - mergeStart
+
+            self.stats['outputBytes'] = os.path.getsize(self.target)
+            self.stats['seconds'] = time.time() - start
+            _send_json(control, {'type': 'done', 'node': self.node, 'stats': self.stats})
+            _recv_json(control, 'bye')
+        finally:
+            control.close()
+            self._dataServer.close()
+            if self.tempDir is None:
+                shutil.rmtree(workDir, ignore_errors=True)
+
+        return self.stats
+
+    def _sort_shard(self, workDir):
+        """
+        This method sorts the shard into a file in the work directory.
+
+        args:
+            -workDir (string): where the sorted shard and its temp files go
+
+        return:
+            -tuple: (Sorts.ExternSort, path of the sorted shard)
+        """
+        sortedShard = os.path.join(workDir, 'shard.sorted')
+        sorter = Sorts.ExternSort(self.shard, target=sortedShard, tempDir=workDir,
+                                  **self.sortArgs)
+        sorter.run_extern_sort()
+
+        self.stats['inputBytes'] = sorter.victimSize
+        self.stats['sortSeconds'] = sorter.endTime - sorter.startTime
+        return sorter, sortedShard
+
+    def _sample(self, records, sortedShard, count):
+        """
+        This method samples the sorted shard for the coordinator.
+
+        args:
+            -records (obj): the record format
+            -sortedShard (string): the sorted shard
+            -count (int): how many keys to take
+
+        return:
+            -dict: the samples message
+        """
+        size = os.path.getsize(sortedShard)
+        sample = records.sample_run(sortedShard, count) if size else []
+        weight = float(size) / len(sample) if sample else 0.0
+
+        return {'type': 'samples',
+                'keys': [_encode_key(records.record_key(record)) for record in sample],
+                'weights': [weight] * len(sample)}
+
+    def _start_receiving(self, workDir, senders):
+        """
+        This method starts a thread that takes a range from every other node.
+
+        args:
+            -workDir (string): where the ranges are written
+            -senders (int): how many nodes will send
+
+        return:
+            -threading.Thread: the thread, joined once every range is in
+        """
+        self._received = []
+        self._receiveErrors = []
+
+        def _accept_all():
+            handlers = []
+            try:
+                for _ in range(senders):
+                    conn, _ = self._dataServer.accept()
+                    conn.settimeout(self.timeout)
+                    handler = threading.Thread(target=self._receive_range, args=(conn, workDir))
+                    handler.daemon = True
+                    handler.start()
+                    handlers.append(handler)
+            except Exception as e:
+                self._receiveErrors.append(e)
+            for handler in handlers:
+                handler.join()
+        #END INNER DEF
+
+        receiver = threading.Thread(target=_accept_all)
+        receiver.daemon = True
+        receiver.start()
+        return receiver
+
+    def _receive_range(self, conn, workDir):
+        """
+        This method writes the range one node sends to a file. Errors are kept for run()
+        to raise.
+
+        args:
+            -conn (socket): the connection from the sending node
+            -workDir (string): where the range is written
+
+        return:
+            -N/A
+        """
+        try:
+            header = _recv_json(conn, 'range')
+            if not isinstance(header['node'], int):
+                raise ValueError('a range came from node {0!r}'.format(header['node']))
+            path = os.path.join(workDir, ShardWorker._range_file_naming_format.format(
+                header['node']))
+            kind, remaining = _recv_frame_header(conn)
+            if kind != _DATA:
+                raise ValueError('node {0} sent frame kind {1} instead of its range'.format(
+                    header['node'], kind))
+
+            with open(path, 'wb') as rangeFile:
+                while remaining:
+                    data = conn.recv(min(_IO_BLOCK, remaining))
+                    if not data:
+                        raise IOError('node {0} hung up part way through its range'.format(
+                            header['node']))
+                    rangeFile.write(data)
+                    remaining -= len(data)
+
+            with self._statsLock:
+                self._received.append(path)
+                self.stats['receivedBytes'] += os.path.getsize(path)
+        except Exception as e:
+            self._receiveErrors.append(e)
+        finally:
+            conn.close()
+
+    def _send_range(self, peer, sortedShard, start, end):
+        """
+        This method sends one byte range of the sorted shard to the node that owns it.
+
+        args:
+            -peer (list): [host, port] of the node's data socket
+            -sortedShard (string): the sorted shard
+            -start (int): offset of the range
+            -end (int): offset just past the range
+
+        return:
+            -N/A
+        """
+        conn = socket.create_connection(tuple(peer), self.timeout)
+        try:
+            _send_json(conn, {'type': 'range', 'node': self.node})
+            conn.sendall(_FRAME_HEADER.pack(_DATA, end - start))
+            _send_file_range(conn, sortedShard, start, end)
+            self.stats['sentBytes'] += end - start
+        finally:
+            conn.close()
+
+    def _merge_ranges(self, records, runs):
+        """
+        This method merges the ranges from every node into the output partition.
+
+        args:
+            -records (obj): the record format
+            -runs (list of strings): the range files
+
+        return:
+            -N/A
+        """
+        suture = self.sortArgs.get('suture', 'heap')
+        sPlan = FileMonsters.SUTURE_PLANS[suture]()
+        medic = FileMonsters.FileSurgeon(sPlan, records)
+        medic.start_stitching([run for run in runs if os.path.getsize(run)], self.target,
+                              _MERGE_BUFFER)
+
+
+"""
+Function(s)
+-----
+"""
+def run_local(shards, targets, sortArgs = None, host = '127.0.0.1', timeout = _TIMEOUT):
+    """
+    This function runs a sharded sort on one host: a coordinator in this process and a
+    worker process per shard, all talking over localhost TCP.
+
+    args:
+        -shards (list of strings): the data files, one per worker
+        -targets (list of strings): the output partitions, in node order
+        -sortArgs (dict): keyword arguments for Sorts.ExternSort
+        -host (string): address to use
+        -timeout (float): seconds any socket call may wait, None to wait forever
+
+    return:
+        -ShardCoordinator: the coordinator, with the workers' stats
+    """
+    if len(shards) != len(targets):
+        raise ValueError('every shard needs an output partition')
+
+    coordinator = ShardCoordinator(len(shards), host, timeout=timeout)
+    address = coordinator.listen()
+
+    #ranked so the partitions come out in the order of targets
+    workers = []
+    try:
+        for rank, (shard, target) in enumerate(zip(shards, targets)):
+            worker = multiprocessing.Process(target=_local_worker,
+                                             args=(address, shard, target, sortArgs, host, rank,
+                                                   timeout))
+            worker.start()
+            workers.append(worker)
+
+        coordinator.run()
+    finally:
+        for worker in workers:
+            worker.join()
+
+    failed = [worker.exitcode for worker in workers if worker.exitcode]
+    if failed:
+        raise RuntimeError('{0} shard workers failed'.format(len(failed)))
+    return coordinator
+
+
+def _local_worker(coordinator, shard, target, sortArgs, host, rank, timeout):
+    """
+    This helper function runs one ShardWorker in a child process for run_local().
+
+    args:
+        -coordinator (tuple): (host, port) of the coordinator
+        -shard (string): the data file
+        -target (string): the output partition
+        -sortArgs (dict): keyword arguments for Sorts.ExternSort
+        -host (string): address to use
+        -rank (int): the node number to ask for
+        -timeout (float): seconds any socket call may wait
+
+    return:
+        -N/A
+    """
+    ShardWorker(coordinator, shard, target, sortArgs, host, rank=rank, timeout=timeout).run()
+
+
+def _encode_key(key):
+    """
+    This helper function makes a record key safe for JSON. Byte strings are tagged so
+    they come back as bytes, and compare the same way.
+
+    args:
+        -key (obj): the key from record_key()
+
+    return:
+        -obj: the key as JSON can hold it
+    """
+    if isinstance(key, bytes) and not isinstance(key, str):
+        return {'bytes': key.decode('latin-1')}
+    return key
+
+
+def _decode_key(key):
+    """
+    This helper function undoes _encode_key().
+
+    args:
+        -key (obj): the key as sent
+
+    return:
+        -obj: the key
+    """
+    if isinstance(key, dict):
+        return key['bytes'].encode('latin-1')
+    return key
+
+
+def _send_json(sock, message):
+    """
+    This helper function sends a control message.
+
+    args:
+        -sock (socket): the connection
+        -message (dict): the message
+
+    return:
+        -N/A
+    """
+    _send_frame(sock, _JSON, json.dumps(message).encode('utf-8'))
+
+
+def _recv_json(sock, kind):
+    """
+    This helper function receives a control message and checks it is the one the
+    protocol expects next, with every field that kind of message has.
+
+    args:
+        -sock (socket): the connection
+        -kind (string): the message type expected, a key of _MESSAGE_FIELDS
+
+    return:
+        -dict: the message
+    """
+    frameKind, length = _recv_frame_header(sock)
+    if frameKind != _JSON:
+        raise IOError('expected a control message, got frame kind {0}'.format(frameKind))
+    message = json.loads(_recv_exact(sock, length).decode('utf-8'))
+
+    if not isinstance(message, dict) or message.get('type') != kind:
+        raise ValueError('expected a {0} message, got {1!r}'.format(
+            kind, message.get('type') if isinstance(message, dict) else message))
+    missing = [field for field in _MESSAGE_FIELDS[kind] if field not in message]
+    if missing:
+        raise ValueError('{0} message is missing {1}'.format(kind, ', '.join(missing)))
+    return message
+
+
+def _send_frame(sock, kind, payload):
+    """
+    This helper function sends a frame.
+
+    args:
+        -sock (socket): the connection
+        -kind (int): the frame kind
+        -payload (bytes): the payload
+
+    return:
+        -N/A
+    """
+    sock.sendall(_FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_frame_header(sock):
+    """
+    This helper function receives a frame header.
+
+    args:
+        -sock (socket): the connection
+
+    return:
+        -tuple: (kind, payload bytes)
+    """
+    return _FRAME_HEADER.unpack(_recv_exact(sock, _FRAME_HEADER.size))
+
+
+def _recv_exact(sock, count):
+    """
+    This helper function receives exactly 'count' bytes.
+
+    args:
+        -sock (socket): the connection
+        -count (int): how many bytes
+
+    return:
+        -bytes: the data
+    """
+    parts = []
+    while count:
+        data = sock.recv(min(_IO_BLOCK, count))
+        if not data:
+            raise IOError('connection closed with {0} bytes still to come'.format(count))
+        parts.append(data)
+        count -= len(data)
+    return b''.join(parts)
+
+
+def _send_file_range(sock, path, start, end):
+    """
+    This helper function sends part of a file down a socket, in the kernel with
+    socket.sendfile where there is one. Unlike os.sendfile it waits out the socket's
+    timeout instead of failing on a socket that is not ready.
+
+    args:
+        -sock (socket): the connection
+        -path (string): the file
+        -start (int): offset to send from
+        -end (int): offset to send up to
+
+    return:
+        -N/A
+    """
+    sendfile = getattr(sock, 'sendfile', None)
+    with open(path, 'rb') as source:
+        offset = start
+        if sendfile is not None and end > start:
+            #it copies the slow way itself where the kernel can not
+            offset += sendfile(source, start, end - start)
+
+        source.seek(offset)
+        while offset < end:
+            data = source.read(min(_IO_BLOCK, end - offset))
+            if not data:
+                raise IOError('{0} ended before offset {1}'.format(path, end))
+            sock.sendall(data)
+            offset += len(data)
+
+
+def _copy_file_range(path, start, end, targetPath):
+    """
+    This helper function copies part of a file to a new file.
+
+    args:
+        -path (string): the file
+        -start (int): offset to copy from
+        -end (int): offset to copy up to
+        -targetPath (string): the new file
+
+    return:
+        -N/A
+    """
+    with open(path, 'rb') as source, open(targetPath, 'wb') as target:
+        source.seek(start)
+        remaining = end - start
+        while remaining:
+            data = source.read(min(_IO_BLOCK, remaining))
+            if not data:
+                break
+            target.write(data)
+            remaining -= len(data)
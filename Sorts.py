@@ -9,16 +9,75 @@ Contains:
 ---------
     Functions:
         +qsort_inplace(l, s, e = None)
+        +get_sort_engine(name, countOps = False)
         -_partition(l, s, e)
+        -_pick_pivot(l, s, e)
+        -_median_of_three(l, a, b, c)
+        -_insertion_sort(l, s, e)
+        -_heapsort(l, s, e)
+        -_lsd_radix(items, keyBits, lowBit = 0)
+        -_as_bytes(text)
+        -_as_str(data)
 
     Class:
+        -QuickSortEngine(countOps = False)
+            +sort_lines(self, lines)
+            +sort_uint32(self, values)
+            +sort_keyed(self, keys, records)
+            -_counted_sort(self, items)
+
+        -_Counted(value, counts)
+        -_CountingList(items, counts)
+
+        -NumpySortEngine()
+            +sort_lines(self, lines)
+            +sort_uint32(self, values)
+            +sort_keyed(self, keys, records)
+            -_sort_fixed_width(self, lines)
+
+        -RadixSortEngine()
+            +sort_lines(self, lines)
+            +sort_uint32(self, values)
+            +sort_keyed(self, keys, records)
+            -_fixed_width_keys(self, lines)
+
+        -SortMetrics()
+            +start(self)
+            +stop(self)
+            +phase(self, name)
+            +add_chunks(self, chunkStats)
+            +add_metrics(self, other)
+            +to_dict(self)
+
         -ExternSort()
-            +__init__(self, chunkSize, victim)
+            +__init__(self, victim, chunkSize, suture = 'heap', workers = 1, records = 'text',
+                      engine = 'qsort', fanIn = None, runMode = 'chunk', readAhead = 0,
+                      writeBehind = 0, countOps = False, memory = None, encoding = 'none',
+                      resume = False, target = None, key = 'line', keyWidth = 8,
+                      duplicates = 'keep', mergeWorkers = 1, tempDir = None, adaptive = True,
+                      linkSorted = False, top = None, largest = False, keyRange = None,
+                      indexEvery = 0)
             +run_extern_sort(self)
+            +sorted_records(self)
+            +record_format(self)
+            +get_stats(self)
             +get_timeing_info(self
+            -_start_metrics(self)
+            -_victim_in_order(self)
+            -_copy_victim(self)
+            -_index_victim(self)
+            -_output_index(self, records)
+            -_selected_records(self)
+            -_selection(self, records)
+            -_sort_spilled(self, victim)
+            -_split_and_plan(self, targetFile)
+            -_finish(self, mutilator, medic, journal, outputBytes)
+            -_distinct_report(self)
+            -_plan_memory(self, records, engine)
             -_setup_tools(self)
             -_set_chunkCount(self)
-            -_set_needleSize(self)
+            -_open_journal(self)
+            -_plan_merge(self, journal, patients, mergeMemory, runOverhead, targetFile)
 
 ----------
 CHANGE LOG
@@ -27,21 +86,103 @@ CHANGE LOG
                     Sorts.py. Also improved qsort_inplace() with a wrapper function.
                  this file will now serve as a main.
     -08/05/17 - Finished external sort, and added more documentation
+    -10/17/26 - ExternSort takes the name of the merge strategy to hand to FileSurgeon.
+    -10/17/26 - ExternSort takes a worker count for sorting chunks in parallel.
+    -10/17/26 - ExternSort takes the record format so binary uint32 files can be sorted.
+    -10/17/26 - Added sort engines. NumpySortEngine parses a chunk into an int array, sorts
+                    it vectorized and formats it back in bulk. qsort is the fallback.
+    -10/17/26 - The merge follows a FileMonsters.MergePlanner plan instead of one merge with
+                    chunkSize / (chunkCount + 1) byte buffers. Added the fanIn cap.
+    -10/17/26 - ExternSort takes the run mode and reports the average run length.
+    -10/17/26 - Rewrote qsort_inplace as an introsort: explicit stack, median-of-three and
+                    ninther pivots, three way partitioning, insertion sort for small ranges
+                    and a heapsort fallback. Sorted input no longer hits the recursion limit.
+    -10/17/26 - Added RadixSortEngine, an LSD radix sort for fixed width numeric keys that
+                    falls back to qsort for anything else.
+    -10/17/26 - ExternSort takes read-ahead and write-behind depths for the merge and
+                    reports how much I/O they overlapped.
+    -10/17/26 - ExternSort times the split, merge and cleanup phases, counts temp file bytes
+                    and hands them out as a dict from get_stats().
+    -10/17/26 - Added SortMetrics. ExternSort keeps its numbers there: read, sort and write
+                    seconds per chunk, phase times, bytes read and written and, with countOps,
+                    the comparisons and moves qsort made. The clock starts with the run now,
+                    not when the object is made.
+    -10/17/26 - ExternSort takes a memory budget. A FileMonsters.MemoryPlanner picks the
+                    chunk size, fan-in and merge block size from it and a MemoryGuard cuts
+                    the chunk size if the split goes over it.
+    -10/17/26 - ExternSort takes a run encoding from FileMonsters.RUN_ENCODINGS for the
+                    chunk and intermediate merge files and reports how well it compressed.
+    -10/17/26 - ExternSort keeps a FileMonsters.SortJournal next to the output while it
+                    runs. With resume it carries on from the journal an earlier try left.
+    -10/17/26 - ExternSort sorts open files and other iterables as well as file names, takes
+                    a target for the output, and sorted_records() streams the last merge to
+                    the caller instead of writing it. Streams get no journal.
+    -10/17/26 - Added sort_keyed() to the sort engines. ExternSort takes a key type so text
+                    is sorted by int, float or prefix keys parsed once per line.
+    -10/17/26 - ExternSort takes a duplicate mode to keep one of each record, or one with
+                    its count, and reports how many distinct records the chunks held.
+    -10/17/26 - ExternSort takes mergeWorkers to merge key ranges in parallel processes.
+    -10/17/26 - ExternSort takes a tempDir for its chunk and merge files.
+    -10/17/26 - ExternSort is adaptive by default: a victim that is already in order is
+                    copied, or hard linked with linkSorted, instead of sorted, and the
+                    chunk splitter skips sorting chunks that are in order.
+    -10/17/26 - ExternSort takes top/largest and keyRange to give only the smallest or
+                    largest records or a key range, picked out in one pass over the victim.
+                    They are only sorted through chunk files when they do not fit in a chunk.
+    -10/17/26 - ExternSort takes indexEvery to have the last merge write a
+                    FileMonsters.SparseIndex next to the output file.
+    -10/17/26 - The MemoryGuard also sizes every chunk before it is read, the merge plan
+                    after the split and every merge's buffers, so the budget holds through
+                    the split and the merge.
+                    RadixSortEngine gives the size of its bucket table as workingBytes.
+    -10/17/26 - With a memory budget the sizes are planned before checking if the victim
+                    is in order, and the check reads no block bigger than a chunk.
+    -10/17/26 - Every engine's sort_keyed() is stable: qsort sorts (key, index) pairs
+                    instead of (key, record) pairs. Keyed sorts plan stable merges.
+    -10/17/26 - RadixSortEngine only takes ASCII digit lines as fixed width numbers.
+    -10/17/26 - The duplicates report says its count is of distinct records within chunks.
+    -10/17/26 - top and keyRange keep to the memory budget: the chunks and what the
+                    selection holds are planned together.
+    -10/17/26 - A memory budget counts every split worker process and drops the ones
+                    it does not fit.
+    -10/17/26 - _lsd_radix() lets go of each bucket table before building the next.
+    -10/17/26 - A memory budget counts every merge worker process and drops the ones it
+                    does not fit.
 """
+import contextlib
+import itertools
+import logging
+import array
 import time
 import sys
 import os
+import shutil
 
 import FileMonsters
 
+#numpy is optional, without it the numpy engine falls back to qsort
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#ranges this small are insertion sorted
+_INSERTION_CUTOFF = 16
+
+#ranges this big get a ninther pivot instead of median of three
+_NINTHER_CUTOFF = 40
+
 """
 Sorting Functions
 -----
 """
 def qsort_inplace(l, s, e = None):
     """
-    This method provides a wrapper for _qsort_inplace to allow for
-    getting the end value if it is not provided and to handle error checking.
+    This method provides an in-place introsort: quicksort with an explicit stack,
+    median-of-three (ninther for big ranges) pivots and three way partitioning so runs
+    of duplicates are done in one pass. Small ranges finish with insertion sort and a
+    range that partitions badly too many times is heapsorted, so the worst case is
+    O(n log n) and sorted or reversed input is no longer quadratic.
 
      args:
             -l (lst): the list of numbers to sort
@@ -56,43 +197,41 @@ def qsort_inplace(l, s, e = None):
     assert isinstance(s, int), 'qsort s takes an int'
 
     #get the e value if not proviided.
-    if not e:
+    if e is None:
         e = len(l) - 1
     else:
         assert isinstance(e, int), 'qsort e takes an int'
 
-    def _qsort_inplace(l, s, e):
-        """
-        This helper function provides a simple implementation of
-        an in-place quicksort for integers.
+    if e - s < 1:
+        return
 
-        args:
-            -l (lst): the list of numbers to sort
-            -s (int): position of the first element
-            -e (int): position of the last element
+    #about 2 log2(n) bad partitions before giving up on quicksort
+    stack = [(s, e, 2 * (e - s + 1).bit_length())]
 
-        return:
-            -N/A
-        """
-        #recursion check
-        if s >= e:
-            return
+    while stack:
+        s, e, depth = stack.pop()
 
-        #get the partition
-        p = _partition(l, s, e)
+        while e - s >= _INSERTION_CUTOFF and depth > 0:
+            depth -= 1
+            lt, gt = _partition(l, s, e)
 
-        #qsort
-        _qsort_inplace(l, s, p - 1)
-        _qsort_inplace(l, p + 1, e)
-        return
-    #END INNER DEF
+            #keep the smaller side for the loop so the stack stays O(log n)
+            if lt - s < e - gt:
+                stack.append((gt + 1, e, depth))
+                e = lt - 1
+            else:
+                stack.append((s, lt - 1, depth))
+                s = gt + 1
 
-    _qsort_inplace(l, s, e)
+        if e - s >= _INSERTION_CUTOFF:
+            _heapsort(l, s, e)
+        else:
+            _insertion_sort(l, s, e)
 
 
 def _partition(l, s, e):
     """
-    This helper function does the partition part of quicksort.
+    This helper function does the three way (Dutch flag) partition part of quicksort.
     For use in qsort_inplace()
 
     args:
@@ -101,136 +240,1553 @@ def _partition(l, s, e):
         -e (int): position of the last element
 
     return:
-        -p (int): the partition index
+        -tuple: (lt, gt) where l[s:lt] < pivot, l[lt:gt + 1] == pivot and
+                l[gt + 1:e + 1] > pivot
     """
-    #make partition
-    p = s
-    for i in xrange(s + 1, e + 1):
-        if l[i] <= l[s]:
-            #increment pivot
-            p += 1
+    pivot = l[_pick_pivot(l, s, e)]
 
+    lt = s
+    i = s
+    gt = e
+    while i <= gt:
+        value = l[i]
+        if value < pivot:
             #exchange values
-            l[i], l[p] = l[p], l[i]
+            l[lt], l[i] = value, l[lt]
+            lt += 1
+            i += 1
+        elif pivot < value:
+            #exchange values
+            l[gt], l[i] = value, l[gt]
+            gt -= 1
+        else:
+            i += 1
+
+    return lt, gt
+
+
+def _pick_pivot(l, s, e):
+    """
+    This helper function picks the pivot index, median of three for small ranges
+    and Tukey's ninther (median of three medians) for big ones.
+
+    args:
+        -l (lst): the list of numbers to sort
+        -s (int): position of the first element
+        -e (int): position of the last element
+
+    return:
+        -int: the index of the pivot
+    """
+    m = s + (e - s) // 2
+    if e - s < _NINTHER_CUTOFF:
+        return _median_of_three(l, s, m, e)
+
+    step = (e - s) // 8
+    return _median_of_three(l,
+                            _median_of_three(l, s, s + step, s + 2 * step),
+                            _median_of_three(l, m - step, m, m + step),
+                            _median_of_three(l, e - 2 * step, e - step, e))
+
+
+def _median_of_three(l, a, b, c):
+    """
+    This helper function finds which of three indexes holds the middle value.
+
+    args:
+        -l (lst): the list
+        -a, b, c (int): the indexes to look at
+
+    return:
+        -int: the index of the median
+    """
+    if l[a] < l[b]:
+        if l[b] < l[c]:
+            return b
+        return c if l[a] < l[c] else a
+
+    if l[a] < l[c]:
+        return a
+    return c if l[b] < l[c] else b
+
+
+def _insertion_sort(l, s, e):
+    """
+    This helper function insertion sorts a small range in-place.
+
+    args:
+        -l (lst): the list of numbers to sort
+        -s (int): position of the first element
+        -e (int): position of the last element
+
+    return:
+        -N/A
+    """
+    for i in range(s + 1, e + 1):
+        value = l[i]
+        j = i - 1
+        while j >= s and value < l[j]:
+            l[j + 1] = l[j]
+            j -= 1
+        l[j + 1] = value
+
+
+def _heapsort(l, s, e):
+    """
+    This helper function heapsorts a range in-place. It is the fallback when
+    quicksort keeps picking bad pivots.
+
+    args:
+        -l (lst): the list of numbers to sort
+        -s (int): position of the first element
+        -e (int): position of the last element
+
+    return:
+        -N/A
+    """
+    n = e - s + 1
 
-    #exchange values
-    l[p], l[s] = l[s], l[p]
+    def _sift_down(root, end):
+        #heap positions are relative to s
+        value = l[s + root]
+        child = 2 * root + 1
+        while child < end:
+            if child + 1 < end and l[s + child] < l[s + child + 1]:
+                child += 1
+            if not value < l[s + child]:
+                break
+            l[s + root] = l[s + child]
+            root = child
+            child = 2 * root + 1
+        l[s + root] = value
+    #END INNER DEF
 
-    #return back partition index
-    return p
+    #build a max heap
+    for root in range(n // 2 - 1, -1, -1):
+        _sift_down(root, n)
 
+    #move the max to the end and shrink the heap
+    for end in range(n - 1, 0, -1):
+        l[s], l[s + end] = l[s + end], l[s]
+        _sift_down(0, end)
 
 
 """
-ExternSort class
+Sort Engines
 -----
 """
-class ExternSort(object):
+class QuickSortEngine(object):
     """
-    The purpose of this class is to provide a simple way to
-    run an external sort on on a large data file.
+    This class sorts chunks with the pure python qsort_inplace.
 
     Attributes:
-        -chunkSize (int): The size of chunk files in bytes
-        -chunkCount (int): The number of chunk files that will be needed
-        -needleSize (int): The buffer size in bytes
-        -victim (path): The file to sort
-        -victimSize (int): Size of the victim file in bytes
-        -startTime (time): The time the object was created
-        -endTime (time): The time the sort finished
+        -countOps (bool): count comparisons and moves, it makes the sort a few times slower
+        -lastCounts (dict): comparisons and moves of the last sort, None when not counting
+        -workingFactor (dict): extra memory a sort needs as a multiple of the chunk, by
+                                record format, for when it can not be measured
     """
-    def __init__(self, victim, chunkSize):
-        self.chunkSize = chunkSize
-        self.victim = victim
-        self.victimSize = None
-        self.chunkCount = None
-        self.targetFile = self.victim + '.sorted.out'
-        self.startTime = time.time()
-        self.endTime = None
+    name = 'qsort'
 
-    def run_extern_sort(self):
+    #text sorts in place; binary goes through a list of int objects
+    workingFactor = {'text': 0.1, 'binary': 12.0}
+
+    def __init__(self, countOps = False):
+        self.countOps = countOps
+        self.lastCounts = None
+
+    def sort_lines(self, lines):
         """
-        This function runs the external sort by using the FileMutilator
-        class to split up target data file into sorted chunk files.
+        This method sorts a chunk of text lines in-place.
 
-        It then uses the FileSurgeon class to merge the sorted chunk files
-        into a sorted version of the original file.
+        args:
+            -lines (list): the lines
+
+        return:
+            -list: the same list, sorted
+        """
+        if self.countOps:
+            lines[:] = self._counted_sort(lines)
+            return lines
+
+        qsort_inplace(lines, 0, len(lines) - 1)
+        return lines
+
+    def sort_uint32(self, values):
+        """
+        This method sorts a chunk of uint32s.
 
         args:
-            -N/A
+            -values (array): the records
 
         return:
-            -N/A
+            -array: the records, sorted
         """
-        #get start time for logging.
-        #get how many chunk files we need and the text buffer size for writing
-        self._setup_tools()
+        l = values.tolist()
+        if self.countOps:
+            return array.array(values.typecode, self._counted_sort(l))
 
-        #set up the file splitter
-        mutilator = FileMonsters.FileMutilator(self.victim, self.chunkSize)
-        
-        print('splitting')
-        #split and quicksort chunk files
-        mutilator.commit_mutilation()
+        qsort_inplace(l, 0, len(l) - 1)
+        return array.array(values.typecode, l)
 
-        #prepare medic to merge chunk files
-        medic = FileMonsters.FileSurgeon(FileMonsters.FileSuture())
+    def sort_keyed(self, keys, records):
+        """
+        This method sorts a chunk of records by keys parsed from them. The (key, index)
+        pairs are sorted, so equal keys keep their input order like sort -s -k.
 
-        #get the chunk files to be merged
-        patients = mutilator.get_chunks_list()
-        
-        print('starting to merge back')
-        #merge the chunk files
-        medic.start_stitching(patients, self.targetFile, self.needleSize)
+        args:
+            -keys (array or list): the key of each record
+            -records (list): the records
 
-        #delete all the used chunk files
-        mutilator.hide_remains()
+        return:
+            -list: the records, sorted by key
+        """
+        pairs = list(zip(keys, range(len(records))))
+        if self.countOps:
+            pairs = self._counted_sort(pairs)
+        else:
+            qsort_inplace(pairs, 0, len(pairs) - 1)
 
-        #set endTime for logging later
-        self.endTime = time.time()
+        return [records[i] for _, i in pairs]
 
-    def _setup_tools(self):
+    def _counted_sort(self, items):
         """
-        This method calls the two private methods _set_chunkCount(self) and
-        _set_needleSize(self) to pass to the methods needed.
+        This method sorts a copy of the items with every item wrapped so qsort_inplace's
+        comparisons and list writes are counted. A swap is two moves.
 
         args:
-            -N/A
+            -items (list): the items
 
         return:
-            -N/A
+            -list: the items, sorted
         """
-        #get the number of chunks files
-        self._set_chunkCount()
+        counts = [0, 0]
+        wrapped = _CountingList([_Counted(item, counts) for item in items], counts)
+        qsort_inplace(wrapped, 0, len(wrapped) - 1)
 
-        #get the size of buffers
-        self._set_needleSize()
+        self.lastCounts = {'comparisons': counts[0], 'moves': counts[1]}
+        return [item.value for item in wrapped]
 
-    def _set_chunkCount(self):
+
+class _Counted(object):
+    """
+    This class wraps a value and counts every < it takes part in.
+
+    Attributes:
+        -value (obj): the wrapped value
+        -counts (list): [comparisons, moves], shared by every wrapped item of a sort
+    """
+    __slots__ = ('value', 'counts')
+
+    def __init__(self, value, counts):
+        self.value = value
+        self.counts = counts
+
+    def __lt__(self, other):
+        self.counts[0] += 1
+        return self.value < other.value
+
+
+class _CountingList(list):
+    """
+    This class is a list that counts item assignments.
+
+    Attributes:
+        -counts (list): [comparisons, moves], shared with the items
+    """
+    def __init__(self, items, counts):
+        list.__init__(self, items)
+        self.counts = counts
+
+    def __setitem__(self, index, value):
+        self.counts[1] += 1
+        list.__setitem__(self, index, value)
+
+
+class NumpySortEngine(object):
+    """
+    This class sorts chunks with numpy. Zero padded numeric lines, like dgen.py makes,
+    are parsed into an int64 array digit column by digit column, sorted and
+    formatted back as one block. Any other text is sorted as a numpy string array.
+
+    Attributes:
+        -workingFactor (dict): extra memory a sort needs as a multiple of the chunk, by
+                                record format, for when it can not be measured
+    """
+    name = 'numpy'
+
+    #text is joined, parsed to int64 and formatted back; binary is copied twice
+    workingFactor = {'text': 1.5, 'binary': 3.0}
+    lastCounts = None
+
+    def sort_lines(self, lines):
         """
-        This method calculates the number of chunk files that will be needed
-        and stores the value.
+        This method sorts a chunk of text lines.
 
         args:
-            -N/A
+            -lines (list): the lines
 
         return:
-            -N/A
+            -list: the lines, sorted
         """
-        self.victimSize = os.stat(self.victim).st_size
-        self.chunkCount = (self.victimSize / self.chunkSize) + 1
+        if not lines:
+            return lines
+
+        ordered = self._sort_fixed_width(lines)
+        if ordered is not None:
+            return ordered
 
-    def _set_needleSize(self):
+        #anything else still sorts vectorized, as strings
+        return numpy.sort(numpy.array(lines)).tolist()
+
+    def _sort_fixed_width(self, lines):
         """
-        This method calculates the size to use for text buffers.
+        This method sorts lines that are all the same number of digits plus a newline.
 
         args:
-            -N/A
+            -lines (list): the lines
 
         return:
-            -N/A
+            -list: the lines sorted, or None if they are not fixed width digits
+        """
+        width = len(lines[0])
+
+        #int64 holds 18 digits without overflow
+        if width < 2 or width > 19:
+            return None
+
+        raw = numpy.frombuffer(_as_bytes(''.join(lines)), dtype=numpy.uint8)
+        if len(raw) != width * len(lines):
+            return None
+
+        #every row has to end in a newline and be digits otherwise
+        raw = raw.reshape(-1, width)
+        digits = raw[:, :-1]
+        if not (raw[:, -1] == 10).all() or not ((digits >= 48) & (digits <= 57)).all():
+            return None
+
+        powers = 10 ** numpy.arange(width - 2, -1, -1, dtype=numpy.int64)
+        keys = (digits - 48).astype(numpy.int64).dot(powers)
+        keys.sort()
+
+        #format back in one go: one digit per column and a newline on the end
+        out = numpy.empty((len(keys), width), dtype=numpy.uint8)
+        out[:, :-1] = (keys[:, None] // powers) % 10 + 48
+        out[:, -1] = 10
+
+        return _as_str(out.tobytes()).splitlines(True)
+
+    def sort_uint32(self, values):
+        """
+        This method sorts a chunk of uint32s.
+
+        args:
+            -values (array): the records
+
+        return:
+            -array: the records, sorted
+        """
+        ordered = numpy.sort(numpy.frombuffer(values, dtype=numpy.uint32))
+        return array.array(values.typecode, ordered.tobytes())
+
+    def sort_keyed(self, keys, records):
+        """
+        This method sorts a chunk of records by keys parsed from them with a stable
+        argsort of the keys, so equal keys keep their input order.
+
+        args:
+            -keys (array or list): the key of each record
+            -records (list): the records
+
+        return:
+            -list: the records, sorted by key
+        """
+        if not records:
+            return records
+
+        order = numpy.argsort(numpy.asarray(keys), kind='stable')
+        return [records[i] for i in order.tolist()]
+
+
+class RadixSortEngine(object):
+    """
+    This class sorts chunks with an LSD radix sort, which is linear in the number of
+    records. Text chunks qualify when every line is the same number of digits plus a
+    newline, like dgen.py makes; each line is parsed to an int once and the lines are
+    bucketed by that key. Binary chunks are always uint32s. Anything else is handed
+    to qsort.
+
+    Attributes:
+        -workingFactor (dict): extra memory a sort needs as a multiple of the chunk, by
+                                record format, for when it can not be measured
+        -workingBytes (int): extra memory a sort needs however many records there are
+    """
+    name = 'radix'
+
+    #an int key, a packed int and a bucket slot per record
+    workingFactor = {'text': 1.8, 'binary': 25.0}
+
+    #chunks of 65536 records or more are bucketed by 16 bit digits, a list for each
+    workingBytes = (1 << 16) * (8 + sys.getsizeof([0] * 8))
+    lastCounts = None
+
+    def sort_lines(self, lines):
+        """
+        This method sorts a chunk of text lines.
+
+        args:
+            -lines (list): the lines
+
+        return:
+            -list: the lines, sorted
+        """
+        keys = self._fixed_width_keys(lines)
+        if keys is None:
+            return QuickSortEngine().sort_lines(lines)
+
+        #pack each key above its line number so the sort only moves ints
+        indexBits = len(lines).bit_length()
+        indexMask = (1 << indexBits) - 1
+        packed = [(key << indexBits) | i for i, key in enumerate(keys)]
+
+        packed = _lsd_radix(packed, max(keys).bit_length(), indexBits)
+        return [lines[item & indexMask] for item in packed]
+
+    def _fixed_width_keys(self, lines):
+        """
+        This method parses fixed width digit lines into int keys. With every line the
+        same width and zero padded, int order is the same as string order.
+
+        args:
+            -lines (list): the lines
+
+        return:
+            -list: the keys, or None if the lines are not fixed width digits
+        """
+        if not lines:
+            return None
+
+        width = len(lines[0])
+        if width < 2:
+            return None
+
+        joined = ''.join(lines)
+        if len(joined) != width * len(lines) or joined.count('\n') != len(lines):
+            return None
+
+        #every newline is on the end of a line, the rest has to be ASCII digits. isdigit()
+        #takes other scripts' digits too, and int() would parse them out of string order
+        if joined.strip('0123456789\n'):
+            return None
+
+        return [int(line) for line in lines]
+
+    def sort_uint32(self, values):
+        """
+        This method sorts a chunk of uint32s by 16 bit digits.
+
+        args:
+            -values (array): the records
+
+        return:
+            -array: the records, sorted
+        """
+        if not values:
+            return values
+
+        return array.array(values.typecode, _lsd_radix(values.tolist(), 32))
+
+    def sort_keyed(self, keys, records):
+        """
+        This method sorts a chunk of records by int keys parsed from them. The keys are
+        shifted to start at 0 and packed above the record index like sort_lines() does,
+        so equal keys keep their input order. Float and prefix keys go to qsort.
+
+        args:
+            -keys (array or list): the key of each record
+            -records (list): the records
+
+        return:
+            -list: the records, sorted by key
         """
-        self.needleSize = self.chunkSize / (self.chunkCount + 1)
+        if not records or getattr(keys, 'typecode', None) != 'q':
+            return QuickSortEngine().sort_keyed(keys, records)
+
+        low = min(keys)
+        indexBits = len(records).bit_length()
+        indexMask = (1 << indexBits) - 1
+        packed = [((key - low) << indexBits) | i for i, key in enumerate(keys)]
+
+        packed = _lsd_radix(packed, (max(keys) - low).bit_length(), indexBits)
+        return [records[item & indexMask] for item in packed]
+
+
+#sort engines by name
+SORT_ENGINES = {
+    'qsort': QuickSortEngine,
+    'numpy': NumpySortEngine,
+    'radix': RadixSortEngine,
+}
+
+
+def get_sort_engine(name, countOps = False):
+    """
+    This function builds a sort engine by name, falling back to qsort when
+    numpy is asked for but is not installed.
+
+    args:
+        -name (string): a key of SORT_ENGINES
+        -countOps (bool): count comparisons and moves, only the qsort engine can
+
+    return:
+        -obj: the sort engine
+    """
+    assert name in SORT_ENGINES, 'unknown sort engine {0}'.format(name)
+
+    if name == 'numpy' and numpy is None:
+        logging.warning('numpy is not installed, sorting chunks with qsort instead')
+        name = 'qsort'
+
+    if name == 'qsort':
+        return QuickSortEngine(countOps)
+
+    if countOps:
+        logging.warning('the {0} engine does not count comparisons or moves'.format(name))
+    return SORT_ENGINES[name]()
+
+
+def _lsd_radix(items, keyBits, lowBit = 0):
+    """
+    This helper function does a stable least significant digit first radix sort of
+    non-negative ints. Digits are 16 bits, or 8 bits when there are too few items to
+    fill 65536 buckets.
+
+    args:
+        -items (list): the ints to sort
+        -keyBits (int): bits in the biggest key
+        -lowBit (int): bits below the key to ignore, they keep their input order
+
+    return:
+        -list: the items, sorted
+    """
+    digitBits = 16 if len(items) >= 65536 else 8
+    mask = (1 << digitBits) - 1
+
+    for shift in range(lowBit, lowBit + max(keyBits, 1), digitBits):
+        buckets = [[] for _ in range(mask + 1)]
+        for item in items:
+            buckets[(item >> shift) & mask].append(item)
+
+        items = [item for bucket in buckets for item in bucket]
+
+        #let go of the table before the next pass builds one, workingBytes is one table
+        buckets = None
+
+    return items
+
+
+def _as_bytes(text):
+    """
+    This helper function gets the raw bytes of a str on python 2 and 3.
+
+    args:
+        -text (string): the text
+
+    return:
+        -bytes: the encoded text
+    """
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+
+def _as_str(data):
+    """
+    This helper function turns ascii bytes back into a str on python 2 and 3.
+
+    args:
+        -data (bytes): the raw bytes
+
+    return:
+        -string: the text
+    """
+    if isinstance(data, str):
+        return data
+    return data.decode('ascii')
+
+
+"""
+SortMetrics class
+-----
+"""
+class SortMetrics(object):
+    """
+    The purpose of this class is to collect the numbers from one run of ExternSort.
+
+    Attributes:
+        -startTime (time): when the run started
+        -endTime (time): when the run finished
+        -phases (dict): seconds per phase. split, merge and cleanup are wall time; read,
+                        sort and write are summed over the chunks, so with workers they
+                        can add up to more than split
+        -chunks (list): one dict per chunk file from FileMonsters.FileMutilator.chunkStats
+        -bytesRead (int): input plus temp file bytes read
+        -bytesWritten (int): temp file plus output bytes written
+        -tempBytes (int): bytes written to temp files, the same is read back
+    """
+    def __init__(self):
+        self.startTime = None
+        self.endTime = None
+        self.phases = {}
+        self.chunks = []
+        self.bytesRead = 0
+        self.bytesWritten = 0
+        self.tempBytes = 0
+
+    def start(self):
+        """
+        This method starts the clock.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        self.startTime = time.time()
+
+    def stop(self):
+        """
+        This method stops the clock.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        self.endTime = time.time()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        This method times the body of a with block as a phase.
+
+        args:
+            -name (string): the phase
+
+        return:
+            -context manager
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.time() - start
+
+    def add_chunks(self, chunkStats):
+        """
+        This method takes the per chunk stats and sums them into the read, sort and
+        write phases.
+
+        args:
+            -chunkStats (list): dicts from FileMonsters.FileMutilator.chunkStats
+
+        return:
+            -N/A
+        """
+        self.chunks.extend(chunkStats)
+        for key, name in (('readSeconds', 'read'), ('sortSeconds', 'sort'),
+                          ('writeSeconds', 'write')):
+            self.phases[name] = self.phases.get(name, 0.0) + sum(chunk.get(key, 0.0)
+                                                                 for chunk in chunkStats)
+
+    def add_metrics(self, other):
+        """
+        This method adds in the numbers of a sort run as part of this one.
+
+        args:
+            -other (SortMetrics): the other run's numbers
+
+        return:
+            -N/A
+        """
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.chunks.extend(other.chunks)
+        self.tempBytes += other.tempBytes
+
+    def to_dict(self):
+        """
+        This method gives the numbers in a form that can be dumped as JSON.
+
+        args:
+            -N/A
+
+        return:
+            -dict: the numbers
+        """
+        counted = [chunk for chunk in self.chunks if 'comparisons' in chunk]
+
+        return {
+            'phases': dict(self.phases),
+            'totalSeconds': self.endTime - self.startTime if self.endTime else None,
+            'chunks': list(self.chunks),
+            'comparisons': sum(chunk['comparisons'] for chunk in counted) if counted else None,
+            'moves': sum(chunk['moves'] for chunk in counted) if counted else None,
+            'bytesRead': self.bytesRead,
+            'bytesWritten': self.bytesWritten,
+            'tempBytesWritten': self.tempBytes,
+            'tempBytesRead': self.tempBytes,
+        }
+
+
+"""
+ExternSort class
+-----
+"""
+class ExternSort(object):
+    """
+    The purpose of this class is to provide a simple way to
+    run an external sort on on a large data file.
+
+    Attributes:
+        -chunkSize (int): The size of chunk files in bytes
+        -chunkCount (int): The number of chunk files that will be needed
+        -mergePlan (MergePlan): How the chunk files get merged, set once they exist
+        -victim (path or iterable): The file to sort, or an open file or other iterable
+                                    of records that is read once
+        -victimName (string): The file to sort, '-' for a stream
+        -victimSize (int): Size of the victim file in bytes, None for a stream
+        -streaming (bool): the victim is a stream rather than a file name
+        -targetFile (path): where run_extern_sort() writes the output, defaults to the
+                            victim name plus '.sorted.out'
+        -suture (string): name of the merge strategy in FileMonsters.SUTURE_PLANS
+        -workers (int): how many processes sort chunks while splitting
+        -records (string): name of the record format in FileMonsters.RECORD_FORMATS
+        -engine (string): name of the chunk sort engine in SORT_ENGINES
+        -fanIn (int): most chunk files to merge at once, None lets the planner decide
+        -runMode (string): 'chunk' or 'replacement', see FileMonsters.FileMutilator
+        -readAhead (int): blocks to prefetch per run while merging, 0 for none
+        -writeBehind (int): merged blocks to queue for a writer thread, 0 for none
+        -countOps (bool): have the qsort engine count comparisons and moves
+        -memory (int): memory budget in bytes; when set it decides the chunk size and
+                        fan-in instead of chunkSize
+        -memoryPlan (MemoryPlan): the sizes picked from the budget, set once planned
+        -memoryGuard (MemoryGuard): sizes every chunk and merge to fit the budget
+        -encoding (string): 'none' or a name in FileMonsters.RUN_ENCODINGS for the temp files
+        -runEncoding (EncodedRuns): the run encoding of the last run, None for 'none'
+        -resume (bool): carry on from the journal an earlier try of the same job left
+        -key (string): 'line' to compare whole lines, or a name in FileMonsters.KEY_TYPES
+                        to sort text by a key parsed from each line
+        -keyWidth (int): characters in a 'prefix' key
+        -duplicates (string): 'keep', or a name in FileMonsters.DUPLICATE_MODES to keep one
+                        of each record or one of each with its count
+        -mergeWorkers (int): processes merging key ranges side by side, see
+                        FileMonsters.FileSurgeon.parallel_stitching()
+        -tempDir (path): where the chunk and merge files go, None for next to FileMonsters.py
+        -adaptive (bool): check the victim's order first and copy it if it is already
+                        sorted, and have the splitter skip sorting chunks that are in order
+        -linkSorted (bool): hard link a victim that is already in order to the target
+                        instead of copying it, where the file system allows
+        -inOrder (bool): the last run found the victim already in order
+        -top (int): only give this many records from the front of the sorted output,
+                        None for all of them
+        -largest (bool): with top, give the records from the back of the sorted output
+        -keyRange (tuple): (low, high) to only give records with keys from low up to but
+                        not including high, as strings the record format parses; either
+                        can be None for no bound
+        -selected (int): how many records top or keyRange gave in the last run
+        -indexEvery (int): write a FileMonsters.SparseIndex of every indexEvery'th record
+                        next to the output file, 0 for none; not for counted output
+        -journalFile (path): where the journal is kept while the sort runs, None for a stream
+        -startTime (time): The time the last run started
+        -endTime (time): The time the sort finished
+        -metrics (SortMetrics): The numbers from the last run
+    """
+    #what a stream is called in reports and merge plans
+    _stream_target = '-'
+
+    #read size for the rest of a stream once the memory planner sampled its front
+    _stream_read_bytes = 1 << 20
+
+    #most bytes read at a time when checking if the victim is already in order
+    _check_read_bytes = 1 << 22
+
+    def __init__(self, victim, chunkSize, suture = 'heap', workers = 1, records = 'text',
+                 engine = 'qsort', fanIn = None, runMode = 'chunk', readAhead = 0,
+                 writeBehind = 0, countOps = False, memory = None, encoding = 'none',
+                 resume = False, target = None, key = 'line', keyWidth = 8,
+                 duplicates = 'keep', mergeWorkers = 1, tempDir = None, adaptive = True,
+                 linkSorted = False, top = None, largest = False, keyRange = None,
+                 indexEvery = 0):
+        assert suture in FileMonsters.SUTURE_PLANS, 'unknown merge strategy {0}'.format(suture)
+        assert encoding == 'none' or encoding in FileMonsters.RUN_ENCODINGS, \
+            'unknown run encoding {0}'.format(encoding)
+        assert records in FileMonsters.RECORD_FORMATS, 'unknown record format {0}'.format(records)
+        assert engine in SORT_ENGINES, 'unknown sort engine {0}'.format(engine)
+        assert key == 'line' or key in FileMonsters.KEY_TYPES, 'unknown key type {0}'.format(key)
+        assert key == 'line' or records == 'text', 'only text records take a key type'
+        assert duplicates == 'keep' or duplicates in FileMonsters.DUPLICATE_MODES, \
+            'unknown duplicate mode {0}'.format(duplicates)
+        assert top is None or top > 0, 'top needs a positive count'
+        assert top is None or keyRange is None, 'pick top or keyRange, not both'
+        assert not indexEvery or duplicates != 'count', 'counted output can not be indexed'
+
+        self.chunkSize = chunkSize
+        self.victim = victim
+        self.streaming = not isinstance(victim, str)
+        self.victimName = ExternSort._stream_target if self.streaming else victim
+        self.suture = suture
+        self.workers = workers
+        self.records = records
+        self.engine = engine
+        self.fanIn = fanIn
+        self.runMode = runMode
+        self.readAhead = readAhead
+        self.writeBehind = writeBehind
+        self.countOps = countOps
+        self.memory = memory
+        self.memoryPlan = None
+        self.memoryGuard = None
+        self.encoding = encoding
+        self.runEncoding = None
+        self.resume = resume
+        self.key = key
+        self.keyWidth = keyWidth
+        self.duplicates = duplicates
+        self.mergeWorkers = mergeWorkers
+        self.tempDir = tempDir
+        self.adaptive = adaptive
+        self.linkSorted = linkSorted
+        self.inOrder = False
+        self.top = top
+        self.largest = largest
+        self.keyRange = keyRange
+        self.selected = None
+        self.indexEvery = indexEvery
+        self.mergePlan = None
+        self.victimSize = None
+        self.chunkCount = None
+        self.targetFile = target or (None if self.streaming else victim + '.sorted.out')
+        self.journalFile = None if self.streaming else victim + '.journal'
+        self.startTime = None
+        self.endTime = None
+        self.metrics = SortMetrics()
+
+    def run_extern_sort(self):
+        """
+        This function runs the external sort by using the FileMutilator
+        class to split up target data file into sorted chunk files.
+
+        It then uses the FileSurgeon class to merge the sorted chunk files
+        into a sorted version of the original file.
+
+        When adaptive and the file is already in order it is copied to the target
+        instead, with no chunk files at all. With top or keyRange only the records
+        picked out are written.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        assert self.targetFile, 'sorting a stream to a file needs a target'
+        self._start_metrics()
+        if self.top or self.keyRange:
+            records = self.record_format()
+            index = self._output_index(records)
+            records.write_merged(self._selected_records(), self.targetFile,
+                                 ExternSort._stream_read_bytes, index)
+            if index is not None:
+                index.save(self.targetFile)
+
+            outputBytes = os.path.getsize(self.targetFile)
+            self.metrics.bytesRead = (self.victimSize or 0) + self.metrics.tempBytes
+            self.metrics.bytesWritten = self.metrics.tempBytes + outputBytes
+            self.metrics.stop()
+            self.endTime = self.metrics.endTime
+            return
+
+        if self._victim_in_order():
+            with self.metrics.phase('copy'):
+                linked = self._index_victim() if self.indexEvery else self._copy_victim()
+            self.metrics.bytesRead = 0 if linked else self.victimSize
+            self.metrics.bytesWritten = 0 if linked else self.victimSize
+
+            self.metrics.stop()
+            self.endTime = self.metrics.endTime
+            return
+
+        mutilator, medic, journal = self._split_and_plan(self.targetFile)
+
+        print('starting to merge back')
+        #merge the chunk files
+        with self.metrics.phase('merge'):
+            medic.follow_plan(self.mergePlan, journal, indexEvery=self.indexEvery)
+
+        self._finish(mutilator, medic, journal, os.path.getsize(self.targetFile))
+
+    def sorted_records(self):
+        """
+        This generator runs the external sort like run_extern_sort() but hands the
+        records of the last merge back in order instead of writing an output file, so
+        they can go straight to stdout or the next step of a pipeline. The temp files
+        are cleaned up once it is used up or closed.
+
+        args:
+            -N/A
+
+        return:
+            -generator: the records in sorted order
+        """
+        self._start_metrics()
+        if self.top or self.keyRange:
+            for record in self._selected_records():
+                yield record
+
+            self.metrics.bytesRead = (self.victimSize or 0) + self.metrics.tempBytes
+            self.metrics.bytesWritten = self.metrics.tempBytes
+            self.metrics.stop()
+            self.endTime = self.metrics.endTime
+            return
+
+        if self._victim_in_order():
+            #the victim is the output, so it is just read back
+            run = self.record_format().open_run(self.victim, ExternSort._stream_read_bytes)
+            try:
+                with self.metrics.phase('copy'):
+                    for record in run:
+                        yield record
+            finally:
+                run.close()
+
+            self.metrics.bytesRead = self.victimSize
+            self.metrics.bytesWritten = self.victimSize
+            self.metrics.stop()
+            self.endTime = self.metrics.endTime
+            return
+
+        mutilator, medic, journal = self._split_and_plan(ExternSort._stream_target)
+        patients, _, bufferSize = self.mergePlan.steps[-1]
+        finished = False
+
+        try:
+            print('starting to merge back')
+            #every merge but the last one still goes through files
+            with self.metrics.phase('merge'):
+                medic.follow_plan(self.mergePlan, journal, final=False)
+                for record in medic.stream_stitching(patients, bufferSize):
+                    yield record
+            finished = True
+        finally:
+            #the last merge's inputs that were intermediate merge files are done with
+            for patient in patients:
+                if patient not in self.mergePlan.runs and os.path.exists(patient):
+                    os.remove(patient)
+
+            if finished:
+                #without duplicates the output is as big as the input
+                outputBytes = self.victimSize if self.duplicates == 'keep' else None
+                self._finish(mutilator, medic, journal, outputBytes)
+            else:
+                mutilator.hide_remains()
+
+    def _start_metrics(self):
+        """
+        This method starts a fresh set of numbers for a run.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        #get start time for logging.
+        self.metrics = SortMetrics()
+        self.metrics.start()
+        self.startTime = self.metrics.startTime
+        self.mergePlan = None
+        self.inOrder = False
+        self.selected = None
+
+    def _selected_records(self):
+        """
+        This generator reads the victim once, picking out the top records or the key
+        range as it goes, and hands them back in order. The selection may hold as many
+        records as a chunk does. If it needs more, what it holds and the rest of the
+        input it could still pick from are sorted through chunk files instead, and the
+        selection is taken from the front of that. With a memory budget the chunks and
+        what the selection holds are planned to fit in it together, and the guard
+        sizes every chunk to what the selection has left.
+
+        args:
+            -N/A
+
+        return:
+            -generator: the selected records in sorted order
+        """
+        self._set_chunkCount()
+        records = self.record_format()
+        engine = get_sort_engine(self.engine, self.countOps)
+        selection = self._selection(records)
+
+        victim, chunkSize = self.victim, self.chunkSize
+        if self.memory:
+            victim = self._plan_memory(records, engine)
+            guard, least = self.memoryGuard, FileMonsters.FileMutilator._min_chunk_size
+            chunkSize = lambda: guard.fit_chunk(self.chunkSize, least)
+
+        chunks = records.read_chunks(victim, chunkSize)
+        chunkRecords = 0
+        with self.metrics.phase('select'):
+            for chunk in chunks:
+                chunkRecords = max(chunkRecords, len(chunk))
+                selection.add(chunk)
+                del chunk
+                if selection.held > chunkRecords:
+                    break
+            else:
+                chunks = None
+
+        self.selected = 0
+        if chunks is None:
+            with self.metrics.phase('sort'):
+                selected = selection.finish(engine)
+            for record in selected:
+                self.selected += 1
+                yield record
+            return
+
+        report = 'the selection is bigger than a chunk, sorting it through chunk files'
+        print(report)
+        logging.info(report)
+
+        rest = itertools.chain.from_iterable(selection.keep(chunk) for chunk in chunks)
+        spilled = self._sort_spilled(itertools.chain(selection.spill(), rest))
+        for record in selection.cut(spilled.sorted_records(), self.tempDir):
+            self.selected += 1
+            yield record
+
+        self.mergePlan = spilled.mergePlan
+        self.metrics.add_metrics(spilled.metrics)
+
+    def _selection(self, records):
+        """
+        This method builds what picks the records out: a FileMonsters.TopSelection for
+        top or a FileMonsters.RangeSelection for keyRange.
+
+        args:
+            -records (obj): the record format
+
+        return:
+            -obj: the selection
+        """
+        if self.top:
+            return FileMonsters.TopSelection(records, self.top, self.largest)
+
+        low, high = [None if bound is None else records.parse_bound(bound)
+                     for bound in self.keyRange]
+        return FileMonsters.RangeSelection(records, low, high)
+
+    def _sort_spilled(self, victim):
+        """
+        This method sets up the sort of a selection that did not fit in a chunk, with
+        the same settings as this one. It sorts a stream, so it keeps no journal and
+        does not check the order first. It keeps this sort's memory plan, which already
+        counts the records the selection spills into it, instead of planning again
+        with them resident.
+
+        args:
+            -victim (iterable): the records the selection may still come from
+
+        return:
+            -ExternSort: the sort, ready for sorted_records()
+        """
+        spilled = ExternSort(victim, chunkSize=self.chunkSize, suture=self.suture,
+                             workers=self.workers, records=self.records, engine=self.engine,
+                             fanIn=self.fanIn, runMode=self.runMode, readAhead=self.readAhead,
+                             writeBehind=self.writeBehind, countOps=self.countOps,
+                             memory=self.memory, encoding=self.encoding, key=self.key,
+                             keyWidth=self.keyWidth, duplicates=self.duplicates,
+                             mergeWorkers=self.mergeWorkers, tempDir=self.tempDir)
+        spilled.memoryPlan, spilled.memoryGuard = self.memoryPlan, self.memoryGuard
+        return spilled
+
+    def _victim_in_order(self):
+        """
+        This method checks if the victim is already sorted, reading it once and
+        stopping at the first record out of place. It is skipped for streams, which
+        can only be read once, and when resuming, where the journal's runs are used.
+        With a memory budget the sizes are planned first, and no block read is bigger
+        than a chunk.
+
+        args:
+            -N/A
+
+        return:
+            -bool: True if the victim can be used as the output as it is
+        """
+        if not self.adaptive or self.streaming or self.resume:
+            return False
+
+        records = self.record_format()
+        readSize = ExternSort._check_read_bytes
+        if self.memory:
+            self._plan_memory(records, get_sort_engine(self.engine, self.countOps))
+            readSize = min(readSize, self.memoryPlan.chunkSize)
+
+        with self.metrics.phase('check'):
+            self.victimSize = os.path.getsize(self.victim)
+            self.inOrder = records.in_order(self.victim, readSize)
+
+        if self.inOrder:
+            print('{0} is already in order'.format(self.victim))
+            logging.info('{0} is already in order, {1} bytes'.format(self.victim, self.victimSize))
+        return self.inOrder
+
+    def _copy_victim(self):
+        """
+        This method makes the target from a victim that is already in order. With
+        linkSorted it tries a hard link first, which fails across file systems and on
+        some platforms, so copying is always there to fall back on.
+
+        args:
+            -N/A
+
+        return:
+            -bool: True if the target was linked rather than copied
+        """
+        if os.path.abspath(self.targetFile) == os.path.abspath(self.victim):
+            return True
+
+        if os.path.exists(self.targetFile):
+            os.remove(self.targetFile)
+
+        if self.linkSorted:
+            try:
+                os.link(self.victim, self.targetFile)
+                return True
+            except (OSError, AttributeError) as e:
+                logging.info('could not link {0}, copying it instead. Error was: {1}'.format(
+                    self.victim, e))
+
+        shutil.copyfile(self.victim, self.targetFile)
+        return False
+
+    def _index_victim(self):
+        """
+        This method makes the target from a victim that is already in order like
+        _copy_victim(), but writes it back through the record format so its index is
+        built on the way. A victim that is its own target is written to a temp file
+        that then takes its place.
+
+        args:
+            -N/A
+
+        return:
+            -bool: False, the victim is always read and written
+        """
+        records = self.record_format()
+        index = self._output_index(records)
+        inPlace = os.path.abspath(self.targetFile) == os.path.abspath(self.victim)
+        targetFile = self.targetFile + '.indexing' if inPlace else self.targetFile
+
+        run = records.open_run(self.victim, ExternSort._stream_read_bytes)
+        try:
+            records.write_merged(run, targetFile, ExternSort._stream_read_bytes, index)
+        finally:
+            run.close()
+
+        if inPlace:
+            os.remove(self.targetFile)
+            os.rename(targetFile, self.targetFile)
+        index.save(self.targetFile)
+        return False
+
+    def _output_index(self, records):
+        """
+        This method starts the index of an output that is not written by a merge.
+
+        args:
+            -records (obj): the record format writing the output
+
+        return:
+            -FileMonsters.SparseIndex: the empty index, None when not indexing
+        """
+        if not self.indexEvery:
+            return None
+        return FileMonsters.SparseIndex(records, self.indexEvery)
+
+    def _split_and_plan(self, targetFile):
+        """
+        This method does everything before the merge: plans the sizes from the memory
+        budget, splits the victim into sorted chunk files and plans the merge.
+
+        args:
+            -targetFile (string): the name the merge plan writes the output to
+
+        return:
+            -tuple: (FileMutilator, FileSurgeon, SortJournal or None)
+        """
+        #get how many chunk files we need
+        self._setup_tools()
+
+        #one record format shared by the splitter and the merger
+        records = self.record_format()
+        engine = get_sort_engine(self.engine, self.countOps)
+
+        #a memory budget decides the sizes instead of chunkSize
+        victim = self.victim
+        mergeMemory, runOverhead, blockRecords = self.chunkSize, 0, 8192
+        if self.memory:
+            victim = self._plan_memory(records, engine)
+            mergeMemory = self.memoryPlan.mergeMemory
+            runOverhead = self.memoryPlan.runOverhead
+            blockRecords = self.memoryPlan.blockRecords
+
+        #every finished run and merge goes in the journal
+        journal = self._open_journal()
+
+        #the temp files can be encoded, the output never is
+        self.runEncoding = None
+        if self.encoding != 'none':
+            self.runEncoding = FileMonsters.RUN_ENCODINGS[self.encoding](records, blockRecords)
+
+        #set up the file splitter
+        mutilator = FileMonsters.FileMutilator(victim, self.chunkSize, self.workers,
+                                               records=records,
+                                               engine=engine,
+                                               runMode=self.runMode,
+                                               guard=self.memoryGuard,
+                                               encoding=self.runEncoding,
+                                               journal=journal,
+                                               tempDir=self.tempDir,
+                                               adaptive=self.adaptive)
+        
+        print('splitting')
+        #split and quicksort chunk files
+        with self.metrics.phase('split'):
+            mutilator.commit_mutilation()
+        self.metrics.add_chunks(mutilator.chunkStats)
+        if self.runEncoding:
+            self.runEncoding.add_chunks(mutilator.chunkStats)
+
+        #prepare medic to merge chunk files
+        if self.suture == 'block':
+            sPlan = FileMonsters.SUTURE_PLANS[self.suture](blockRecords)
+        else:
+            sPlan = FileMonsters.SUTURE_PLANS[self.suture]()
+        medic = FileMonsters.FileSurgeon(sPlan, records, self.readAhead, self.writeBehind,
+                                         blockRecords, self.runEncoding, self.mergeWorkers,
+                                         self.memoryGuard)
+
+        #get the chunk files to be merged
+        patients = mutilator.get_chunks_list()
+
+        runReport = '{0} runs, average run length {1:.1f} records'.format(
+            len(patients), mutilator.average_run_length())
+        presorted = sum(1 for chunk in mutilator.chunkStats if 'presorted' in chunk)
+        if presorted:
+            runReport += ', {0} of {1} chunks already in order'.format(presorted,
+                                                                      len(mutilator.chunkStats))
+        print(runReport)
+        logging.info(runReport)
+        
+        #the split can leave more resident than there was when the budget was planned
+        if self.memoryGuard is not None:
+            mergeMemory = self.memoryGuard.fit_merge_memory(mergeMemory,
+                                                            FileMonsters.FileSurgeon._min_buffer_size)
+
+        #work out how many passes the merge needs and report it before starting
+        with self.metrics.phase('plan'):
+            self.mergePlan = self._plan_merge(journal, patients, mergeMemory, runOverhead,
+                                              targetFile)
+        print(self.mergePlan.report())
+        logging.info(self.mergePlan.report())
+
+        return mutilator, medic, journal
+
+    def record_format(self):
+        """
+        This method builds the record format, keyed when a key type was asked for and
+        wrapped to drop or count duplicates when asked to.
+
+        args:
+            -N/A
+
+        return:
+            -obj: the record format
+        """
+        if self.key != 'line':
+            records = FileMonsters.KeyedTextRecords(self.key, self.keyWidth)
+        else:
+            records = FileMonsters.RECORD_FORMATS[self.records]()
+
+        if self.duplicates != 'keep':
+            records = FileMonsters.DUPLICATE_MODES[self.duplicates](records)
+        return records
+
+    def _finish(self, mutilator, medic, journal, outputBytes):
+        """
+        This method does everything after the merge: counts the bytes, reports the
+        merge I/O and encoding, and deletes the chunk files and the journal.
+
+        args:
+            -mutilator (FileMutilator): the splitter, for its chunk files
+            -medic (FileSurgeon): the merger, for its I/O numbers
+            -journal (SortJournal): the journal, None for none
+            -outputBytes (int): size of the output, None if it is not known
+
+        return:
+            -N/A
+        """
+        #every run and intermediate merge file is written once and read once
+        self.metrics.tempBytes = self.mergePlan.bytesMoved
+        self.metrics.bytesRead = (self.victimSize or 0) + self.metrics.tempBytes
+        self.metrics.bytesWritten = self.metrics.tempBytes + (outputBytes or 0)
+
+        if self.readAhead or self.writeBehind:
+            print(medic.io_report())
+            logging.info(medic.io_report())
+
+        if self.runEncoding:
+            print(self.runEncoding.report())
+            logging.info(self.runEncoding.report())
+
+        if self.duplicates != 'keep':
+            distinctReport = self._distinct_report()
+            print(distinctReport)
+            logging.info(distinctReport)
+
+        #delete all the used chunk files
+        with self.metrics.phase('cleanup'):
+            mutilator.hide_remains()
+            if journal is not None:
+                journal.remove()
+
+        #set endTime for logging later
+        self.metrics.stop()
+        self.endTime = self.metrics.endTime
+
+    def _distinct_report(self):
+        """
+        This method describes how many duplicates the chunks dropped before they were
+        written. Duplicates in different chunks are only dropped by the merge, so the
+        output can have fewer records than the chunks kept. Replacement selection runs
+        are not counted, they are written as they are selected.
+
+        args:
+            -N/A
+
+        return:
+            -string: the report
+        """
+        chunks = [chunk for chunk in self.metrics.chunks if 'distinctRecords' in chunk]
+        read = sum(chunk['records'] for chunk in chunks)
+        kept = sum(chunk['distinctRecords'] for chunk in chunks)
+
+        return 'duplicates {0}: {1} records read into chunks, {2} distinct within chunks ' \
+               '({3:.1f}% dropped before the merge)'.format(
+                   self.duplicates, read, kept, 100.0 * (read - kept) / read if read else 0.0)
+
+    def get_stats(self):
+        """
+        The purpose of this method is to give the numbers from the last run in a form
+        that can be dumped as JSON.
+
+        args:
+            -N/A
+
+        return:
+            -dict: settings, sizes, per phase seconds and per chunk stats
+        """
+        stats = {
+            'victim': self.victimName,
+            'victimSize': self.victimSize,
+            'chunkSize': self.chunkSize,
+            'suture': self.suture,
+            'records': self.records,
+            'engine': self.engine,
+            'runMode': self.runMode,
+            'workers': self.workers,
+            'mergeWorkers': self.mergeWorkers,
+            'encoding': self.encoding,
+            'key': self.key,
+            'duplicates': self.duplicates,
+            'runs': len(self.mergePlan.runs) if self.mergePlan else None,
+            'mergePasses': self.mergePlan.passes if self.mergePlan else None,
+            'adaptive': self.adaptive,
+            'inOrder': self.inOrder,
+            'top': self.top,
+            'largest': self.largest,
+            'keyRange': self.keyRange,
+            'selected': self.selected,
+            'indexEvery': self.indexEvery,
+        }
+        if self.memoryPlan:
+            stats['memory'] = self.memory
+            stats['memoryPlan'] = self.memoryPlan.to_dict()
+            stats['memoryPeakBytes'] = self.memoryGuard.peak
+            stats['memoryTrips'] = self.memoryGuard.trips
+            stats['memoryCuts'] = self.memoryGuard.cuts
+        if self.runEncoding:
+            stats['encodingStats'] = dict(self.runEncoding.stats)
+
+        stats.update(self.metrics.to_dict())
+        return stats
+
+    def _plan_memory(self, records, engine):
+        """
+        This method plans the sizes from the memory budget, once: checking the order of
+        the victim may already have. Split and merge workers the budget does not fit are
+        dropped.
+
+        args:
+            -records (obj): the record format
+            -engine (obj): the chunk sort engine
+
+        return:
+            -string or iterable: the victim to split, a stream with its sample put back
+        """
+        if self.memoryPlan is not None:
+            return self.victim
+
+        victim = self.victim
+        with self.metrics.phase('plan'):
+            #a stream can only be read once, so the sample is put back in front of it
+            sample = None
+            if self.streaming:
+                chunks = records.read_chunks(victim, FileMonsters.MemoryPlanner._sample_bytes)
+                sample = next(chunks, None)
+                chunks.close()
+                victim = itertools.chain(sample or [], itertools.chain.from_iterable(
+                    records.read_chunks(self.victim, ExternSort._stream_read_bytes)))
+                sample = sample or []
+
+            planner = FileMonsters.MemoryPlanner(self.memory)
+            self.memoryPlan = planner.plan(victim, records, engine, self.workers,
+                                           runMode=self.runMode, suture=self.suture,
+                                           readAhead=self.readAhead,
+                                           writeBehind=self.writeBehind,
+                                           encoding=self.encoding, sample=sample,
+                                           selection=bool(self.top or self.keyRange),
+                                           mergeWorkers=self.mergeWorkers)
+        print(self.memoryPlan.report())
+        logging.info(self.memoryPlan.report())
+
+        if self.memoryPlan.workers < self.workers:
+            capped = 'the {0} byte memory budget only fits {1} of the {2} split workers'.format(
+                self.memory, self.memoryPlan.workers, self.workers)
+            print(capped)
+            logging.warning(capped)
+            self.workers = self.memoryPlan.workers
+
+        if self.memoryPlan.mergeWorkers < self.mergeWorkers:
+            capped = 'the {0} byte memory budget only fits {1} of the {2} merge workers'.format(
+                self.memory, self.memoryPlan.mergeWorkers, self.mergeWorkers)
+            print(capped)
+            logging.warning(capped)
+            self.mergeWorkers = self.memoryPlan.mergeWorkers
+
+        self.chunkSize = self.memoryPlan.chunkSize
+        self._set_chunkCount()
+        self.memoryGuard = FileMonsters.MemoryGuard(self.memory, self.memoryPlan)
+        return victim
+
+    def _setup_tools(self):
+        """
+        This method calls the private method _set_chunkCount(self) to get the
+        values needed before splitting.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        #get the number of chunks files
+        self._set_chunkCount()
+
+    def _open_journal(self):
+        """
+        This method sets up the journal. With resume, what an earlier try of the same
+        job left is loaded; otherwise any old journal is replaced. A stream can not be
+        read again, so it gets no journal.
+
+        args:
+            -N/A
+
+        return:
+            -SortJournal: the journal, None for a stream
+        """
+        if self.streaming:
+            return None
+
+        job = {'victim': os.path.abspath(self.victim), 'victimSize': self.victimSize,
+               'victimModified': os.path.getmtime(self.victim), 'records': self.records,
+               'runMode': self.runMode, 'encoding': self.encoding, 'key': self.key,
+               'keyWidth': self.keyWidth, 'duplicates': self.duplicates}
+        journal = FileMonsters.SortJournal(self.journalFile, job)
+
+        if self.resume and journal.load():
+            report = 'resuming from {0}: {1} runs kept, split {2}, {3} merges done'.format(
+                self.journalFile, len(journal.runs), 'done' if journal.splitDone else 'not done',
+                len(journal.merges))
+            print(report)
+            logging.info(report)
+        else:
+            journal.restart()
+
+        return journal
+
+    def _plan_merge(self, journal, patients, mergeMemory, runOverhead, targetFile):
+        """
+        This method plans the merge, or takes the plan from the journal so a resumed
+        merge runs the same steps as the try that wrote it. The last step of a plan
+        from the journal writes to this run's targetFile, which may not be the one the
+        earlier try was given.
+
+        args:
+            -journal (SortJournal): the journal, None for none
+            -patients (list of strings): the runs
+            -mergeMemory (int): bytes of buffer the merge may use
+            -runOverhead (int): bytes each open run costs on top of its buffer
+            -targetFile (string): the name for the outfile
+
+        return:
+            -MergePlan: the plan
+        """
+        if journal is not None and journal.plan is not None:
+            journal.retarget(targetFile)
+            return FileMonsters.MergePlan(patients, journal.plan['fanIn'],
+                                          [tuple(step) for step in journal.plan['steps']],
+                                          journal.plan['passes'])
+
+        #lines with equal keys are not the same, so runs have to stay in input order
+        planner = FileMonsters.MergePlanner(mergeMemory, self.fanIn, runOverhead=runOverhead,
+                                            tempDir=self.tempDir, stable=self.key != 'line')
+        mergePlan = planner.plan(patients, targetFile)
+        if journal is not None:
+            journal.set_plan(mergePlan)
+        return mergePlan
+
+    def _set_chunkCount(self):
+        """
+        This method calculates the number of chunk files that will be needed
+        and stores the value. The size of a stream is not known up front.
+
+        args:
+            -N/A
+
+        return:
+            -N/A
+        """
+        if self.streaming:
+            return
+
+        self.victimSize = os.stat(self.victim).st_size
+        self.chunkCount = (self.victimSize / self.chunkSize) + 1
 
     def get_timeing_info(self):
         """
@@ -253,6 +1809,6 @@ class ExternSort(object):
         h, m = divmod(m, 60)
 
         return 'Running External Sort on '\
-                '{0}, size: {1}, took: {2}H:{3}M:{4}S'.format(self.victim,
+                '{0}, size: {1}, took: {2}H:{3}M:{4}S'.format(self.victimName,
                                                             self.victimSize,
                                                             h, m, s)
\ No newline at end of file
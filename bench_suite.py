@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+This script runs sort_bigfile.py end to end over a grid of inputs and saves the numbers.
+
+For every dgen.py distribution (unique or not; random, sorted or reversed, plus the -d
+shapes like zipf and qsort-killer), every size and every chunk size it:
+1. Generates the input with dgen.py, seeded so reruns see the same data
+2. Runs sort_bigfile.py on it in a child process
+3. Records throughput, per phase seconds, peak RSS and temp file bytes
+
+Results go to a JSON file. Compare mode lines up two result files and flags any case
+whose throughput dropped by more than a threshold.
+
+---------
+Contains:
+---------
+    +run_suite(args)
+    +compare_results(oldFileName, newFileName, threshold)
+    +main(args)
+    -_generate(distribution, numCount, fileName, seed)
+    -_run_sort(fileName, chunkSize, sortArgs)
+    -_case_key(result)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started.
+    -10/17/26 - Inputs are seeded with dgen.py --seed instead of the random module.
+    -10/17/26 - Added the dgen.py -d shapes. Results carry the input's metadata sidecar.
+    -10/17/26 - The flag combinations come from benchmarks.DISTRIBUTIONS.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import benchmarks
+import dgen
+
+"""
+Globals
+-----
+"""
+#where the scripts live, sort_bigfile.py only looks for data files here
+_workingDir = os.path.dirname(os.path.realpath(__file__))
+
+#the dgen.py flag combinations benchmarks.py also uses, then the -d shapes
+DISTRIBUTIONS = benchmarks.DISTRIBUTIONS + \
+                [shape for shape in dgen.DISTRIBUTIONS if shape != 'uniform']
+
+
+"""
+Helper Function(s)
+-----
+"""
+def _generate(distribution, numCount, fileName, seed):
+    """
+    This helper function makes an input file with dgen.py.
+
+    args:
+        -distribution (string): one of DISTRIBUTIONS
+        -numCount (int): how many numbers to generate
+        -fileName (string): the file to write
+        -seed (int): dgen.py --seed
+
+    return:
+        -dict: the metadata dgen.py wrote next to the file
+    """
+    shape, unique, order = distribution, None, None
+    if distribution not in dgen.DISTRIBUTIONS:
+        shape = 'uniform'
+        unique, order = distribution.split('-')
+
+    return dgen.main(argparse.Namespace(do_unique=unique == 'unique',
+                                        do_sort=order in ('sorted', 'reversed'),
+                                        do_reverse=order == 'reversed',
+                                        do_binary=False,
+                                        do_print=False,
+                                        numCount=numCount,
+                                        outFileName=fileName,
+                                        jobs=1,
+                                        seed=seed,
+                                        distribution=shape,
+                                        **dgen.PARAM_DEFAULTS))
+
+
+def _run_sort(fileName, chunkSize, sortArgs):
+    """
+    This helper function runs sort_bigfile.py in a child process and collects its numbers.
+    The child is reaped with os.wait4 so its own peak RSS is known.
+
+    args:
+        -fileName (string): the data file, in the script directory
+        -chunkSize (int): chunk size in bytes
+        -sortArgs (list of strings): more arguments for sort_bigfile.py
+
+    return:
+        -dict: wall seconds, peak RSS and the child's --stats output
+    """
+    statsFileName = os.path.join(_workingDir, fileName + '.stats.json')
+    command = [sys.executable, os.path.join(_workingDir, 'sort_bigfile.py'),
+               '-f', fileName, '-c', str(chunkSize), '--stats', statsFileName] + sortArgs
+
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        child = subprocess.Popen(command, cwd=_workingDir, stdout=devnull)
+        _, status, usage = os.wait4(child.pid, 0)
+        seconds = time.time() - start
+
+    #we reaped it ourselves, tell Popen so it does not try again
+    child.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    if child.returncode != 0:
+        raise RuntimeError('sort_bigfile.py failed on {0} with code {1}'.format(fileName,
+                                                                               child.returncode))
+
+    with open(statsFileName) as statsHandle:
+        stats = json.load(statsHandle)
+    os.remove(statsFileName)
+
+    #ru_maxrss is KB on linux and bytes on mac
+    peakRss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+    return {'seconds': seconds, 'peakRssBytes': peakRss, 'stats': stats}
+
+
+def _case_key(result):
+    """
+    This helper function names a benchmark case so two result files can be lined up.
+
+    args:
+        -result (dict): one result
+
+    return:
+        -tuple: (distribution, records, chunk size)
+    """
+    return (result['distribution'], result['records'], result['chunkSize'])
+
+
+"""
+Suite
+-----
+"""
+def run_suite(args):
+    """
+    This function runs every case in the grid and writes the results file.
+
+    args:
+        -args (Namespace): the command line arguments
+
+    return:
+        -list: the results
+    """
+    results = []
+    for distribution in args.distributions:
+        for numCount in args.sizes:
+            fileName = 'bench_{0}_{1}.dat'.format(distribution, numCount)
+            dataPath = os.path.join(_workingDir, fileName)
+            workload = _generate(distribution, numCount, dataPath, args.seed)
+            size = os.path.getsize(dataPath)
+            with open(dataPath) as dataHandle:
+                records = sum(1 for _ in dataHandle)
+
+            try:
+                for chunkSize in args.chunkSizes:
+                    #best of the repeats, the rest is noise
+                    best = min((_run_sort(fileName, chunkSize, args.sortArgs)
+                                for _ in range(args.repeat)), key=lambda run: run['seconds'])
+                    stats = best['stats']
+
+                    result = {
+                        'distribution': distribution,
+                        'workload': workload,
+                        'records': records,
+                        'bytes': size,
+                        'chunkSize': chunkSize,
+                        'sortArgs': args.sortArgs,
+                        'seconds': best['seconds'],
+                        'mbPerSecond': size / best['seconds'] / 1e6,
+                        'recordsPerSecond': records / best['seconds'],
+                        'phases': stats['phases'],
+                        'runs': stats['runs'],
+                        'mergePasses': stats['mergePasses'],
+                        'peakRssBytes': best['peakRssBytes'],
+                        'tempBytes': stats['tempBytesWritten'] + stats['tempBytesRead'],
+                    }
+                    results.append(result)
+                    print('{0:<17} {1:>10} records chunk {2:>10} {3:8.3f}s {4:8.2f} MB/s '
+                          '{5:>8} KB rss'.format(distribution, records, chunkSize,
+                                                 result['seconds'], result['mbPerSecond'],
+                                                 result['peakRssBytes'] // 1024))
+            finally:
+                os.remove(dataPath)
+                os.remove(dataPath + dgen.META_SUFFIX)
+                if os.path.exists(dataPath + '.sorted.out'):
+                    os.remove(dataPath + '.sorted.out')
+
+    output = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.outFileName, 'w') as outHandle:
+        json.dump(output, outHandle, indent=2, sort_keys=True)
+
+    return results
+
+
+def compare_results(oldFileName, newFileName, threshold):
+    """
+    This function lines up two results files and reports the change in throughput
+    for every case they share.
+
+    args:
+        -oldFileName (string): the baseline results
+        -newFileName (string): the results to check
+        -threshold (float): the fraction throughput may drop before it is a regression
+
+    return:
+        -list: the keys of the cases that regressed
+    """
+    with open(oldFileName) as oldHandle:
+        old = dict((_case_key(r), r) for r in json.load(oldHandle)['results'])
+    with open(newFileName) as newHandle:
+        new = dict((_case_key(r), r) for r in json.load(newHandle)['results'])
+
+    regressions = []
+    for key in sorted(set(old) & set(new)):
+        change = new[key]['mbPerSecond'] / old[key]['mbPerSecond'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = 'REGRESSION'
+            regressions.append(key)
+
+        print('{0:<17} {1:>10} records chunk {2:>10} {3:8.2f} -> {4:8.2f} MB/s {5:+7.1%} {6}'.format(
+            key[0], key[1], key[2], old[key]['mbPerSecond'], new[key]['mbPerSecond'], change, flag))
+
+    for key in sorted(set(old) ^ set(new)):
+        print('{0} is only in {1}'.format(key, oldFileName if key in old else newFileName))
+
+    return regressions
+
+
+"""
+MAIN
+-----
+"""
+def main(args):
+    """
+    This main function runs the suite or compares two results files.
+
+    args:
+        args (dict): incoming command line arguments
+
+    return:
+        -int: exit code, 1 if compare found a regression
+    """
+    if args.mode == 'run':
+        run_suite(args)
+        return 0
+
+    return 1 if compare_results(args.compare[0], args.compare[1], args.threshold) else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='This tool benchmarks sort_bigfile.py end to end.')
+    parser.add_argument('mode',
+                                    action='store',
+                                    choices=['run', 'compare'],
+                                    help='Run the suite, or compare two results files.')
+    parser.add_argument('-d', '--distributions',
+                                    dest='distributions',
+                                    action='store',
+                                    nargs='+',
+                                    choices=DISTRIBUTIONS,
+                                    default=DISTRIBUTIONS,
+                                    help='dgen.py distributions to run.')
+    parser.add_argument('-z', '--sizes',
+                                    dest='sizes',
+                                    action='store',
+                                    type=int,
+                                    nargs='+',
+                                    default=[100000, 1000000],
+                                    help='Numbers of records to generate.')
+    parser.add_argument('-c', '--chunksizes',
+                                    dest='chunkSizes',
+                                    action='store',
+                                    type=int,
+                                    nargs='+',
+                                    default=[1048576, 8388608],
+                                    help='Chunk sizes in bytes to pass to sort_bigfile.py.')
+    parser.add_argument('-a', '--sort-args',
+                                    dest='sortArgs',
+                                    action='store',
+                                    type=str,
+                                    default='',
+                                    help='More arguments for sort_bigfile.py, in quotes.')
+    parser.add_argument('-n', '--repeat',
+                                    dest='repeat',
+                                    action='store',
+                                    type=int,
+                                    default=1,
+                                    help='Runs per case, the fastest is kept.')
+    parser.add_argument('--seed',
+                                    dest='seed',
+                                    action='store',
+                                    type=int,
+                                    default=4040,
+                                    help='Seed for generating the inputs.')
+    parser.add_argument('-o', '--out',
+                                    dest='outFileName',
+                                    action='store',
+                                    type=str,
+                                    default='bench_results.json',
+                                    help='Where to write the results.')
+    parser.add_argument('--compare',
+                                    dest='compare',
+                                    action='store',
+                                    nargs=2,
+                                    metavar=('OLD', 'NEW'),
+                                    help='The two results files to compare.')
+    parser.add_argument('-t', '--threshold',
+                                    dest='threshold',
+                                    action='store',
+                                    type=float,
+                                    default=0.1,
+                                    help='Drop in MB/s, as a fraction, that counts as a regression.')
+    args = parser.parse_args()
+    args.sortArgs = args.sortArgs.split()
+
+    if args.mode == 'compare' and not args.compare:
+        parser.error('compare needs two results files, use --compare OLD NEW')
+
+    if args.repeat < 1:
+        parser.error('You need at least one repeat. The one you provided was {0}'.format(args.repeat))
+
+    sys.exit(main(args))
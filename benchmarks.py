@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+This script provides micro benchmarks for the pieces of the external sort.
+
+Data is built in memory so the numbers show the cost of the algorithm and not the disk.
+
+---------
+Contains:
+---------
+    +bench_merge(runCounts, numCount, layout = 'interleaved')
+    +bench_sort(chunkSizes)
+    +bench_qsort(numCount)
+    +main(args)
+    -_make_runs(runCount, numCount, layout = 'interleaved')
+    -_make_lines(numCount)
+    -_make_distribution(name, numCount)
+    -_time_it(func)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started. Added the merge benchmark comparing the merge strategies.
+    -10/17/26 - Added the sort engine benchmark per chunk size.
+    -10/17/26 - Added the qsort_inplace benchmark over every dgen.py distribution.
+    -10/17/26 - The sort engine benchmark covers every engine in Sorts.SORT_ENGINES.
+    -10/17/26 - The merge benchmark can lay runs out over disjoint key ranges.
+"""
+import argparse
+import array
+import random
+import time
+
+import FileMonsters
+import Sorts
+
+"""
+Globals
+-----
+"""
+#the dgen.py flag combinations: -u or not, then -s, -s -r or neither
+DISTRIBUTIONS = ['unique-random', 'unique-sorted', 'unique-reversed',
+                 'repeats-random', 'repeats-sorted', 'repeats-reversed']
+
+
+"""
+Helper Function(s)
+-----
+"""
+def _make_runs(runCount, numCount, layout = 'interleaved'):
+    """
+    This helper function builds sorted runs of zero padded lines like dgen.py makes.
+
+    args:
+        -runCount (int): how many runs to make
+        -numCount (int): how many lines in total across all the runs
+        -layout (string): 'interleaved' draws every run from the whole key range,
+                            'disjoint' gives each run its own slice of it
+
+    return:
+        -list: list of sorted lists of lines
+    """
+    perRun = max(1, numCount // runCount)
+    span = 99999999 // runCount
+
+    runs = []
+    for r in range(runCount):
+        if layout == 'disjoint':
+            low, high = r * span + 1, (r + 1) * span
+        else:
+            low, high = 1, 99999999
+        runs.append(sorted(str(random.randint(low, high)).zfill(8) + '\n' for _ in range(perRun)))
+
+    #shuffle so the run order does not give the answer away
+    random.shuffle(runs)
+    return runs
+
+
+def _make_lines(numCount):
+    """
+    This helper function builds unsorted zero padded lines like dgen.py makes.
+
+    args:
+        -numCount (int): how many lines to make
+
+    return:
+        -list: the lines
+    """
+    return [str(random.randint(1, 99999999)).zfill(8) + '\n' for _ in range(numCount)]
+
+
+def _make_distribution(name, numCount):
+    """
+    This helper function builds lines the way dgen.py does for one of its flag combinations.
+
+    args:
+        -name (string): one of DISTRIBUTIONS
+        -numCount (int): how many lines to make
+
+    return:
+        -list: the lines
+    """
+    unique, order = name.split('-')
+
+    if unique == 'unique':
+        numbers = list(range(numCount))
+        if order == 'random':
+            random.shuffle(numbers)
+    else:
+        numbers = [random.randint(1, 99999999) for _ in range(numCount)]
+        if order != 'random':
+            numbers.sort()
+
+    if order == 'reversed':
+        numbers.reverse()
+
+    return [str(i).zfill(8) + '\n' for i in numbers]
+
+
+def _time_it(func):
+    """
+    This helper function times a call.
+
+    args:
+        -func (callable): the thing to time
+
+    return:
+        -tuple: (seconds, return value)
+    """
+    start = time.time()
+    result = func()
+    return time.time() - start, result
+
+
+"""
+Benchmarks
+-----
+"""
+def bench_merge(runCounts, numCount, layout = 'interleaved'):
+    """
+    This function times every merge strategy in FileMonsters.SUTURE_PLANS
+    over the same runs and checks they all agree.
+
+    args:
+        -runCounts (list of ints): the k values to try
+        -numCount (int): how many lines in total per k
+        -layout (string): how keys are spread over the runs, see _make_runs()
+
+    return:
+        -list: list of (k, strategy name, seconds) tuples
+    """
+    results = []
+    for k in runCounts:
+        runs = _make_runs(k, numCount, layout)
+        expected = None
+
+        for name in sorted(FileMonsters.SUTURE_PLANS):
+            plan = FileMonsters.SUTURE_PLANS[name]()
+            seconds, merged = _time_it(lambda: list(plan.merge([iter(run) for run in runs])))
+
+            if expected is None:
+                expected = merged
+            assert merged == expected, '{0} merged k={1} differently'.format(name, k)
+
+            results.append((k, name, seconds))
+            print('merge k={0:<5} {1:<10} {2:>6} lines {3:8.3f}s {4:10.0f} lines/s'.format(
+                k, name, len(merged), seconds, len(merged) / max(seconds, 1e-9)))
+
+    return results
+
+
+def bench_sort(chunkSizes):
+    """
+    This function times every sort engine in Sorts.SORT_ENGINES on text and binary
+    chunks of each size and reports throughput and the speed up over qsort.
+
+    args:
+        -chunkSizes (list of ints): chunk sizes in bytes of text
+
+    return:
+        -list: list of (chunk size, record format, engine name, seconds) tuples
+    """
+    results = []
+    for chunkSize in chunkSizes:
+        lines = _make_lines(max(1, chunkSize // 9))
+        values = array.array(FileMonsters.UINT32, [int(line) for line in lines])
+        expected = sorted(lines)
+
+        for records, chunk, check in (('text', lines, expected),
+                                      ('binary', values, [int(line) for line in expected])):
+            baseline = None
+            for name in ['qsort'] + sorted(set(Sorts.SORT_ENGINES) - set(['qsort'])):
+                if name == 'numpy' and Sorts.numpy is None:
+                    print('sort numpy skipped, numpy is not installed')
+                    continue
+
+                engine = Sorts.SORT_ENGINES[name]()
+                sortIt = engine.sort_lines if records == 'text' else engine.sort_uint32
+                seconds, ordered = _time_it(lambda: sortIt(chunk[:]))
+                assert list(ordered) == check, '{0} sorted {1} wrong'.format(name, records)
+
+                if baseline is None:
+                    baseline = seconds
+                results.append((chunkSize, records, name, seconds))
+                print('sort {0:>10} bytes {1:<6} {2:<6} {3:8.3f}s {4:10.0f} MB/s x{5:.1f}'.format(
+                    chunkSize, records, name, seconds, chunkSize / max(seconds, 1e-9) / 1e6,
+                    baseline / max(seconds, 1e-9)))
+
+    return results
+
+
+def bench_qsort(numCount):
+    """
+    This function times qsort_inplace on every dgen.py distribution, with the
+    builtin sorted() alongside for scale.
+
+    args:
+        -numCount (int): how many lines to sort per distribution
+
+    return:
+        -list: list of (distribution, seconds) tuples
+    """
+    results = []
+    for name in DISTRIBUTIONS:
+        lines = _make_distribution(name, numCount)
+        builtinSeconds, expected = _time_it(lambda: sorted(lines))
+
+        chunk = lines[:]
+        seconds, _ = _time_it(lambda: Sorts.qsort_inplace(chunk, 0, len(chunk) - 1))
+        assert chunk == expected, 'qsort_inplace sorted {0} wrong'.format(name)
+
+        results.append((name, seconds))
+        print('qsort {0:<17} {1:>8} lines {2:8.3f}s {3:10.0f} lines/s (sorted() {4:.3f}s)'.format(
+            name, numCount, seconds, numCount / max(seconds, 1e-9), builtinSeconds))
+
+    return results
+
+
+"""
+MAIN
+-----
+"""
+def main(args):
+    """
+    This main function runs the requested benchmark from the command line.
+
+    args:
+        args (dict): incoming command line arguments
+
+    return:
+        -N/A
+    """
+    random.seed(args.seed)
+
+    if args.bench == 'merge':
+        bench_merge(args.runCounts, args.numCount, args.layout)
+    elif args.bench == 'sort':
+        bench_sort(args.chunkSizes)
+    elif args.bench == 'qsort':
+        bench_qsort(args.numCount)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='This tool times the parts of the external sort.')
+    parser.add_argument('bench',
+                                    action='store',
+                                    choices=['merge', 'sort', 'qsort'],
+                                    help='Which benchmark to run.')
+    parser.add_argument('-k', '--runs',
+                                    dest='runCounts',
+                                    action='store',
+                                    type=int,
+                                    nargs='+',
+                                    default=[10, 100, 1000],
+                                    help='Run counts to merge.')
+    parser.add_argument('-l', '--layout',
+                                    dest='layout',
+                                    action='store',
+                                    choices=['interleaved', 'disjoint'],
+                                    default='interleaved',
+                                    help='Spread merge keys over every run or give each run its own range.')
+    parser.add_argument('-c', '--chunksizes',
+                                    dest='chunkSizes',
+                                    action='store',
+                                    type=int,
+                                    nargs='+',
+                                    default=[65536, 1048576, 8388608],
+                                    help='Chunk sizes in bytes to sort.')
+    parser.add_argument('-z', '--datalength',
+                                    dest='numCount',
+                                    action='store',
+                                    type=int,
+                                    default=100000,
+                                    help='Number of lines to use per benchmark.')
+    parser.add_argument('--seed',
+                                    dest='seed',
+                                    action='store',
+                                    type=int,
+                                    default=4040,
+                                    help='Seed for the random data.')
+    args = parser.parse_args()
+
+    main(args)
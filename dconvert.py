@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+This script converts data files between the two record formats.
+
+- text: zero padded 8 digit numbers, one per line, like dgen.py makes
+
+- binary: little-endian uint32 records, like dgen.py --binary makes
+
+Both directions stream a block at a time so files bigger than ram can be converted.
+
+---------
+Contains:
+---------
+    +text_to_binary(inFileName, outFileName, blockSize)
+    +binary_to_text(inFileName, outFileName, blockSize)
+    +main(args)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started.
+"""
+import argparse
+import array
+import time
+
+import FileMonsters
+
+
+def text_to_binary(inFileName, outFileName, blockSize):
+    """
+    This function packs a file of numeric lines into uint32 records.
+
+    args:
+        -inFileName (string): the text file to read
+        -outFileName (string): the binary file to write
+        -blockSize (int): about how many bytes of lines to convert at a time
+
+    return:
+        -int: the number of records written
+    """
+    count = 0
+    with open(inFileName) as inFile:
+        with open(outFileName, 'wb') as outFile:
+            while True:
+                lines = inFile.readlines(blockSize)
+                if not lines:
+                    break
+
+                outFile.write(FileMonsters.uint32_bytes(
+                    array.array(FileMonsters.UINT32, map(int, lines))))
+                count += len(lines)
+
+    return count
+
+
+def binary_to_text(inFileName, outFileName, blockSize):
+    """
+    This function unpacks uint32 records into zero padded numeric lines.
+
+    args:
+        -inFileName (string): the binary file to read
+        -outFileName (string): the text file to write
+        -blockSize (int): about how many bytes of records to convert at a time
+
+    return:
+        -int: the number of records written
+    """
+    #keep blocks on a record boundary
+    blockSize = max(4, blockSize - blockSize % 4)
+
+    count = 0
+    with open(inFileName, 'rb') as inFile:
+        with open(outFileName, 'w') as outFile:
+            while True:
+                data = inFile.read(blockSize)
+                if not data:
+                    break
+
+                values = FileMonsters.uint32_array(data)
+                outFile.write(''.join(['%08d\n' % i for i in values]))
+                count += len(values)
+
+    return count
+
+
+"""
+MAIN
+-----
+"""
+def main(args):
+    """
+    This main function serves as a way to convert data files from the command line.
+
+    args:
+        args (dict): incoming command line arguments
+
+    return:
+        -N/A
+    """
+    start_time = time.time()
+
+    if args.toFormat == 'binary':
+        count = text_to_binary(args.inFileName, args.outFileName, args.blockSize)
+    else:
+        count = binary_to_text(args.inFileName, args.outFileName, args.blockSize)
+
+    print('--- converted {0} records in {1} seconds ---'.format(count, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='This tool converts data files between text lines and binary uint32 records.')
+    parser.add_argument('-t', '--to', dest='toFormat', action='store', choices=['text', 'binary'], help='The format to convert to.')
+    parser.add_argument('-i', '--in', dest='inFileName', action='store', type=str, help='The name of the input file')
+    parser.add_argument('-o', '--out', dest='outFileName', action='store', type=str, help='The name of the output file')
+    parser.add_argument('-c', '--blocksize', dest='blockSize', action='store', type=int, default=4194304, help='Bytes to convert at a time.')
+    args = parser.parse_args()
+
+    if not args.toFormat:
+        parser.error('You must tell us which format to convert to. use -t/--to')
+
+    if not args.inFileName or not args.outFileName:
+        parser.error('You must supply an input and output file name, use -i/--in and -o/--out')
+
+    main(args)
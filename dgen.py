@@ -17,96 +17,550 @@ Numeric data can be generated as:
 
 - reverse sorted data with possible repetitions
 
+With -d/--distribution the data can instead be shaped the way that hurts sorts:
+- nearly-sorted: ascending 0..n-1 with --perturb percent of records swapped for a random value
+- organ-pipe: up to the middle, then back down
+- sawtooth: ascending runs of --period records
+- few-unique: --distinct values drawn evenly
+- zipf: ranks 1..--distinct drawn with Zipf skew --zipf-s, so a few values are most of the data
+- qsort-killer: --period record tiles ordered so Sorts.qsort_inplace picks the worst pivot
+  every time, found by running it against McIlroy's adversary
+
 The data can be sent to a file outputed by the script for use with command line.
+With --binary the numbers are written as little-endian uint32 records instead of lines.
+Each file gets a .meta.json sidecar with its distribution, parameters, seed, record count
+and sha256, so sort timings can be tracked per workload.
+
+Records are made a block at a time, so memory use does not grow with the data:
+- unique data is the index space 0..n-1, shuffled by a keyed Feistel permutation
+- random data is drawn block by block from a generator seeded by --seed and the block
+- sorted random data is the order statistics of uniform draws. The block edges come
+  from sums of exponential gaps, drawn up front, and each block fills in its own edges
+
+Every record has the same width, so --jobs processes can each write their own blocks
+straight to their place in the file, and the file is the same for any number of jobs.
 
 Contains
 -----------
+    +main(args)
+    -_plan(args)
+    -_block_range(plan, block)
+    -_block_values(plan, block)
+    -_shape_values(plan, block, start, stop)
+    -_encode_block(plan, values)
+    -_write_blocks(plan, outFileName, blocks)
+    -_feistel_keys(seed)
+    -_permute(index, count, halfBits, keys)
+    -_zipf_cdf(distinct, exponent)
+    -_qsort_killer(size)
+    -_write_metadata(plan, outFileName)
 
 ----------------
 CHANGE LOG
 ----------------
     -06/29/17 - started
+    -10/17/26 - Added --binary for uint32 records.
+    -10/17/26 - Records are made and written a block at a time instead of all at once.
+                    Unique shuffles are a Feistel permutation. Added --seed and --jobs,
+                    and -p now streams to stdout. Random data is exactly -z records, not
+                    one more, and unique lines are widened past 8 digits when needed.
+    -10/17/26 - Added -d/--distribution for nearly sorted, organ pipe, sawtooth, few unique,
+                    zipf and qsort killer data, and the .meta.json sidecar.
 """
 import logging
 import argparse
 import array
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
 import random
+import sys
 import time
 
+import Sorts
+
+#how many records are made and written at a time
+_BLOCK = 1 << 16
+
+#range of the numbers in data with repetitions
+_LOW = 1
+_HIGH = 99999999
+
+#digits in a line, more if unique data needs them
+_MIN_DIGITS = 8
+
+#Feistel rounds for the unique shuffle
+_ROUNDS = 4
+
+_MASK64 = (1 << 64) - 1
+
+_UINT32 = 'I' if array.array('I').itemsize == 4 else 'L'
+
+#data shapes for -d, uniform is the -u, -s and -r data
+DISTRIBUTIONS = ['uniform', 'nearly-sorted', 'organ-pipe', 'sawtooth', 'few-unique', 'zipf',
+                 'qsort-killer']
+
+#defaults of the shape parameters, distinct is picked per shape when None
+PARAM_DEFAULTS = {'perturb': 1.0, 'period': 65536, 'distinct': None, 'zipfExponent': 1.1}
+
+#distinct values when --distinct is not given
+_DEFAULT_DISTINCT = {'few-unique': 16, 'zipf': 100000}
+
+#the plan entries that describe each shape, for the metadata
+_SHAPE_PARAMS = {'uniform': ['unique', 'sort', 'reverse'],
+                 'nearly-sorted': ['perturb'],
+                 'organ-pipe': [],
+                 'sawtooth': ['period'],
+                 'few-unique': ['distinct'],
+                 'zipf': ['distinct', 'zipfExponent'],
+                 'qsort-killer': ['period']}
+
+#added to the output file name for the metadata sidecar
+META_SUFFIX = '.meta.json'
+
+#zipf cumulative weights by (distinct, exponent), made once per process
+_zipfTables = {}
+
+
+def _plan(args):
+    """
+    This helper function works out everything the blocks need to be made on their own.
+    It is a plain dict so it can be handed to --jobs processes.
+
+    args:
+        -args (argparse.Namespace): the parsed arguments
+
+    return:
+        -dict: the plan
+    """
+    count = args.numCount
+    shape = args.distribution
+    plan = {'count': count, 'unique': args.do_unique, 'sort': args.do_sort,
+            'reverse': args.do_reverse, 'binary': args.do_binary, 'seed': args.seed,
+            'blocks': (count + _BLOCK - 1) // _BLOCK, 'distribution': shape,
+            'perturb': args.perturb, 'period': min(args.period, count),
+            'distinct': args.distinct or _DEFAULT_DISTINCT.get(shape),
+            'zipfExponent': args.zipfExponent}
+
+    #the biggest number decides the line width
+    period = plan['period']
+    largest = {'uniform': count - 1 if args.do_unique else _HIGH,
+               'nearly-sorted': count - 1,
+               'organ-pipe': (count - 1) // 2,
+               'sawtooth': period - 1,
+               'few-unique': (plan['distinct'] or 1) - 1,
+               'zipf': plan['distinct'],
+               'qsort-killer': (count - 1) // period * period + period - 1}[shape]
+
+    if args.do_binary:
+        if largest >= 1 << 32:
+            raise ValueError('{0} does not fit in a uint32 record'.format(largest))
+        plan['width'] = 4
+    else:
+        plan['width'] = max(_MIN_DIGITS, len(str(max(largest, 0)))) + 1
+
+    if shape == 'qsort-killer':
+        plan['pattern'] = _qsort_killer(period)
+
+    if shape != 'uniform':
+        return plan
+
+    if args.do_unique and not args.do_sort:
+        plan['halfBits'] = (max(count - 1, 1).bit_length() + 1) // 2
+        plan['keys'] = _feistel_keys(args.seed)
+
+    if not args.do_unique and args.do_sort:
+        #S_i, the sum of i exponential gaps, over S_n+1 are n sorted uniform draws.
+        #Only the sums at block edges are kept; a block with size records spans a
+        #gamma(size) gap
+        rng = random.Random('{0}:edges'.format(args.seed))
+        edges = [0.0]
+        for block in range(plan['blocks']):
+            start, stop = _block_range(plan, block)
+            edges.append(edges[-1] + rng.gammavariate(stop - start, 1.0))
+        total = edges[-1] + rng.expovariate(1.0)
+        plan['edges'] = [edge / total for edge in edges]
+
+    return plan
+
+
+def _block_range(plan, block):
+    """
+    This helper function gets which records, in ascending order, a block holds.
+
+    args:
+        -plan (dict): from _plan()
+        -block (int): the block number
+
+    return:
+        -tuple: (first record, one past the last record)
+    """
+    return block * _BLOCK, min((block + 1) * _BLOCK, plan['count'])
+
+
+def _block_values(plan, block):
+    """
+    This helper function makes the numbers of one block. Reversed data is the ascending
+    block reversed; _write_blocks() puts it in its mirrored place.
+
+    args:
+        -plan (dict): from _plan()
+        -block (int): the block number
+
+    return:
+        -list: the numbers in the order to write them
+    """
+    start, stop = _block_range(plan, block)
+    span = _HIGH - _LOW + 1
+
+    if plan['distribution'] != 'uniform':
+        values = _shape_values(plan, block, start, stop)
+    elif plan['unique'] and plan['sort']:
+        values = list(range(start, stop))
+    elif plan['unique']:
+        count, halfBits, keys = plan['count'], plan['halfBits'], plan['keys']
+        values = [_permute(index, count, halfBits, keys) for index in range(start, stop)]
+    elif plan['sort']:
+        #given the edges, the draws inside a block are sorted uniforms and the last one
+        #is the edge itself
+        rng = random.Random('{0}:{1}'.format(plan['seed'], block))
+        low, high = plan['edges'][block], plan['edges'][block + 1]
+        draws = sorted(low + (high - low) * rng.random() for _ in range(stop - start - 1))
+        draws.append(high)
+        values = [min(_LOW + int(draw * span), _HIGH) for draw in draws]
+    else:
+        draw = random.Random('{0}:{1}'.format(plan['seed'], block)).random
+        values = [_LOW + int(draw() * span) for _ in range(stop - start)]
+
+    if plan['reverse']:
+        values.reverse()
+    return values
+
+
+def _shape_values(plan, block, start, stop):
+    """
+    This helper function makes the numbers of one block of a -d shape.
+
+    args:
+        -plan (dict): from _plan()
+        -block (int): the block number
+        -start (int): the first record of the block
+        -stop (int): one past the last record of the block
+
+    return:
+        -list: the numbers in the order to write them
+    """
+    shape = plan['distribution']
+    draw = random.Random('{0}:{1}'.format(plan['seed'], block)).random
+
+    if shape == 'nearly-sorted':
+        count, chance = plan['count'], plan['perturb'] / 100.0
+        return [int(draw() * count) if draw() < chance else i for i in range(start, stop)]
+
+    if shape == 'organ-pipe':
+        last = plan['count'] - 1
+        return [min(i, last - i) for i in range(start, stop)]
+
+    if shape == 'sawtooth':
+        period = plan['period']
+        return [i % period for i in range(start, stop)]
+
+    if shape == 'few-unique':
+        distinct = plan['distinct']
+        return [int(draw() * distinct) for _ in range(start, stop)]
+
+    if shape == 'zipf':
+        cdf = _zipf_cdf(plan['distinct'], plan['zipfExponent'])
+        total = cdf[-1]
+        return [bisect.bisect_left(cdf, draw() * total) + 1 for _ in range(start, stop)]
+
+    #qsort-killer: every tile is the same adversarial order, shifted past the last tile
+    pattern = plan['pattern']
+    period = len(pattern)
+    return [i - i % period + pattern[i % period] for i in range(start, stop)]
+
+
+def _encode_block(plan, values):
+    """
+    This helper function turns numbers into zero padded lines or little-endian uint32s.
+
+    args:
+        -plan (dict): from _plan()
+        -values (list): the numbers
+
+    return:
+        -bytes: the block as it goes in the file
+    """
+    if not plan['binary']:
+        line = '%0{0}d\n'.format(plan['width'] - 1)
+        return ''.join([line % value for value in values]).encode('ascii')
+
+    block = array.array(_UINT32, values)
+    if sys.byteorder == 'big':
+        block.byteswap()
+    return block.tobytes() if hasattr(block, 'tobytes') else block.tostring()
+
+
+def _write_blocks(plan, outFileName, blocks):
+    """
+    This helper function writes some of the blocks to their place in the file. The file
+    must already be its full size. This is what each --jobs process runs.
+
+    args:
+        -plan (dict): from _plan()
+        -outFileName (string): the file to write
+        -blocks (range): the block numbers to write
+
+    return:
+        -N/A
+    """
+    with open(outFileName, 'r+b') as file:
+        for block in blocks:
+            start, stop = _block_range(plan, block)
+            if plan['reverse']:
+                start = plan['count'] - stop
+
+            file.seek(start * plan['width'])
+            file.write(_encode_block(plan, _block_values(plan, block)))
+
+
+def _feistel_keys(seed):
+    """
+    This helper function makes the round keys of the unique shuffle.
+
+    args:
+        -seed (int): the --seed
+
+    return:
+        -list of ints: one key per round
+    """
+    rng = random.Random('{0}:feistel'.format(seed))
+    return [rng.getrandbits(64) for _ in range(_ROUNDS)]
+
+
+def _permute(index, count, halfBits, keys):
+    """
+    This helper function shuffles one index. A Feistel network is a bijection on
+    2*halfBits bit numbers whatever its round function; indexes it sends to count or
+    past are sent through again until they land inside, which keeps it a bijection on
+    0..count-1. The domain is under 4 times count, so that takes few goes.
+
+    args:
+        -index (int): the index, 0..count-1
+        -count (int): how many indexes there are
+        -halfBits (int): bits in each half of the domain
+        -keys (list of ints): the round keys
+
+    return:
+        -int: where the index goes, 0..count-1
+    """
+    mask = (1 << halfBits) - 1
+    while True:
+        left, right = index >> halfBits, index & mask
+        for key in keys:
+            mixed = ((right ^ key) * 0x9E3779B97F4A7C15) & _MASK64
+            mixed ^= mixed >> 29
+            left, right = right, left ^ (mixed & mask)
+        index = (left << halfBits) | right
+        if index < count:
+            return index
+
+
+def _zipf_cdf(distinct, exponent):
+    """
+    This helper function gets the cumulative weights of ranks 1..distinct, where rank r
+    weighs 1 / r ** exponent.
+
+    args:
+        -distinct (int): how many ranks
+        -exponent (float): the skew
+
+    return:
+        -list of floats: the running total of the weights
+    """
+    key = (distinct, exponent)
+    if key not in _zipfTables:
+        total = 0.0
+        cdf = []
+        for rank in range(1, distinct + 1):
+            total += rank ** -exponent
+            cdf.append(total)
+        _zipfTables[key] = cdf
+    return _zipfTables[key]
+
+
+def _qsort_killer(size):
+    """
+    This helper function finds an order of 0..size-1 that makes Sorts.qsort_inplace pick
+    bad pivots, with McIlroy's adversary ("A Killer Adversary for Quicksort"). The sort
+    is run on records that have no value yet. When two valueless records are compared
+    one of them is given the next smallest value, and it is the one most likely to be
+    the pivot, so the pivot always ends up near the bottom of its range. The values
+    given make an input that gets the same treatment.
+
+    args:
+        -size (int): how many records
+
+    return:
+        -list of ints: the value of each record
+    """
+    gas = size
+    values = [gas] * size
+    state = {'solid': 0, 'candidate': 0}
+
+    class _Adversary(object):
+        __slots__ = ('index',)
+
+        def __init__(self, index):
+            self.index = index
+
+        def __lt__(self, other):
+            x, y = self.index, other.index
+            if values[x] == gas and values[y] == gas:
+                frozen = x if x == state['candidate'] else y
+                values[frozen] = state['solid']
+                state['solid'] += 1
+
+            if values[x] == gas:
+                state['candidate'] = x
+            elif values[y] == gas:
+                state['candidate'] = y
+            return values[x] < values[y]
+    #END INNER CLASS
+
+    Sorts.qsort_inplace([_Adversary(i) for i in range(size)], 0)
+
+    #records never told apart can go in any order
+    for i in range(size):
+        if values[i] == gas:
+            values[i] = state['solid']
+            state['solid'] += 1
+    return values
+
+
+def _write_metadata(plan, outFileName):
+    """
+    This helper function writes the sidecar that says what is in a generated file.
+
+    args:
+        -plan (dict): from _plan()
+        -outFileName (string): the generated file
+
+    return:
+        -dict: the metadata
+    """
+    digest = hashlib.sha256()
+    with open(outFileName, 'rb') as file:
+        for data in iter(lambda: file.read(1 << 20), b''):
+            digest.update(data)
+
+    meta = {'distribution': plan['distribution'],
+            'params': dict((name, plan[name]) for name in _SHAPE_PARAMS[plan['distribution']]),
+            'seed': plan['seed'],
+            'records': plan['count'],
+            'format': 'binary' if plan['binary'] else 'text',
+            'recordBytes': plan['width'],
+            'bytes': os.path.getsize(outFileName),
+            'sha256': digest.hexdigest()}
+
+    with open(outFileName + META_SUFFIX, 'w') as metaFile:
+        json.dump(meta, metaFile, indent=2, sort_keys=True)
+    return meta
+
+
 def main(args):
     start_time = time.time()
-    
-    #create unique data
-    if args.do_unique:
-        #sequence becuae it is an already sorted value
-        a = array.array('I', xrange(args.numCount))
-        
-        #create sorted data
-        if args.do_sort:
-            #create reversed sorted data
-            if args.do_reverse:
-                with open(args.outFileName, 'w') as file:
-                    for i in list(reversed(a)):
-                        file.write(str(i).zfill(8) + '\n')
-            #create ascending sorted data
-            else:
-                with open(args.outFileName, 'w') as file:
-                    for i in a:
-                        file.write(str(i).zfill(8) + '\n')
-        #create random unique order data
-        else:
-            random.shuffle(a)
-            with open(args.outFileName, 'w') as file:
-                    for i in a:
-                        file.write(str(i).zfill(8) + '\n')
-    
-    #create random data
+    #the data gets stdout with -p
+    report = sys.stderr if args.do_print else sys.stdout
+
+    if args.seed is None:
+        args.seed = random.getrandbits(32)
+
+    plan = _plan(args)
+
+    meta = None
+    if args.do_print:
+        stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        for block in range(plan['blocks'] - 1, -1, -1) if plan['reverse'] else range(plan['blocks']):
+            stdout.write(_encode_block(plan, _block_values(plan, block)))
+        stdout.flush()
     else:
-        a = []
-        current = 0
-        while current <= args.numCount:
-                #generate a random number
-                rand = random.randint(1, 99999999)
-                a.append(rand)
-                current += 1
-        
-        if args.do_sort:
-            a.sort()
-            if args.do_reverse:
-                with open(args.outFileName, 'w') as file:
-                    for i in list(reversed(a)):
-                        file.write(str(i).zfill(8) + '\n')
-            else:
-                with open(args.outFileName, 'w') as file:
-                    for i in a:
-                        file.write(str(i).zfill(8) + '\n')
-        
+        with open(args.outFileName, 'wb') as file:
+            file.truncate(plan['count'] * plan['width'])
+
+        #every job gets a run of blocks
+        jobs = max(1, min(args.jobs, plan['blocks']))
+        parts = [range(plan['blocks'] * job // jobs, plan['blocks'] * (job + 1) // jobs)
+                 for job in range(jobs)]
+        if jobs == 1:
+            _write_blocks(plan, args.outFileName, parts[0])
         else:
-            with open(args.outFileName, 'w') as file:
-                    for i in a:
-                        file.write(str(i).zfill(8) + '\n')
-    
-    print("--- %s seconds ---" % (time.time() - start_time))
-    print(args)
-    
+            workers = [multiprocessing.Process(target=_write_blocks,
+                                               args=(plan, args.outFileName, part))
+                       for part in parts]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            failed = [worker.exitcode for worker in workers if worker.exitcode]
+            if failed:
+                raise RuntimeError('{0} of {1} jobs failed'.format(len(failed), jobs))
+
+        meta = _write_metadata(plan, args.outFileName)
+
+    report.write("--- %s seconds ---\n" % (time.time() - start_time))
+    report.write('{0}\n'.format(args))
+    return meta
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='This tool generates large lists of numeric data')
     parser.add_argument('-u', '--Unique', dest='do_unique', action='store_true', help='Makes the data and unique (no repetitions).')
     parser.add_argument('-s', '--Sorted', dest='do_sort', action='store_true', help='Makes the sorted.')
     parser.add_argument('-r', '--Reversed', dest='do_reverse', action='store_true', help='Reverse data if --Sorted was used')
+    parser.add_argument('-b', '--binary', dest='do_binary', action='store_true', help='Write little-endian uint32 records instead of lines.')
     parser.add_argument('-p', '--print', dest='do_print', action='store_true', help='Print the data to stdout instead of to a file.')
     parser.add_argument('-z', '--datalength', dest='numCount', action='store', type=int, help='Number of numbers to generate')
     parser.add_argument('-o', '--out', dest='outFileName', action='store', type=str, help='The name of the output file')
+    parser.add_argument('-j', '--jobs', dest='jobs', action='store', type=int, default=1, help='Number of processes writing parts of the file.')
+    parser.add_argument('-d', '--distribution', dest='distribution', action='store', choices=DISTRIBUTIONS, default='uniform', help='Shape of the data. -u, -s and -r only go with uniform.')
+    parser.add_argument('--perturb', dest='perturb', action='store', type=float, default=PARAM_DEFAULTS['perturb'], help='Percent of nearly-sorted records replaced by a random value.')
+    parser.add_argument('--period', dest='period', action='store', type=int, default=PARAM_DEFAULTS['period'], help='Records per sawtooth run or qsort-killer tile. Match the records per chunk to hit every chunk sort.')
+    parser.add_argument('--distinct', dest='distinct', action='store', type=int, default=PARAM_DEFAULTS['distinct'], help='Number of values for few-unique (default 16) and zipf (default 100000).')
+    parser.add_argument('--zipf-s', dest='zipfExponent', action='store', type=float, default=PARAM_DEFAULTS['zipfExponent'], help='Zipf skew; rank r is drawn in proportion to 1 / r ** s.')
+    parser.add_argument('--seed', dest='seed', action='store', type=int, default=None, help='Seed for the data. The same seed makes the same file. Defaults to a random one.')
     args = parser.parse_args()
-    
+
     if args.do_reverse and not args.do_sort:
         parser.error('You can not reverse the data if it is not sorted. Use -r and -s together.')
-    
+
     if not args.numCount:
         parser.error('You must tell us how many numbers to generate. use -z/--datalength and a number')
-        
-    if not args.outFileName:
+
+    if not args.outFileName and not args.do_print:
         parser.error('You must supply an outfile name, use -o/--out')
-        
+
+    if args.jobs < 1:
+        parser.error('There must be at least one job. You asked for {0}'.format(args.jobs))
+
+    if args.do_print and args.jobs > 1:
+        parser.error('-p writes to stdout in order, so it can not use --jobs.')
+
+    if args.distribution != 'uniform' and (args.do_unique or args.do_sort):
+        parser.error('-u, -s and -r only apply to the uniform distribution.')
+
+    if not 0 <= args.perturb <= 100:
+        parser.error('--perturb is a percent. The one you provided was {0}'.format(args.perturb))
+
+    if args.period < 1 or (args.distinct is not None and args.distinct < 1):
+        parser.error('--period and --distinct must be at least 1.')
+
+    if args.zipfExponent <= 0:
+        parser.error('--zipf-s must be positive. The one you provided was {0}'.format(args.zipfExponent))
+
+    if args.do_binary and args.do_unique and args.numCount > 1 << 32:
+        parser.error('Unique binary data has at most {0} uint32 records.'.format(1 << 32))
+
     main(args)
-    
\ No newline at end of file
@@ -18,6 +18,9 @@ The steps to do this (asuming there is a single file with all the data) are as f
 Contains:
 ---------
     +main(args)
+    -_parse_size(text)
+    -_parse_range(text)
+    -_sort_to_stdout(externalSorter)
 
 ----------
 CHANGE LOG
@@ -27,13 +30,47 @@ CHANGE LOG
                     Sorts.py. Also improved qsort_inplace() with a wrapper function.
                     Renamed this file to sort_bigfile.py.
     -08/06/17 - Finished main
+    -10/17/26 - Added -m/--merge to pick the merge strategy.
+    -10/17/26 - Added -j/--jobs to sort chunks with a process pool.
+    -10/17/26 - Added -t/--format to sort binary uint32 files.
+    -10/17/26 - Added -e/--engine to pick the chunk sort engine.
+    -10/17/26 - Added -k/--fanin to cap how many chunk files are merged at once.
+    -10/17/26 - Added -r/--runs to pick replacement selection run generation.
+    -10/17/26 - Added --readahead and --writebehind for background merge I/O.
+    -10/17/26 - Added --stats to dump the run's numbers as JSON.
+    -10/17/26 - The run's numbers are logged as JSON after the timing line. Added --count-ops,
+                    --profile for cProfile and --tracemalloc for peak python memory.
+    -10/17/26 - Added --memory. A budget like 512M picks the chunk size and fan-in.
+    -10/17/26 - Added --encoding to compress the chunk and merge files.
+    -10/17/26 - Added --resume to carry on a sort that died from its journal.
+    -10/17/26 - Added -o/--output. -f - sorts stdin and -o - writes to stdout, which moves
+                    the program's own prints to stderr.
+    -10/17/26 - Added --key and --key-width to sort text by int, float or prefix keys.
+    -10/17/26 - Added --unique and --count to drop or count duplicate records.
+    -10/17/26 - Added --merge-jobs to merge key ranges in parallel.
+    -10/17/26 - Files already in order are copied instead of sorted. Added --no-adaptive to
+                    always sort, and --link to hard link a sorted file to the output.
+    -10/17/26 - Added --top, --bottom and --range to write only the smallest or largest
+                    records or a key range, picked out in one read of the file.
+    -10/17/26 - Added --index to write a sparse index of the output next to it for lookups.
+    -10/17/26 - A --memory budget too small to sort with is a usage error giving the least
+                    budget that works.
 """
 import argparse
+import cProfile
 import logging
+import json
 import sys
 import os
 
-from Sorts import ExternSort
+#tracemalloc is python 3.4+, --tracemalloc is refused without it
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from Sorts import ExternSort, SORT_ENGINES
+from FileMonsters import SUTURE_PLANS, RECORD_FORMATS, RUN_ENCODINGS, KEY_TYPES, MemoryPlanner
 
 """
 Logging
@@ -43,6 +80,79 @@ Logging
 LOG_FILENAME = 'sort.log'
 logging.basicConfig(filename=LOG_FILENAME,level=logging.DEBUG,format='%(levelname)s - %(asctime)s - %(message)s')
 
+#the name that means stdin for -f and stdout for -o
+STREAM_NAME = '-'
+
+#bytes packed per write when the sorted records go to stdout
+STDOUT_BUFFER_SIZE = 1 << 20
+
+
+"""
+Helper Function(s)
+-----
+"""
+def _parse_size(text):
+    """
+    This helper function reads a size in bytes with an optional K, M or G suffix.
+
+    args:
+        -text (string): the size, like 512M
+
+    return:
+        -int: bytes
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+    text = text.strip().upper().rstrip('B')
+    scale = 1
+    if text and text[-1] in units:
+        scale = units[text[-1]]
+        text = text[:-1]
+
+    try:
+        return int(float(text) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError('{0} is not a size, try something like 512M'.format(text))
+
+
+def _parse_range(text):
+    """
+    This helper function reads a key range given as LO:HI. Records from LO up to but
+    not including HI are kept, and either side can be left empty for no bound.
+
+    args:
+        -text (string): the range, like 100:200 or abc:
+
+    return:
+        -tuple: (low, high), strings or None
+    """
+    if ':' not in text:
+        raise argparse.ArgumentTypeError('{0} is not a range, try something like 100:200'.format(text))
+
+    low, _, high = text.partition(':')
+    return low or None, high or None
+
+
+def _sort_to_stdout(externalSorter):
+    """
+    This helper function runs the external sort and writes the records of the last
+    merge straight to stdout instead of to an output file.
+
+    args:
+        -externalSorter (ExternSort): the sort to run
+
+    return:
+        -N/A
+    """
+    #prints were moved to stderr, the real stdout only gets the records
+    stdout = sys.__stdout__
+    if externalSorter.records != 'text':
+        stdout = getattr(stdout, 'buffer', stdout)
+
+    records = externalSorter.record_format()
+    records.write_merged(externalSorter.sorted_records(), stdout, STDOUT_BUFFER_SIZE)
+    stdout.flush()
+
 
 """
 MAIN
@@ -59,13 +169,56 @@ def main(args):
     return:
         -N/A
     """
+    #stdin is read as it comes, binary records as bytes
+    victim = args.filename
+    if victim == STREAM_NAME:
+        victim = sys.stdin
+        if args.records != 'text':
+            victim = getattr(sys.stdin, 'buffer', sys.stdin)
+
+    target = None if args.output == STREAM_NAME else args.output
+
     #set up the external sort
-    externalSorter = ExternSort(args.filename, args.sizePerChunk)
+    externalSorter = ExternSort(victim, chunkSize=args.sizePerChunk, suture=args.suture,
+                                workers=args.workers, records=args.records, engine=args.engine,
+                                fanIn=args.fanIn, runMode=args.runMode, readAhead=args.readAhead,
+                                writeBehind=args.writeBehind, countOps=args.countOps,
+                                memory=args.memory, encoding=args.encoding, resume=args.resume,
+                                target=target, key=args.key, keyWidth=args.keyWidth,
+                                duplicates=args.duplicates, mergeWorkers=args.mergeWorkers,
+                                adaptive=args.adaptive, linkSorted=args.linkSorted,
+                                top=args.top or args.bottom, largest=args.bottom is not None,
+                                keyRange=args.keyRange, indexEvery=args.indexEvery)
+    run = externalSorter.run_extern_sort
+    if target is None:
+        run = lambda: _sort_to_stdout(externalSorter)
+
+    if args.traceMemory:
+        tracemalloc.start()
+
+    #run the external sort, under the profiler if asked. Only this process is profiled,
+    #-j workers are not
+    if args.profileFile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run)
+        profiler.dump_stats(args.profileFile)
+    else:
+        run()
+
+    stats = externalSorter.get_stats()
+    if args.traceMemory:
+        current, peak = tracemalloc.get_traced_memory()
+        stats['tracedMemory'] = {'currentBytes': current, 'peakBytes': peak}
+        for line in tracemalloc.take_snapshot().statistics('lineno')[:10]:
+            logging.info('tracemalloc: {0}'.format(line))
+        tracemalloc.stop()
 
-    #run the external sort
-    externalSorter.run_extern_sort()
-    
     logging.info('{0}'.format(externalSorter.get_timeing_info()))
+    logging.info(json.dumps(stats, sort_keys=True))
+
+    if args.statsFile:
+        with open(args.statsFile, 'w') as statsHandle:
+            json.dump(stats, statsHandle, indent=2, sort_keys=True)
 
 
 if __name__ == '__main__':
@@ -81,20 +234,233 @@ if __name__ == '__main__':
                                     action='store',
                                     type=str,
                                     default='data.dat',
-                                    help='The name of the data file. must be ".dat"')
+                                    help='The name of the data file. must be ".dat", or - for stdin')
+    parser.add_argument('-o', '--output',
+                                    dest='output',
+                                    action='store',
+                                    type=str,
+                                    default=None,
+                                    help='Where to write the sorted file, - for stdout. Defaults to the '\
+                                        'data file name plus ".sorted.out", or stdout for stdin.')
     parser.add_argument('-c', '--chunksize',
                                     dest='sizePerChunk',
                                     action='store',
                                     type=int,
                                     default=209715200,
                                     help='Size to make each chun in bytes.')
-
+    parser.add_argument('-m', '--merge',
+                                    dest='suture',
+                                    action='store',
+                                    type=str,
+                                    choices=sorted(SUTURE_PLANS),
+                                    default='heap',
+                                    help='How to merge the sorted chunk files back together.')
+    parser.add_argument('-j', '--jobs',
+                                    dest='workers',
+                                    action='store',
+                                    type=int,
+                                    default=1,
+                                    help='Number of processes sorting chunks while splitting.')
+    parser.add_argument('-t', '--format',
+                                    dest='records',
+                                    action='store',
+                                    type=str,
+                                    choices=sorted(RECORD_FORMATS),
+                                    default='text',
+                                    help='Record format of the data file, text lines or binary uint32s.')
+    parser.add_argument('--merge-jobs',
+                                    dest='mergeWorkers',
+                                    action='store',
+                                    type=int,
+                                    default=1,
+                                    help='Number of processes merging key ranges side by side. Merges with --encoding or --count stay in one process.')
+    parser.add_argument('--no-adaptive',
+                                    dest='adaptive',
+                                    action='store_false',
+                                    help='Always sort, even a file or chunks that are already in order.')
+    parser.add_argument('--link',
+                                    dest='linkSorted',
+                                    action='store_true',
+                                    help='Hard link a file that is already in order to the output instead of copying it.')
+    parser.add_argument('-e', '--engine',
+                                    dest='engine',
+                                    action='store',
+                                    type=str,
+                                    choices=sorted(SORT_ENGINES),
+                                    default='qsort',
+                                    help='How to sort each chunk. numpy falls back to qsort if missing.')
+    parser.add_argument('-k', '--fanin',
+                                    dest='fanIn',
+                                    action='store',
+                                    type=int,
+                                    default=None,
+                                    help='Most chunk files to merge at once. More are merged in passes.')
+    parser.add_argument('-r', '--runs',
+                                    dest='runMode',
+                                    action='store',
+                                    type=str,
+                                    choices=['chunk', 'replacement'],
+                                    default='chunk',
+                                    help='Make one run per chunk, or longer runs with replacement selection.')
+    parser.add_argument('--readahead',
+                                    dest='readAhead',
+                                    action='store',
+                                    type=int,
+                                    default=0,
+                                    help='Blocks to prefetch per chunk file on a background thread while merging.')
+    parser.add_argument('--stats',
+                                    dest='statsFile',
+                                    action='store',
+                                    type=str,
+                                    default=None,
+                                    help='Write the run\'s timings and sizes to this file as JSON.')
+    parser.add_argument('--writebehind',
+                                    dest='writeBehind',
+                                    action='store',
+                                    type=int,
+                                    default=0,
+                                    help='Merged blocks to queue for a background writer thread.')
+    parser.add_argument('--memory',
+                                    dest='memory',
+                                    action='store',
+                                    type=_parse_size,
+                                    default=None,
+                                    help='Memory budget, like 512M or 2G. Picks the chunk size and fan-in, -c is ignored.')
+    parser.add_argument('--encoding',
+                                    dest='encoding',
+                                    action='store',
+                                    type=str,
+                                    choices=['none'] + sorted(RUN_ENCODINGS),
+                                    default='none',
+                                    help='How to store the chunk and merge files. delta is for numeric keys, zlib for anything.')
+    parser.add_argument('--resume',
+                                    dest='resume',
+                                    action='store_true',
+                                    help='Carry on from the journal a sort of the same file left if it died.')
+    parser.add_argument('--key',
+                                    dest='key',
+                                    action='store',
+                                    type=str,
+                                    choices=['line'] + KEY_TYPES,
+                                    default='line',
+                                    help='Sort text by the whole line, or by an int, float or prefix key parsed from each line.')
+    parser.add_argument('--key-width',
+                                    dest='keyWidth',
+                                    action='store',
+                                    type=int,
+                                    default=8,
+                                    help='Characters in a prefix key.')
+    duplicateGroup = parser.add_mutually_exclusive_group()
+    duplicateGroup.add_argument('--unique',
+                                    dest='duplicates',
+                                    action='store_const',
+                                    const='unique',
+                                    default='keep',
+                                    help='Keep one of each record (one of each key with --key).')
+    duplicateGroup.add_argument('--count',
+                                    dest='duplicates',
+                                    action='store_const',
+                                    const='count',
+                                    help='Keep one of each record with how many times it was seen, as "count<TAB>line" '\
+                                        'for text or value, count uint32 pairs for binary.')
+    selectGroup = parser.add_mutually_exclusive_group()
+    selectGroup.add_argument('--top',
+                                    dest='top',
+                                    action='store',
+                                    type=int,
+                                    default=None,
+                                    help='Only write the K smallest records, found in one read of the file.')
+    selectGroup.add_argument('--bottom',
+                                    dest='bottom',
+                                    action='store',
+                                    type=int,
+                                    default=None,
+                                    help='Only write the K largest records, in sorted order, found in one read of the file.')
+    selectGroup.add_argument('--range',
+                                    dest='keyRange',
+                                    action='store',
+                                    type=_parse_range,
+                                    default=None,
+                                    help='Only write records from LO up to but not including HI, given as LO:HI. '\
+                                        'Either side can be left out. Bounds are keys with --key.')
+    parser.add_argument('--index',
+                                    dest='indexEvery',
+                                    action='store',
+                                    type=int,
+                                    nargs='?',
+                                    const=1024,
+                                    default=0,
+                                    help='Write the key and offset of every N-th record to the output name plus ".idx" while '\
+                                        'merging, for FileMonsters.IndexedFile lookups. N defaults to 1024.')
+    parser.add_argument('--count-ops',
+                                    dest='countOps',
+                                    action='store_true',
+                                    help='Count comparisons and moves while sorting chunks. qsort engine only, and slower.')
+    parser.add_argument('--profile',
+                                    dest='profileFile',
+                                    action='store',
+                                    type=str,
+                                    default=None,
+                                    help='Run under cProfile and write the stats to this file.')
+    parser.add_argument('--tracemalloc',
+                                    dest='traceMemory',
+                                    action='store_true',
+                                    help='Trace python allocations and add the peak to the stats.')
 
     args = parser.parse_args()
     #argparse error checking
-    if args.filename[-4:] != '.dat':
+    if args.fanIn is not None and args.fanIn < 2:
+        parser.error('The fan-in must be at least 2. The one you provided was {0}'.format(args.fanIn))
+
+    if args.readAhead < 0 or args.writeBehind < 0:
+        parser.error('--readahead and --writebehind can not be negative.')
+
+    if args.memory is not None and args.memory <= 0:
+        parser.error('The memory budget must be positive. The one you provided was {0}'.format(args.memory))
+
+    if args.memory is not None:
+        leastMemory = MemoryPlanner(args.memory).least_memory()
+        if args.memory < leastMemory:
+            parser.error('The memory budget must be at least {0} bytes, what python itself takes plus '
+                         'room for a merge. The one you provided was {1}'.format(leastMemory, args.memory))
+
+    if args.traceMemory and tracemalloc is None:
+        parser.error('--tracemalloc needs python 3.4 or newer.')
+
+    if args.key != 'line' and args.records != 'text':
+        parser.error('--key only applies to text records.')
+
+    if (args.top is not None and args.top < 1) or (args.bottom is not None and args.bottom < 1):
+        parser.error('--top and --bottom need at least one record.')
+
+    if args.keyWidth < 1:
+        parser.error('The key width must be at least 1. The one you provided was {0}'.format(args.keyWidth))
+
+    if args.mergeWorkers < 1:
+        parser.error('You need at least one merge job. The one you provided was {0}'.format(args.mergeWorkers))
+
+    if args.workers < 1:
+        parser.error('You need at least one job. The one you provided was {0}'.format(args.workers))
+
+    if args.resume and args.filename == STREAM_NAME:
+        parser.error('--resume needs a data file, stdin can not be read again.')
+
+    if args.filename != STREAM_NAME and args.filename[-4:] != '.dat':
         parser.error('The data file must be ".dat". The one you provided was {0}'.format(args.filename[-4:]))
 
+    if args.output is None:
+        args.output = STREAM_NAME if args.filename == STREAM_NAME else args.filename + '.sorted.out'
+
+    if args.indexEvery and (args.output == STREAM_NAME or args.duplicates == 'count'):
+        parser.error('--index needs an output file, and can not index --count output.')
+
+    if args.indexEvery < 0:
+        parser.error('--index can not be negative. The one you provided was {0}'.format(args.indexEvery))
+
+    #stdout is for the sorted records now, so everything else goes to stderr
+    if args.output == STREAM_NAME:
+        sys.stdout = sys.stderr
+
     print(args)
 
 
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+This file provides the main method for running a sort of a data set that is spread over
+several hosts, one shard file per host. See Shards.py for how it works.
+
+On a cluster, start one coordinator and then one worker per host:
+    python sort_cluster.py coordinate -n 3 --port 7400
+    python sort_cluster.py work --coordinator head:7400 --host node1 -f shard.dat -o part.out
+
+Or try it on one host with a worker process per shard:
+    python sort_cluster.py local -f shard0.dat shard1.dat -o part0.out part1.out
+
+Node i's output file holds the i-th key range, so the output files in node order are the
+sorted data set.
+
+---------
+Contains:
+---------
+    +main(args)
+    -_parse_address(text)
+    -_sort_args(args)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with coordinate, work and local commands.
+    -10/17/26 - Added --timeout for how long to wait on the coordinator and other nodes.
+"""
+import argparse
+import logging
+import json
+
+from Sorts import SORT_ENGINES
+from FileMonsters import SUTURE_PLANS, RECORD_FORMATS, KEY_TYPES
+import Shards
+
+"""
+Logging
+-------
+"""
+LOG_FILENAME = 'sort.log'
+logging.basicConfig(filename=LOG_FILENAME,level=logging.DEBUG,format='%(levelname)s - %(asctime)s - %(message)s')
+
+
+"""
+Helper Function(s)
+-----
+"""
+def _parse_address(text):
+    """
+    This helper function reads a host:port address.
+
+    args:
+        -text (string): the address, like head:7400
+
+    return:
+        -tuple: (host, port)
+    """
+    host, _, port = text.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('{0} is not an address, try something like head:7400'.format(text))
+
+
+def _sort_args(args):
+    """
+    This helper function picks out the ExternSort arguments every worker sorts with.
+
+    args:
+        -args (argparse.Namespace): the parsed arguments
+
+    return:
+        -dict: keyword arguments for Sorts.ExternSort
+    """
+    return {'chunkSize': args.sizePerChunk, 'suture': args.suture, 'records': args.records,
+            'engine': args.engine, 'key': args.key, 'keyWidth': args.keyWidth,
+            'duplicates': args.duplicates}
+
+
+"""
+MAIN
+-----
+"""
+def main(args):
+    """
+    This function runs the command picked on the command line.
+
+    args:
+        -args (argparse.Namespace): the parsed arguments
+
+    return:
+        -N/A
+    """
+    if args.command == 'coordinate':
+        coordinator = Shards.ShardCoordinator(args.nodes, args.host, args.port,
+                                              timeout=args.timeout)
+        host, port = coordinator.listen()
+        print('waiting for {0} workers on {1}:{2}'.format(args.nodes, host, port))
+        coordinator.run()
+    elif args.command == 'work':
+        worker = Shards.ShardWorker(args.coordinator, args.filename, args.output,
+                                    _sort_args(args), args.host, args.tempDir,
+                                    timeout=args.timeout)
+        stats = worker.run()
+        print('node {0} wrote {1} bytes to {2}'.format(worker.node, stats['outputBytes'], args.output))
+        return
+    else:
+        coordinator = Shards.run_local(args.filenames, args.outputs, _sort_args(args), args.host,
+                                       args.timeout)
+
+    print(coordinator.report())
+    logging.info(json.dumps({'splitters': len(coordinator.splitters), 'nodes': coordinator.stats}))
+
+    if args.statsFile:
+        with open(args.statsFile, 'w') as statsFile:
+            json.dump(coordinator.stats, statsFile, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    #argparse setup, the sort options are shared by the commands that sort
+    sortOptions = argparse.ArgumentParser(add_help=False)
+    sortOptions.add_argument('-c', '--chunksize',
+                                    dest='sizePerChunk',
+                                    action='store',
+                                    type=int,
+                                    default=209715200,
+                                    help='Size to make each chunk in bytes.')
+    sortOptions.add_argument('-m', '--merge',
+                                    dest='suture',
+                                    action='store',
+                                    type=str,
+                                    choices=sorted(SUTURE_PLANS),
+                                    default='heap',
+                                    help='How to merge the sorted chunk files and key ranges.')
+    sortOptions.add_argument('-t', '--format',
+                                    dest='records',
+                                    action='store',
+                                    type=str,
+                                    choices=sorted(RECORD_FORMATS),
+                                    default='text',
+                                    help='Record format of the shards, text lines or binary uint32s.')
+    sortOptions.add_argument('-e', '--engine',
+                                    dest='engine',
+                                    action='store',
+                                    type=str,
+                                    choices=sorted(SORT_ENGINES),
+                                    default='qsort',
+                                    help='How to sort each chunk.')
+    sortOptions.add_argument('--key',
+                                    dest='key',
+                                    action='store',
+                                    type=str,
+                                    choices=['line'] + KEY_TYPES,
+                                    default='line',
+                                    help='Sort text by the whole line, or by an int, float or prefix key parsed from each line.')
+    sortOptions.add_argument('--key-width',
+                                    dest='keyWidth',
+                                    action='store',
+                                    type=int,
+                                    default=8,
+                                    help='Characters in a prefix key.')
+    sortOptions.add_argument('--unique',
+                                    dest='duplicates',
+                                    action='store_const',
+                                    const='unique',
+                                    default='keep',
+                                    help='Keep one of each record across every shard.')
+    sortOptions.add_argument('--host',
+                                    dest='host',
+                                    action='store',
+                                    type=str,
+                                    default='127.0.0.1',
+                                    help='Address this process listens on.')
+
+    networkOptions = argparse.ArgumentParser(add_help=False)
+    networkOptions.add_argument('--timeout',
+                                    dest='timeout',
+                                    action='store',
+                                    type=float,
+                                    default=3600.0,
+                                    help='Seconds to wait on the coordinator or another node before giving up. '\
+                                        'Allow for the slowest node to sort its shard.')
+
+    reportOptions = argparse.ArgumentParser(add_help=False)
+    reportOptions.add_argument('--stats',
+                                    dest='statsFile',
+                                    action='store',
+                                    type=str,
+                                    default=None,
+                                    help='Write every node\'s numbers to this file as JSON.')
+
+    parser = argparse.ArgumentParser(description='This program sorts a data set spread over several '\
+                                                'hosts into one ordered output file per host.',
+                                    epilog='And that is how you sort a big file on many hosts')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    coordinate = commands.add_parser('coordinate', parents=[networkOptions, reportOptions],
+                                    help='Pick the key ranges and collect the workers\' reports.')
+    coordinate.add_argument('-n', '--nodes',
+                                    dest='nodes',
+                                    action='store',
+                                    type=int,
+                                    required=True,
+                                    help='Number of workers to wait for.')
+    coordinate.add_argument('--host',
+                                    dest='host',
+                                    action='store',
+                                    type=str,
+                                    default='0.0.0.0',
+                                    help='Address to listen on.')
+    coordinate.add_argument('--port',
+                                    dest='port',
+                                    action='store',
+                                    type=int,
+                                    default=7400,
+                                    help='Port to listen on.')
+
+    work = commands.add_parser('work', parents=[sortOptions, networkOptions],
+                                    help='Sort this host\'s shard and trade key ranges with the other workers.')
+    work.add_argument('--coordinator',
+                                    dest='coordinator',
+                                    action='store',
+                                    type=_parse_address,
+                                    required=True,
+                                    help='host:port of the coordinator.')
+    work.add_argument('-f', '--file',
+                                    dest='filename',
+                                    action='store',
+                                    type=str,
+                                    required=True,
+                                    help='This host\'s shard.')
+    work.add_argument('-o', '--output',
+                                    dest='output',
+                                    action='store',
+                                    type=str,
+                                    required=True,
+                                    help='Where to write this node\'s key range.')
+    work.add_argument('--temp-dir',
+                                    dest='tempDir',
+                                    action='store',
+                                    type=str,
+                                    default=None,
+                                    help='Where the sorted shard and received ranges go. Defaults to a new temp directory.')
+
+    local = commands.add_parser('local', parents=[sortOptions, networkOptions, reportOptions],
+                                    help='Run a coordinator and a worker per shard on this host.')
+    local.add_argument('-f', '--files',
+                                    dest='filenames',
+                                    nargs='+',
+                                    required=True,
+                                    help='The shards, one worker each.')
+    local.add_argument('-o', '--outputs',
+                                    dest='outputs',
+                                    nargs='+',
+                                    required=True,
+                                    help='The output files in node order, one per shard.')
+
+    args = parser.parse_args()
+    #argparse error checking
+    if args.command == 'coordinate' and args.nodes < 1:
+        parser.error('There must be at least one node. You asked for {0}'.format(args.nodes))
+
+    if args.command == 'local' and len(args.filenames) != len(args.outputs):
+        parser.error('Every shard needs an output file. There are {0} shards and {1} outputs.'.format(
+            len(args.filenames), len(args.outputs)))
+
+    if args.command != 'coordinate' and args.key != 'line' and args.records != 'text':
+        parser.error('--key only applies to text records.')
+
+    if args.timeout <= 0:
+        parser.error('The timeout must be positive. The one you provided was {0}'.format(args.timeout))
+
+    main(args)
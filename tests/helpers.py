@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+This file holds what the tests share: a test case that works in its own temp directory,
+random data files and a way to make a method die part way through a sort.
+
+---------
+Contains:
+---------
+    Classes:
+    -SortTestCase(unittest.TestCase)
+        +setUp(self)
+        +tearDown(self)
+        +path(self, name)
+        +write_lines(self, name, lines)
+        +write_uint32s(self, name, values)
+        +read_lines(self, path)
+        +read_uint32s(self, path)
+        +sort_file(self, victim, **kwargs)
+
+    -Crash(Exception)
+
+    Functions:
+    +random_lines(count, seed, low = 0, high = 99999)
+    +random_uint32s(count, seed, high = 99999)
+    +crash_after(owner, name, calls, when = None)
+    +count_calls(owner, name)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started.
+    -10/17/26 - Added count_calls().
+    -10/17/26 - Added SortTestCase.sort_file().
+"""
+import array
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+#the tests import the scripts straight from the repo
+_repoDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repoDir not in sys.path:
+    sys.path.insert(0, _repoDir)
+
+
+"""
+Crash class
+-----
+"""
+class Crash(Exception):
+    """
+    This class is what crash_after() raises, so a test can tell it from a real error.
+    """
+
+
+"""
+SortTestCase class
+-----
+"""
+class SortTestCase(unittest.TestCase):
+    """
+    This class gives every test its own temp directory, which is also the working
+    directory while the test runs, so nothing is left next to the scripts.
+
+    Attributes:
+        -tempDir (string): the test's directory
+    """
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix='sort_test_')
+        self._oldDir = os.getcwd()
+        os.chdir(self.tempDir)
+
+    def tearDown(self):
+        os.chdir(self._oldDir)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def path(self, name):
+        """
+        This method gets the full path of a file in the test's directory.
+
+        args:
+            -name (string): the file name
+
+        return:
+            -string: the path
+        """
+        return os.path.join(self.tempDir, name)
+
+    def write_lines(self, name, lines):
+        """
+        This method writes a text data file.
+
+        args:
+            -name (string): the file name
+            -lines (list of strings): the lines, newlines included
+
+        return:
+            -string: the path
+        """
+        path = self.path(name)
+        with open(path, 'w') as dataFile:
+            dataFile.writelines(lines)
+        return path
+
+    def write_uint32s(self, name, values):
+        """
+        This method writes a binary data file of little-endian uint32s.
+
+        args:
+            -name (string): the file name
+            -values (list of ints): the records
+
+        return:
+            -string: the path
+        """
+        import FileMonsters
+
+        path = self.path(name)
+        with open(path, 'wb') as dataFile:
+            dataFile.write(FileMonsters.uint32_bytes(array.array(FileMonsters.UINT32, values)))
+        return path
+
+    def read_lines(self, path):
+        """
+        This method reads a text file back.
+
+        args:
+            -path (string): the file
+
+        return:
+            -list: the lines, newlines included
+        """
+        with open(path) as dataFile:
+            return dataFile.readlines()
+
+    def read_uint32s(self, path):
+        """
+        This method reads a binary file of uint32s back.
+
+        args:
+            -path (string): the file
+
+        return:
+            -list: the records
+        """
+        import FileMonsters
+
+        with open(path, 'rb') as dataFile:
+            return list(FileMonsters.uint32_array(dataFile.read()))
+
+    def sort_file(self, victim, **kwargs):
+        """
+        This method sorts a file to sorted.out in the test's directory, in chunks small
+        enough for a multi-pass merge unless told otherwise.
+
+        args:
+            -victim (string): the file to sort
+            -kwargs (dict): keyword arguments for Sorts.ExternSort, over the defaults
+
+        return:
+            -string: the sorted file
+        """
+        import Sorts
+
+        options = dict(chunkSize=3000, fanIn=3, target=self.path('sorted.out'),
+                       tempDir=self.tempDir)
+        options.update(kwargs)
+        Sorts.ExternSort(victim, **options).run_extern_sort()
+        return options['target']
+
+
+"""
+Helper Function(s)
+-----
+"""
+def random_lines(count, seed, low = 0, high = 99999):
+    """
+    This function makes zero padded lines like dgen.py, with plenty of repeats.
+
+    args:
+        -count (int): how many lines
+        -seed (int): seed for the random numbers
+        -low (int): smallest number
+        -high (int): largest number
+
+    return:
+        -list: the lines
+    """
+    rand = random.Random(seed)
+    return ['{0:05d}\n'.format(rand.randint(low, high)) for _ in range(count)]
+
+
+def random_uint32s(count, seed, high = 99999):
+    """
+    This function makes random uint32 records.
+
+    args:
+        -count (int): how many records
+        -seed (int): seed for the random numbers
+        -high (int): largest record
+
+    return:
+        -list: the records
+    """
+    rand = random.Random(seed)
+    return [rand.randint(0, high) for _ in range(count)]
+
+
+@contextlib.contextmanager
+def crash_after(owner, name, calls, when = None):
+    """
+    This function swaps a method for one that raises Crash on the call after 'calls'
+    calls that went through, like a sort dying part way. Only calls 'when' is True for
+    count, when given.
+
+    args:
+        -owner (class): the class with the method
+        -name (string): the method name
+        -calls (int): calls that go through before the crash
+        -when (callable): takes the call's args, True for calls that count
+
+    return:
+        -N/A
+    """
+    method = getattr(owner, name)
+    counted = [0]
+
+    def crashing(*args, **kwargs):
+        if when is None or when(*args, **kwargs):
+            if counted[0] >= calls:
+                raise Crash('{0}.{1} crashed'.format(owner.__name__, name))
+            counted[0] += 1
+        return method(*args, **kwargs)
+
+    setattr(owner, name, crashing)
+    try:
+        yield
+    finally:
+        setattr(owner, name, method)
+
+
+@contextlib.contextmanager
+def count_calls(owner, name):
+    """
+    This function counts the calls to a method while it is in use.
+
+    args:
+        -owner (class): the class with the method
+        -name (string): the method name
+
+    return:
+        -list: one item, the calls so far
+    """
+    method = getattr(owner, name)
+    counted = [0]
+
+    def counting(*args, **kwargs):
+        counted[0] += 1
+        return method(*args, **kwargs)
+
+    setattr(owner, name, counting)
+    try:
+        yield counted
+    finally:
+        setattr(owner, name, method)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for generating the same data with any number of --jobs.
+
+---------
+Contains:
+---------
+    Classes:
+    -JobsTests(SortTestCase)
+        +test_jobs_write_the_same_file(self)
+        +test_print_is_the_same_data(self)
+        -_generate(self, outFileName, jobs, **options)
+        -_arguments(self, outFileName, jobs, **options)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with one job against many for every shape.
+"""
+import argparse
+import contextlib
+import io
+import unittest
+
+from helpers import SortTestCase
+
+import dgen
+
+
+"""
+JobsTests class
+-----
+"""
+class JobsTests(SortTestCase):
+    """
+    This class generates files of a few blocks, with a short last one, in one process
+    and in several, and checks the bytes and the metadata match.
+    """
+    _count = 3 * dgen._BLOCK + 1234
+
+    _cases = [{},
+              {'do_unique': True},
+              {'do_sort': True},
+              {'do_sort': True, 'do_reverse': True},
+              {'do_unique': True, 'do_sort': True, 'do_reverse': True},
+              {'distribution': 'nearly-sorted'},
+              {'distribution': 'organ-pipe'},
+              {'distribution': 'sawtooth', 'period': 5000},
+              {'distribution': 'few-unique'},
+              {'distribution': 'zipf', 'distinct': 1000},
+              {'distribution': 'qsort-killer', 'period': 1000}]
+
+    def test_jobs_write_the_same_file(self):
+        for options in JobsTests._cases:
+            for binary in (False, True):
+                with self.subTest(binary=binary, **options):
+                    one = self._generate(self.path('one.dat'), 1, do_binary=binary, **options)
+                    many = self._generate(self.path('many.dat'), 3, do_binary=binary, **options)
+                    self.assertEqual(one['records'], JobsTests._count)
+                    self.assertEqual(one, many)
+                    with open(self.path('one.dat'), 'rb') as oneFile, \
+                         open(self.path('many.dat'), 'rb') as manyFile:
+                        self.assertEqual(oneFile.read(), manyFile.read())
+
+    def test_print_is_the_same_data(self):
+        #-p writes the blocks in order itself, so reversed data is the case to check
+        options = {'do_sort': True, 'do_reverse': True}
+        self._generate(self.path('file.dat'), 3, **options)
+        printed = io.TextIOWrapper(io.BytesIO(), encoding='ascii')
+        with contextlib.redirect_stdout(printed), contextlib.redirect_stderr(io.StringIO()):
+            dgen.main(self._arguments(None, 1, do_print=True, **options))
+        with open(self.path('file.dat'), 'rb') as file:
+            self.assertEqual(printed.buffer.getvalue(), file.read())
+
+    def _generate(self, outFileName, jobs, **options):
+        """
+        This method generates a file, keeping the report off stdout.
+
+        args:
+            -outFileName (string): the file to write
+            -jobs (int): processes writing it
+            -options (dict): arguments to change from dgen's defaults
+
+        return:
+            -dict: the file's metadata
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            return dgen.main(self._arguments(outFileName, jobs, **options))
+
+    def _arguments(self, outFileName, jobs, **options):
+        """
+        This method makes the arguments dgen's command line would, with a fixed seed.
+
+        args:
+            -outFileName (string): the file to write, None with do_print
+            -jobs (int): processes writing it
+            -options (dict): arguments to change from dgen's defaults
+
+        return:
+            -argparse.Namespace: the arguments
+        """
+        arguments = dict(do_unique=False, do_sort=False, do_reverse=False, do_binary=False,
+                         do_print=False, numCount=JobsTests._count, outFileName=outFileName,
+                         jobs=jobs, distribution='uniform', seed=21)
+        arguments.update(dgen.PARAM_DEFAULTS)
+        arguments.update(options)
+        return argparse.Namespace(**arguments)
+
+
+if __name__ == '__main__':
+    unittest.main()
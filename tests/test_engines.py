@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for the chunk sort engines.
+
+---------
+Contains:
+---------
+    Classes:
+    -SortEngineTests(SortTestCase)
+        +test_lines(self)
+        +test_uint32s(self)
+        +test_keyed(self)
+        +test_whole_sorts(self)
+        -_engines(self)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with every engine giving the same output.
+    -10/17/26 - Digits from other scripts are not fixed width numbers to radix.
+    -10/17/26 - Sorts with SortTestCase.sort_file().
+"""
+import array
+import unittest
+
+from helpers import SortTestCase, random_lines, random_uint32s
+
+import FileMonsters
+import Sorts
+
+
+"""
+SortEngineTests class
+-----
+"""
+class SortEngineTests(SortTestCase):
+    """
+    This class checks every engine sorts chunks like sorted() does, including the
+    chunks radix hands on to qsort, and that whole sorts with each match.
+    """
+    def test_lines(self):
+        cases = {'empty': [], 'one': ['5\n'], 'repeats': random_lines(5000, 1, high=20),
+                 'fixed width': random_lines(5000, 2),
+                 'mixed width': ['{0}\n'.format(n) for n in random_uint32s(3000, 3)],
+                 'arabic-indic digits': [u'\u06631\n', '21\n', '11\n', u'\u06609\n']}
+        for name, lines in sorted(cases.items()):
+            for engine in self._engines():
+                with self.subTest(case=name, engine=engine.name):
+                    self.assertEqual(list(engine.sort_lines(list(lines))), sorted(lines))
+
+    def test_uint32s(self):
+        cases = {'empty': [], 'one': [7], 'repeats': random_uint32s(5000, 4, high=20),
+                 'wide': random_uint32s(5000, 5, high=(1 << 32) - 1),
+                 'radix by 16 bits': random_uint32s(70000, 9, high=(1 << 32) - 1)}
+        for name, values in sorted(cases.items()):
+            for engine in self._engines():
+                with self.subTest(case=name, engine=engine.name):
+                    chunk = array.array(FileMonsters.UINT32, values)
+                    self.assertEqual(list(engine.sort_uint32(chunk)), sorted(values))
+
+    def test_keyed(self):
+        lines = ['{0}\n'.format(n - 500) for n in random_uint32s(4000, 6, high=1000)]
+        for keyType, parse in (('int', int), ('float', float), ('prefix', lambda line: line[:3])):
+            records = FileMonsters.KeyedTextRecords(keyType, 3)
+            for engine in self._engines():
+                with self.subTest(key=keyType, engine=engine.name):
+                    self.assertEqual(records.sort_chunk(list(lines), engine),
+                                     sorted(lines, key=parse))
+
+    def test_whole_sorts(self):
+        lines = random_lines(8000, 7)
+        values = random_uint32s(8000, 8)
+        textVictim = self.write_lines('text.dat', lines)
+        binaryVictim = self.write_uint32s('binary.dat', values)
+        for engine in sorted(Sorts.SORT_ENGINES):
+            with self.subTest(engine=engine):
+                target = self.sort_file(textVictim, engine=engine)
+                self.assertEqual(self.read_lines(target), sorted(lines))
+
+                target = self.sort_file(binaryVictim, engine=engine, records='binary')
+                self.assertEqual(self.read_uint32s(target), sorted(values))
+
+    def _engines(self):
+        """
+        This method builds every engine, numpy falling back to qsort when it is not
+        installed.
+
+        args:
+            -N/A
+
+        return:
+            -list: the engines
+        """
+        return [Sorts.get_sort_engine(name) for name in sorted(Sorts.SORT_ENGINES)]
+
+
+if __name__ == '__main__':
+    unittest.main()
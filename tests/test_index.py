@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for the sparse index written next to a sorted output and looking records up
+with it.
+
+---------
+Contains:
+---------
+    Classes:
+    -IndexedFileTests(SortTestCase)
+        +test_text(self)
+        +test_keyed_text(self)
+        +test_binary(self)
+        +test_parallel_merge(self)
+        +test_file_already_in_order(self)
+        -_check(self, target, full, keyOf, keys, bounds)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with lookups and scans checked against the sorted records.
+    -10/17/26 - Sorts with SortTestCase.sort_file().
+"""
+import unittest
+
+from helpers import SortTestCase, random_lines, random_uint32s
+
+import FileMonsters
+
+
+"""
+IndexedFileTests class
+-----
+"""
+class IndexedFileTests(SortTestCase):
+    """
+    This class sorts files with an index, then looks up keys that are there, missing,
+    before the first and past the last, and scans ranges, all checked against
+    filtering the sorted records.
+    """
+    def test_text(self):
+        lines = random_lines(6000, 25, high=2000)
+        full = sorted(lines)
+        keys = ['00000', full[0], full[-1], '01000', '01001', '99999', full[2999]]
+        bounds = [(None, None), (None, '00500\n'), ('01500\n', None), ('00100\n', '00100\n'),
+                  ('00700\n', '01300\n')]
+        for every in (1, 7, 1024, 100000):
+            with self.subTest(every=every):
+                target = self.sort_file(self.write_lines('victim.dat', lines), indexEvery=every)
+                self._check(target, full, lambda line: line, keys, bounds)
+
+    def test_keyed_text(self):
+        lines = ['{0}\n'.format(value) for value in random_uint32s(6000, 26, high=2000)]
+        full = sorted(lines, key=int)
+        target = self.sort_file(self.write_lines('victim.dat', lines), indexEvery=64, key='int')
+        self._check(target, full, int, [0, 5, 999, 1000, 2000, 2001, -1],
+                    [(None, 10), (1990, None), (500, 1500), (7, 7)])
+
+    def test_binary(self):
+        values = random_uint32s(6000, 27, high=2000)
+        full = sorted(values)
+        target = self.sort_file(self.write_uint32s('victim.dat', values), indexEvery=64,
+                                records='binary')
+        self._check(target, full, lambda value: value, [0, 5, 999, 1000, 2000, 2001],
+                    [(None, 10), (1990, None), (500, 1500), (7, 7)])
+
+    def test_parallel_merge(self):
+        #every part's process indexes its own part, moved past the parts before it
+        lines = random_lines(20000, 28, high=5000)
+        target = self.sort_file(self.write_lines('victim.dat', lines), indexEvery=100,
+                                mergeWorkers=3)
+        self._check(target, sorted(lines), lambda line: line, ['00000', '02500', '04999'],
+                    [(None, None), ('01000\n', '04000\n')])
+
+    def test_file_already_in_order(self):
+        lines = sorted(random_lines(6000, 29, high=2000))
+        target = self.sort_file(self.write_lines('victim.dat', lines), indexEvery=50)
+        self._check(target, lines, lambda line: line, ['00000', '01000', lines[-1]],
+                    [(None, None), ('00500\n', '01500\n')])
+
+    def _check(self, target, full, keyOf, keys, bounds):
+        """
+        This method checks lookups and scans of an indexed file.
+
+        args:
+            -target (string): the sorted file
+            -full (list): its records, in order
+            -keyOf (callable): gets a record's key
+            -keys (list): keys to look up
+            -bounds (list of tuples): (low, high) ranges to scan
+
+        return:
+            -N/A
+        """
+        with FileMonsters.IndexedFile(target) as indexed:
+            for key in keys:
+                wanted = key + '\n' if isinstance(key, str) and not key.endswith('\n') else key
+                self.assertEqual(list(indexed.lookup(key)),
+                                 [record for record in full if keyOf(record) == wanted])
+
+            for low, high in bounds:
+                self.assertEqual(list(indexed.scan(low, high)),
+                                 [record for record in full if (low is None or keyOf(record) >= low)
+                                  and (high is None or keyOf(record) < high)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for sorting text by a key parsed from each line.
+
+---------
+Contains:
+---------
+    Classes:
+    -StableKeyTests(SortTestCase)
+        +setUp(self)
+        +test_engines_are_stable(self)
+        +test_merges_are_stable(self)
+        +test_replacement_runs_are_stable(self)
+        +test_unique_keeps_the_first(self)
+        -_sort(self, **kwargs)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with equal keys keeping their input order.
+    -10/17/26 - Sorts with SortTestCase.sort_file().
+"""
+import random
+import unittest
+
+from helpers import SortTestCase
+
+import Sorts
+
+
+"""
+StableKeyTests class
+-----
+"""
+class StableKeyTests(SortTestCase):
+    """
+    This class sorts lines whose int keys repeat but are written with different zero
+    padding, so equal keys are different lines, and checks they come out in input
+    order like sort -s -k.
+    """
+    def setUp(self):
+        SortTestCase.setUp(self)
+        rand = random.Random(17)
+        self.lines = ['{0:0{1}d}\n'.format(rand.randint(0, 50), rand.randint(1, 6))
+                      for _ in range(6000)]
+        self.victim = self.write_lines('victim.dat', self.lines)
+        self.expected = sorted(self.lines, key=int)
+
+    def test_engines_are_stable(self):
+        for engine in sorted(Sorts.SORT_ENGINES):
+            with self.subTest(engine=engine):
+                self.assertEqual(self._sort(engine=engine), self.expected)
+
+    def test_merges_are_stable(self):
+        for suture in ('scan', 'heap', 'losertree', 'block'):
+            with self.subTest(suture=suture):
+                self.assertEqual(self._sort(suture=suture), self.expected)
+
+    def test_replacement_runs_are_stable(self):
+        self.assertEqual(self._sort(runMode='replacement'), self.expected)
+
+    def test_unique_keeps_the_first(self):
+        first = {}
+        for line in self.lines:
+            first.setdefault(int(line), line)
+        self.assertEqual(self._sort(duplicates='unique'), [first[key] for key in sorted(first)])
+
+    def _sort(self, **kwargs):
+        """
+        This method sorts the victim by int key in many chunks with a multi-pass merge.
+
+        args:
+            -kwargs (dict): more keyword arguments for Sorts.ExternSort
+
+        return:
+            -list: the sorted lines
+        """
+        return self.read_lines(self.sort_file(self.victim, chunkSize=4000, key='int', **kwargs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for keeping a sort inside its --memory budget.
+
+---------
+Contains:
+---------
+    Classes:
+    -MemoryBudgetTests(SortTestCase)
+        +test_text_budget(self)
+        +test_binary_budget(self)
+        +test_selection_budget(self)
+        +test_split_workers_budget(self)
+        +test_merge_workers_budget(self)
+        +test_too_small_budget(self)
+        -_peak(self, dataPath, args)
+        -_tree_peak(self, dataPath, budget, args)
+
+    Functions:
+    -_process_tree(root)
+    -_pss(pid)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with the peak of every engine against the budget.
+    -10/17/26 - A budget too small to sort with is a usage error.
+    -10/17/26 - The budget covers checking if the file is already in order.
+    -10/17/26 - The budget covers --top, --bottom and --range, kept and spilled.
+    -10/17/26 - The budget covers split worker processes, summed over every process.
+    -10/17/26 - The budget covers merge worker processes too.
+"""
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from helpers import SortTestCase, random_lines, random_uint32s, _repoDir
+
+#runs the script given after it, then writes the most it had resident to the file named
+#in SORT_PEAK_FILE; the peak the OS gives for a child counts what it forked from too
+_peakRunner = """
+import runpy, sys, os
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+finally:
+    with open('/proc/self/status') as status:
+        peak = [line.split()[1] for line in status if line.startswith('VmHWM:')][0]
+    with open(os.environ['SORT_PEAK_FILE'], 'w') as peakFile:
+        peakFile.write(peak)
+"""
+
+
+"""
+Helper Function(s)
+-----
+"""
+def _process_tree(root):
+    """
+    This function finds a process and every process under it.
+
+    args:
+        -root (int): the top process id
+
+    return:
+        -list of ints: the process ids
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/{0}/stat'.format(entry)) as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (IOError, OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        tree.append(pid)
+        todo.extend(children.get(pid, []))
+    return tree
+
+
+def _pss(pid):
+    """
+    This function gets a process's proportional share of resident memory, where pages
+    shared with a forked parent count a share to each, so summing it over processes
+    counts every page once.
+
+    args:
+        -pid (int): the process id
+
+    return:
+        -int: kB, 0 if the process is gone
+    """
+    try:
+        with open('/proc/{0}/smaps_rollup'.format(pid)) as rollup:
+            for line in rollup:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+"""
+MemoryBudgetTests class
+-----
+"""
+@unittest.skipUnless(os.path.exists('/proc/self/status'), 'needs /proc for the peak resident memory')
+class MemoryBudgetTests(SortTestCase):
+    """
+    This class runs sort_bigfile.py on files far bigger than the budget and checks the
+    most memory it ever had resident, so the whole run counts, not just what Python
+    allocated.
+    """
+    _budget = 32
+    _engines = ['qsort', 'numpy', 'radix']
+
+    def test_text_budget(self):
+        dataPath = self.write_lines('data.dat', random_lines(600000, 1))
+        for engine in MemoryBudgetTests._engines:
+            with self.subTest(engine=engine):
+                self.assertLessEqual(self._peak(dataPath, ['--engine', engine]),
+                                     MemoryBudgetTests._budget)
+
+    def test_binary_budget(self):
+        dataPath = self.write_uint32s('data.dat', random_uint32s(1000000, 2))
+        for engine in MemoryBudgetTests._engines:
+            with self.subTest(engine=engine):
+                self.assertLessEqual(self._peak(dataPath, ['--engine', engine, '-t', 'binary']),
+                                     MemoryBudgetTests._budget)
+
+    def test_selection_budget(self):
+        dataPath = self.write_lines('data.dat', random_lines(600000, 4))
+        for args in (['--top', '10'], ['--bottom', '10'], ['--range', '10000:90000'],
+                     ['--top', '500000']):
+            with self.subTest(args=args):
+                self.assertLessEqual(self._peak(dataPath, args), MemoryBudgetTests._budget)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/smaps_rollup'), 'needs /proc for shared memory')
+    def test_split_workers_budget(self):
+        #at 32M there is no room for a worker, at 64M some of them
+        dataPath = self.write_lines('data.dat', random_lines(600000, 5))
+        for budget in (32, 64):
+            with self.subTest(budget=budget):
+                self.assertLessEqual(self._tree_peak(dataPath, budget, ['-j', '4']), budget)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/smaps_rollup'), 'needs /proc for shared memory')
+    def test_merge_workers_budget(self):
+        lines = random_lines(600000, 5)
+        dataPath = self.write_lines('data.dat', lines)
+        for budget in (32, 64):
+            with self.subTest(budget=budget):
+                peak = self._tree_peak(dataPath, budget, ['--merge-jobs', '4'])
+                self.assertLessEqual(peak, budget)
+                self.assertEqual(self.read_lines(self.path('sorted.dat')), sorted(lines))
+
+    def test_too_small_budget(self):
+        dataPath = self.write_lines('data.dat', random_lines(1000, 3))
+        command = [sys.executable, os.path.join(_repoDir, 'sort_bigfile.py'), '-f', dataPath,
+                   '-o', self.path('sorted.dat'), '--memory', '2M']
+        child = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        _, error = child.communicate()
+        self.assertEqual(child.returncode, 2)
+        self.assertIn('must be at least', error)
+        self.assertNotIn('Traceback', error)
+
+    def _peak(self, dataPath, args):
+        """
+        This method sorts a file in a child process with the budget.
+
+        args:
+            -dataPath (string): the file to sort
+            -args (list of strings): more arguments for sort_bigfile.py
+
+        return:
+            -float: the child's peak resident memory, in MiB
+        """
+        command = [sys.executable, '-c', _peakRunner, os.path.join(_repoDir, 'sort_bigfile.py'),
+                   '-f', dataPath, '-o', self.path('sorted.dat'), '--memory',
+                   '{0}M'.format(MemoryBudgetTests._budget)] + args
+        environment = dict(os.environ, SORT_PEAK_FILE=self.path('peak.txt'))
+        subprocess.check_call(command, env=environment, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        with open(self.path('peak.txt')) as peakFile:
+            return int(peakFile.read()) / 1024.0
+
+    def _tree_peak(self, dataPath, budget, args):
+        """
+        This method sorts a file in a child process that may start processes of its own,
+        summing their memory every few milliseconds.
+
+        args:
+            -dataPath (string): the file to sort
+            -budget (int): the budget in MiB
+            -args (list of strings): more arguments for sort_bigfile.py
+
+        return:
+            -float: the most memory the processes had at once, in MiB
+        """
+        command = [sys.executable, os.path.join(_repoDir, 'sort_bigfile.py'), '-f', dataPath,
+                   '-o', self.path('sorted.dat'), '--memory', '{0}M'.format(budget)] + args
+        child = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        peak = 0
+        while child.poll() is None:
+            peak = max(peak, sum(_pss(pid) for pid in _process_tree(child.pid)))
+            time.sleep(0.002)
+        self.assertEqual(child.returncode, 0)
+        return peak / 1024.0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for merging sorted runs.
+
+---------
+Contains:
+---------
+    Classes:
+    -MergeStrategyTests(SortTestCase)
+        +setUp(self)
+        +test_text(self)
+        +test_binary(self)
+        +test_merges_of_runs(self)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with every merge strategy giving the same output.
+    -10/17/26 - Sorts with SortTestCase.sort_file().
+"""
+import unittest
+
+from helpers import SortTestCase, random_lines, random_uint32s
+
+import FileMonsters
+
+
+"""
+MergeStrategyTests class
+-----
+"""
+class MergeStrategyTests(SortTestCase):
+    """
+    This class sorts the same files with every merge strategy, in many runs and a
+    multi-pass merge, and checks they all match sorted().
+    """
+    def setUp(self):
+        SortTestCase.setUp(self)
+        self.sutures = sorted(FileMonsters.SUTURE_PLANS)
+
+    def test_text(self):
+        lines = random_lines(8000, 1)
+        victim = self.write_lines('victim.dat', lines)
+        for suture in self.sutures:
+            with self.subTest(suture=suture):
+                target = self.sort_file(victim, suture=suture)
+                self.assertEqual(self.read_lines(target), sorted(lines))
+
+    def test_binary(self):
+        values = random_uint32s(8000, 2)
+        victim = self.write_uint32s('victim.dat', values)
+        for suture in self.sutures:
+            with self.subTest(suture=suture):
+                target = self.sort_file(victim, suture=suture, records='binary')
+                self.assertEqual(self.read_uint32s(target), sorted(values))
+
+    def test_merges_of_runs(self):
+        #runs of different lengths, empty ones and runs that do not overlap at all
+        runs = [sorted(random_lines(count, seed)) for seed, count in enumerate([0, 1, 50, 700, 3])]
+        runs.append(['99998\n', '99999\n'])
+        threads = [self.write_lines('run{0}.dat'.format(i), run) for i, run in enumerate(runs)]
+        expected = sorted(line for run in runs for line in run)
+        for suture in self.sutures:
+            with self.subTest(suture=suture):
+                merged = FileMonsters.SUTURE_PLANS[suture]().merge([iter(run) for run in runs])
+                self.assertEqual(list(merged), expected)
+
+                target = self.path('merged.out')
+                FileMonsters.FileSurgeon(FileMonsters.SUTURE_PLANS[suture]()).start_stitching(
+                    list(threads), target, 4096)
+                self.assertEqual(self.read_lines(target), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for checking if a file is already in order before sorting it.
+
+---------
+Contains:
+---------
+    Classes:
+    -InOrderTests(SortTestCase)
+        +test_text(self)
+        +test_keyed_text(self)
+        +test_binary(self)
+        +test_unique(self)
+        +test_out_of_order_at_the_end(self)
+        +test_turned_down_early(self)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started.
+"""
+import tracemalloc
+import unittest
+
+from helpers import SortTestCase, random_lines, random_uint32s
+
+import FileMonsters
+
+
+"""
+InOrderTests class
+-----
+"""
+class InOrderTests(SortTestCase):
+    """
+    This class checks in_order() of every record format on files in and out of order.
+    """
+    _read_size = 1 << 22
+
+    def test_text(self):
+        lines = random_lines(20000, 1)
+        records = FileMonsters.TextRecords()
+        self.assertTrue(records.in_order(self.write_lines('sorted.dat', sorted(lines)),
+                                         InOrderTests._read_size))
+        self.assertFalse(records.in_order(self.write_lines('random.dat', lines),
+                                          InOrderTests._read_size))
+
+    def test_keyed_text(self):
+        #only the first 3 characters are the key, the rest do not have to be in order
+        lines = ['{0:03d}{1:05d}\n'.format(number % 100, 20000 - number) for number in range(20000)]
+        records = FileMonsters.KeyedTextRecords('prefix', 3)
+        byKey = sorted(lines, key=lambda line: line[:3])
+        self.assertTrue(records.in_order(self.write_lines('sorted.dat', byKey),
+                                         InOrderTests._read_size))
+        self.assertFalse(records.in_order(self.write_lines('random.dat', lines),
+                                          InOrderTests._read_size))
+
+    def test_binary(self):
+        values = random_uint32s(20000, 2)
+        records = FileMonsters.BinaryRecords()
+        self.assertTrue(records.in_order(self.write_uint32s('sorted.dat', sorted(values)),
+                                         InOrderTests._read_size))
+        self.assertFalse(records.in_order(self.write_uint32s('random.dat', values),
+                                          InOrderTests._read_size))
+
+    def test_unique(self):
+        records = FileMonsters.UniqueRecords(FileMonsters.TextRecords())
+        distinct = ['{0:05d}\n'.format(number) for number in range(20000)]
+        self.assertTrue(records.in_order(self.write_lines('distinct.dat', distinct),
+                                         InOrderTests._read_size))
+        repeated = sorted(distinct + distinct[:1])
+        self.assertFalse(records.in_order(self.write_lines('repeated.dat', repeated),
+                                          InOrderTests._read_size))
+
+    def test_out_of_order_at_the_end(self):
+        lines = sorted(random_lines(20000, 3, low=1))
+        lines.append('00000\n')
+        values = sorted(random_uint32s(20000, 4)) + [0]
+        for readSize in (1, 1000, InOrderTests._read_size):
+            self.assertFalse(FileMonsters.TextRecords().in_order(
+                self.write_lines('text.dat', lines), readSize))
+            self.assertFalse(FileMonsters.BinaryRecords().in_order(
+                self.write_uint32s('binary.dat', values), readSize))
+
+    def test_turned_down_early(self):
+        #a file that is out of order near the front is not read in big blocks
+        textPath = self.write_lines('text.dat', random_lines(400000, 5))
+        binaryPath = self.write_uint32s('binary.dat', random_uint32s(1000000, 6))
+        for records, path in ((FileMonsters.TextRecords(), textPath),
+                              (FileMonsters.BinaryRecords(), binaryPath)):
+            tracemalloc.start()
+            try:
+                self.assertFalse(records.in_order(path, InOrderTests._read_size))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertLess(peak, 1 << 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
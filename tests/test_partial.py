@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for writing only part of the sorted output with top, largest and keyRange.
+
+---------
+Contains:
+---------
+    Classes:
+    -PartialSortTests(SortTestCase)
+        +setUp(self)
+        +test_top(self)
+        +test_bottom(self)
+        +test_range(self)
+        +test_keyed_range(self)
+        +test_keyed_ties(self)
+        +test_binary(self)
+        +test_stream(self)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with every selection checked against a full sort.
+    -10/17/26 - Sorts with SortTestCase.sort_file().
+    -10/17/26 - Equal int keys on different lines keep the records a stable sort keeps.
+"""
+import random
+import unittest
+
+from helpers import SortTestCase, random_lines, random_uint32s
+
+import Sorts
+
+
+"""
+PartialSortTests class
+-----
+"""
+class PartialSortTests(SortTestCase):
+    """
+    This class checks every selection gives the same records as cutting them out of
+    a full sort, both when they fit in a chunk and when they have to spill to an
+    external sort of their own.
+    """
+    def setUp(self):
+        SortTestCase.setUp(self)
+        self.lines = random_lines(8000, 24, high=9999)
+        self.victim = self.write_lines('victim.dat', self.lines)
+        self.full = sorted(self.lines)
+
+    def test_top(self):
+        for count in (1, 10, 3000, 8000, 9000):
+            with self.subTest(count=count):
+                target = self.sort_file(self.victim, top=count)
+                self.assertEqual(self.read_lines(target), self.full[:count])
+
+    def test_bottom(self):
+        for count in (1, 10, 3000, 8000, 9000):
+            with self.subTest(count=count):
+                target = self.sort_file(self.victim, top=count, largest=True)
+                self.assertEqual(self.read_lines(target), self.full[-count:])
+
+    def test_range(self):
+        for low, high in (('02000', '02500'), (None, '00100'), ('09900', None),
+                          ('01000', '07000'), ('5', '5'), ('z', None)):
+            with self.subTest(low=low, high=high):
+                expected = [line for line in self.full if (low is None or line >= low)
+                            and (high is None or line < high)]
+                target = self.sort_file(self.victim, keyRange=(low, high))
+                self.assertEqual(self.read_lines(target), expected)
+
+    def test_keyed_range(self):
+        #int keys that are not zero padded
+        lines = ['{0}\n'.format(int(line)) for line in self.lines]
+        victim = self.write_lines('keyed.dat', lines)
+        full = sorted(lines, key=int)
+        for kwargs, expected in (({'keyRange': ('50', '2000')},
+                                  [line for line in full if 50 <= int(line) < 2000]),
+                                 ({'top': 100}, full[:100]),
+                                 ({'top': 100, 'largest': True}, full[-100:])):
+            with self.subTest(**kwargs):
+                target = self.sort_file(victim, key='int', **kwargs)
+                self.assertEqual(self.read_lines(target), expected)
+
+    def test_keyed_ties(self):
+        #a few int keys, each written with different zero padding, so equal keys are
+        #different lines and only a stable pick gives the same ones as sort -s
+        rand = random.Random(26)
+        lines = ['{0:0{1}d}\n'.format(rand.randint(0, 50), rand.randint(1, 6))
+                 for _ in range(8000)]
+        victim = self.write_lines('ties.dat', lines)
+        full = sorted(lines, key=int)
+        for count in (5, 100, 3000, 7999, 15000):
+            with self.subTest(count=count):
+                target = self.sort_file(victim, key='int', top=count)
+                self.assertEqual(self.read_lines(target), full[:count])
+                target = self.sort_file(victim, key='int', top=count, largest=True)
+                self.assertEqual(self.read_lines(target), full[-count:])
+
+    def test_binary(self):
+        values = random_uint32s(8000, 25)
+        victim = self.write_uint32s('binary.dat', values)
+        full = sorted(values)
+        for kwargs, expected in (({'top': 50}, full[:50]), ({'top': 50, 'largest': True}, full[-50:]),
+                                 ({'keyRange': ('1000', '20000')},
+                                  [value for value in full if 1000 <= value < 20000])):
+            with self.subTest(**kwargs):
+                target = self.sort_file(victim, records='binary', **kwargs)
+                self.assertEqual(self.read_uint32s(target), expected)
+
+    def test_stream(self):
+        sorter = Sorts.ExternSort(self.victim, chunkSize=3000, top=500, tempDir=self.tempDir)
+        self.assertEqual(list(sorter.sorted_records()), self.full[:500])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for resuming a sort that died from its journal.
+
+---------
+Contains:
+---------
+    Classes:
+    -ResumeTargetTests(SortTestCase)
+        +test_resume_to_another_output(self)
+        +test_resume_after_last_merge_to_another_output(self)
+        +test_resume_to_stream(self)
+        +test_resume_stream_plan_to_file(self)
+        -_sorter(self, target, resume = False)
+        -_crash_last_merge(self, sorter)
+
+    -ResumeCrashTests(SortTestCase)
+        +test_resume_after_split_crash(self)
+        +test_resume_after_replacement_split_crash(self)
+        +test_resume_binary_after_split_crash(self)
+        +test_resume_after_merge_crash(self)
+        -_crash_and_resume(self, victim, expected, name, calls, **kwargs)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with resuming to a different output.
+    -10/17/26 - Added resuming after dying part way through the split or the merge.
+"""
+import os
+import unittest
+
+from helpers import SortTestCase, Crash, crash_after, count_calls, random_lines, random_uint32s
+
+import FileMonsters
+import Sorts
+
+
+"""
+ResumeTargetTests class
+-----
+"""
+class ResumeTargetTests(SortTestCase):
+    """
+    This class checks a resumed sort writes to the output it was given, not the one
+    the try that died was given.
+    """
+    def setUp(self):
+        SortTestCase.setUp(self)
+        self.lines = random_lines(6000, seed=16)
+        self.victim = self.write_lines('victim.dat', self.lines)
+
+    def _sorter(self, target, resume = False):
+        """
+        This method sets up a sort small enough for many chunks and a multi-pass merge.
+        """
+        return Sorts.ExternSort(self.victim, 3000, target=target, fanIn=3, resume=resume,
+                                tempDir=self.tempDir)
+
+    def _crash_last_merge(self, sorter):
+        """
+        This method runs a sort that dies as its last merge starts.
+        """
+        last = lambda surgeon, patients, targetFileName, *args: targetFileName == sorter.targetFile
+        with crash_after(FileMonsters.FileSurgeon, 'start_stitching', 0, last):
+            self.assertRaises(Crash, sorter.run_extern_sort)
+        self.assertTrue(os.path.exists(sorter.journalFile))
+
+    def test_resume_to_another_output(self):
+        self._crash_last_merge(self._sorter(self.path('first.out')))
+
+        self._sorter(self.path('second.out'), resume=True).run_extern_sort()
+        self.assertEqual(self.read_lines(self.path('second.out')), sorted(self.lines))
+        self.assertFalse(os.path.exists(self.path('first.out')))
+
+    def test_resume_after_last_merge_to_another_output(self):
+        #dies once the output is written but before the journal is cleaned up
+        with crash_after(Sorts.ExternSort, '_finish', 0):
+            self.assertRaises(Crash, self._sorter(self.path('first.out')).run_extern_sort)
+
+        self._sorter(self.path('second.out'), resume=True).run_extern_sort()
+        self.assertEqual(self.read_lines(self.path('second.out')), sorted(self.lines))
+
+    def test_resume_to_stream(self):
+        self._crash_last_merge(self._sorter(self.path('first.out')))
+
+        records = list(self._sorter(None, resume=True).sorted_records())
+        self.assertEqual(records, sorted(self.lines))
+        self.assertFalse(os.path.exists(self.path('first.out')))
+
+    def test_resume_stream_plan_to_file(self):
+        #the plan of a sort to stdout ends in '-', which is not a file to write
+        sorter = self._sorter(None)
+        with crash_after(FileMonsters.FileSurgeon, 'start_stitching', 1):
+            self.assertRaises(Crash, list, sorter.sorted_records())
+
+        self._sorter(self.path('second.out'), resume=True).run_extern_sort()
+        self.assertEqual(self.read_lines(self.path('second.out')), sorted(self.lines))
+        self.assertFalse(os.path.exists(self.path('-')))
+
+
+"""
+ResumeCrashTests class
+-----
+"""
+class ResumeCrashTests(SortTestCase):
+    """
+    This class kills a sort part way through the split or the merge, resumes it from
+    its journal and checks the output, and that the work finished before the crash
+    was not done again.
+    """
+    def test_resume_after_split_crash(self):
+        lines = random_lines(6000, 15)
+        resumed = self._crash_and_resume(self.write_lines('victim.dat', lines), sorted(lines),
+                                         '_record_chunk', 2)
+        self.assertLess(resumed['_record_chunk'], resumed['chunks'])
+
+    def test_resume_after_replacement_split_crash(self):
+        #replacement runs do not end where the input read so far does, so it starts over
+        lines = random_lines(6000, 16)
+        self._crash_and_resume(self.write_lines('victim.dat', lines), sorted(lines),
+                               '_record_chunk', 1, runMode='replacement')
+
+    def test_resume_binary_after_split_crash(self):
+        values = random_uint32s(6000, 17)
+        resumed = self._crash_and_resume(self.write_uint32s('victim.dat', values), sorted(values),
+                                         '_record_chunk', 2, records='binary')
+        self.assertLess(resumed['_record_chunk'], resumed['chunks'])
+
+    def test_resume_after_merge_crash(self):
+        lines = random_lines(6000, 18)
+        resumed = self._crash_and_resume(self.write_lines('victim.dat', lines), sorted(lines),
+                                         'start_stitching', 2)
+        self.assertEqual(resumed['_record_chunk'], 0)
+        self.assertEqual(resumed['start_stitching'], resumed['merges'] - 2)
+
+    def _crash_and_resume(self, victim, expected, name, calls, **kwargs):
+        """
+        This method runs a sort that dies on a call to a FileMutilator or FileSurgeon
+        method, then resumes it.
+
+        args:
+            -victim (string): the file to sort
+            -expected (list): the sorted records
+            -name (string): the method to die in
+            -calls (int): calls that go through before it dies
+            -kwargs (dict): more keyword arguments for Sorts.ExternSort
+
+        return:
+            -dict: the calls the resumed sort made to _record_chunk and start_stitching,
+                    with how many chunks and merges the sort has
+        """
+        target = self.path('sorted.out')
+        owner = FileMonsters.FileSurgeon if name == 'start_stitching' else FileMonsters.FileMutilator
+        sorter = Sorts.ExternSort(victim, chunkSize=3000, fanIn=3, target=target,
+                                  tempDir=self.tempDir, **kwargs)
+        with crash_after(owner, name, calls):
+            self.assertRaises(Crash, sorter.run_extern_sort)
+        self.assertTrue(os.path.exists(sorter.journalFile))
+
+        sorter = Sorts.ExternSort(victim, chunkSize=3000, fanIn=3, target=target,
+                                  tempDir=self.tempDir, resume=True, **kwargs)
+        with count_calls(FileMonsters.FileMutilator, '_record_chunk') as chunks, \
+                count_calls(FileMonsters.FileSurgeon, 'start_stitching') as merges:
+            sorter.run_extern_sort()
+
+        if kwargs.get('records') == 'binary':
+            self.assertEqual(self.read_uint32s(target), expected)
+        else:
+            self.assertEqual(self.read_lines(target), expected)
+        self.assertFalse(os.path.exists(sorter.journalFile))
+        return {'_record_chunk': chunks[0], 'start_stitching': merges[0],
+                'chunks': len(sorter.mergePlan.runs), 'merges': len(sorter.mergePlan.steps)}
+
+
+if __name__ == '__main__':
+    unittest.main()
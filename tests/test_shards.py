@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Jacob Rothmel
+
+Tests for sorting a data set spread over several shards.
+
+---------
+Contains:
+---------
+    Classes:
+    -ShardTests(SortTestCase)
+        +test_partitions_are_the_sorted_data(self)
+        +test_coordinator_times_out(self)
+        +test_worker_times_out(self)
+        +test_bad_message(self)
+
+----------
+CHANGE LOG
+----------
+    -10/17/26 - Started, with a local sort and nodes that never answer.
+    -10/17/26 - A message out of order is an error, not an assert.
+"""
+import socket
+import unittest
+
+from helpers import SortTestCase, random_lines
+
+import Shards
+
+
+"""
+ShardTests class
+-----
+"""
+class ShardTests(SortTestCase):
+    """
+    This class runs sharded sorts on localhost.
+    """
+    def test_partitions_are_the_sorted_data(self):
+        shards, targets, lines = [], [], []
+        for node in range(3):
+            shardLines = random_lines(5000, node)
+            lines.extend(shardLines)
+            shards.append(self.write_lines('shard{0}.dat'.format(node), shardLines))
+            targets.append(self.path('part{0}.out'.format(node)))
+
+        Shards.run_local(shards, targets, {'chunkSize': 10000}, timeout=30)
+
+        merged = []
+        for target in targets:
+            merged.extend(self.read_lines(target))
+        self.assertEqual(merged, sorted(lines))
+
+    def test_coordinator_times_out(self):
+        #the second worker never joins
+        coordinator = Shards.ShardCoordinator(2, timeout=0.5)
+        host, port = coordinator.listen()
+        worker = socket.create_connection((host, port))
+        try:
+            Shards._send_json(worker, {'type': 'hello', 'shard': 'shard0.dat',
+                                       'dataHost': host, 'dataPort': 1, 'rank': 0})
+            self.assertRaises(socket.timeout, coordinator.run)
+        finally:
+            worker.close()
+
+    def test_worker_times_out(self):
+        #a coordinator that takes the hello and never answers
+        silent = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(1)
+        try:
+            shard = self.write_lines('shard.dat', random_lines(100, 1))
+            worker = Shards.ShardWorker(silent.getsockname(), shard, self.path('part.out'),
+                                        tempDir=self.tempDir, timeout=0.5)
+            self.assertRaises(socket.timeout, worker.run)
+        finally:
+            silent.close()
+
+    def test_bad_message(self):
+        #a worker that skips its hello, and one whose hello has no data port
+        for message in ({'type': 'samples', 'keys': [], 'weights': []},
+                        {'type': 'hello', 'shard': 'shard0.dat', 'dataHost': '127.0.0.1'}):
+            with self.subTest(message=message):
+                coordinator = Shards.ShardCoordinator(1, timeout=5)
+                worker = socket.create_connection(coordinator.listen())
+                try:
+                    Shards._send_json(worker, message)
+                    self.assertRaises(ValueError, coordinator.run)
+                finally:
+                    worker.close()
+
+
+if __name__ == '__main__':
+    unittest.main()